@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import os
+import os.path
+import sys
+import argparse
+import json
+import pandas as pd
+import stats_ingest
+
+# The -time-passes reports are read by benchmark.py, which is in the parent folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import benchmark
+
+CLANG_TRACE_SUFFIX = "-clang-time-trace.json"
+OPT_TRACE_SUFFIX = "-opt-time-passes.txt"
+
+# The summary events in clang's -ftime-trace output that are kept, and the columns they become
+CLANG_TRACE_EVENTS = {
+    "Total ExecuteCompiler": "ClangTime[ns]",
+    "Total Frontend": "ClangFrontendTime[ns]",
+    "Total Source": "ClangSourceTime[ns]",
+    "Total CodeGen Function": "ClangCodeGenFunctionTime[ns]",
+    "Total Backend": "ClangBackendTime[ns]",
+    "Total Optimizer": "ClangOptimizerTime[ns]",
+}
+
+# The timers that make up the total time of jlm-opt
+JLM_OPT_TIMERS = {
+    "InterProceduralGraphToRvsdg": "RvsdgConstructionTime[ns]",
+    "RVSDGOPTIMIZATION": "OptimizationTime[ns]",
+    "RVSDGDESTRUCTION": "RvsdgDestructionTime[ns]",
+}
+
+# The reports printed by opt -time-passes, and the columns their Total becomes
+OPT_TIME_PASSES_REPORTS = {
+    "Pass execution timing report": "OptPassTime[ns]",
+    "LLVM IR Parsing": "OptParsingTime[ns]",
+}
+
+def read_clang_time_trace(path):
+    """
+    Reads the summary events of a clang time trace. Their durations are given in microseconds.
+    """
+    with open(path, "r", encoding="utf-8") as fd:
+        trace = json.load(fd)
+
+    data = {}
+    for event in trace.get("traceEvents", []):
+        column = CLANG_TRACE_EVENTS.get(event.get("name"))
+        if column is not None and "dur" in event:
+            data[column] = event["dur"] * 1000
+    return data
+
+def read_opt_time_passes(path):
+    """
+    Reads the reports printed by opt -time-passes -time-passes-per-run.
+    Runs of the same pass are summed into one OptPass-<name>[ns] column,
+    and the Total of each report becomes Opt<report>Time[ns].
+    """
+    data = {}
+    with open(path, "r", encoding="utf-8") as fd:
+        for report, name, wall_time in benchmark.iter_time_passes_reports(fd):
+            if name == "Total":
+                data[OPT_TIME_PASSES_REPORTS[report]] = wall_time
+            elif report == "Pass execution timing report":
+                column = f"OptPass-{benchmark.get_statistic_name(name)}[ns]"
+                data[column] = data.get(column, 0) + wall_time
+    return data
+
+def read_jlm_opt_time(path):
+    """
+    Reads the total time spent in jlm-opt from a statistics file, if it contains all the needed timers.
+    """
+    data = {}
+    for statistic, values in stats_ingest.iter_stats_file(path):
+        if statistic not in JLM_OPT_TIMERS:
+            continue
+        for name, value in values:
+            if name == "Time[ns]":
+                data.setdefault(JLM_OPT_TIMERS[statistic], int(value))
+
+    if len(data) != len(JLM_OPT_TIMERS):
+        return {}
+    return {"JlmOptTime[ns]": sum(data.values())}
+
+def extract_frontend_data(folder):
+    """
+    Creates one row per C file with frontend traces in the given statistics folder.
+    If the jlm-opt statistics of the file are also present, its total time is included.
+    """
+    rows = {}
+    files = os.listdir(folder)
+    for fil in files:
+        if fil.endswith(CLANG_TRACE_SUFFIX):
+            cfile = fil[:-len(CLANG_TRACE_SUFFIX)]
+            rows.setdefault(cfile, {"cfile": cfile}).update(read_clang_time_trace(os.path.join(folder, fil)))
+        elif fil.endswith(OPT_TRACE_SUFFIX):
+            cfile = fil[:-len(OPT_TRACE_SUFFIX)]
+            rows.setdefault(cfile, {"cfile": cfile}).update(read_opt_time_passes(os.path.join(folder, fil)))
+
+    for cfile, row in rows.items():
+        stats_file = os.path.join(folder, f"{cfile}.log")
+        if os.path.exists(stats_file):
+            row.update(read_jlm_opt_time(stats_file))
+
+    return pd.DataFrame(rows.values())
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the frontend cost per file from a benchmark run with --frontendTrace.')
+    parser.add_argument('--stats-in', dest='stats_in', action='store', required=True,
+                        help='The folder where the statistics files and frontend traces of the run are located')
+    parser.add_argument('--out', dest='out', action='store', default=None,
+                        help='Folder where the per-file summary should be placed as frontend-file-data.csv')
+    args = parser.parse_args()
+
+    file_data = extract_frontend_data(args.stats_in)
+    if len(file_data) == 0:
+        print(f"No frontend traces found in {args.stats_in}")
+        return
+
+    file_data.fillna(0, inplace=True)
+    for column in ["ClangTime[ns]", "OptParsingTime[ns]", "OptPassTime[ns]", "JlmOptTime[ns]"]:
+        if column not in file_data:
+            file_data[column] = 0
+    file_data["FrontendTime[ns]"] = file_data["ClangTime[ns]"] + file_data["OptParsingTime[ns]"] + file_data["OptPassTime[ns]"]
+    file_data["FrontendShare"] = file_data["FrontendTime[ns]"] / (file_data["FrontendTime[ns]"] + file_data["JlmOptTime[ns]"])
+    file_data.sort_values("FrontendTime[ns]", ascending=False, inplace=True)
+
+    total_frontend = file_data["FrontendTime[ns]"].sum()
+    total_jlm_opt = file_data["JlmOptTime[ns]"].sum()
+    print(f"Files: {len(file_data)}")
+    print(f"Total clang time:   {file_data['ClangTime[ns]'].sum() / 1e9:10.3f}s")
+    print(f"Total opt time:     {(file_data['OptParsingTime[ns]'] + file_data['OptPassTime[ns]']).sum() / 1e9:10.3f}s")
+    print(f"Total jlm-opt time: {total_jlm_opt / 1e9:10.3f}s")
+    if total_frontend + total_jlm_opt > 0:
+        print(f"The frontend is {total_frontend / (total_frontend + total_jlm_opt) * 100:.1f}% of the total time")
+
+    print()
+    print("Files with the most frontend time:")
+    print(file_data[["cfile", "ClangTime[ns]", "OptPassTime[ns]", "JlmOptTime[ns]", "FrontendShare"]].head(10).to_string(index=False))
+
+    pass_columns = [column for column in file_data.columns if column.startswith("OptPass-")]
+    if len(pass_columns) > 0:
+        print()
+        print("Most expensive opt passes:")
+        print(file_data[pass_columns].sum().sort_values(ascending=False).head(10).to_string())
+
+    if args.out is not None:
+        if not os.path.exists(args.out):
+            os.mkdir(args.out)
+        file_data.to_csv(os.path.join(args.out, "frontend-file-data.csv"), index=False)
+
+if __name__ == "__main__":
+    main()
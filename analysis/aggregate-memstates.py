@@ -8,6 +8,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import argparse
 import re
+import stats_ingest
 
 def get_memory_node_counts(suffix):
     return [
@@ -33,12 +34,18 @@ def map_optimization_statistic(original_name):
 
     return "TransformationPass-" + original_name
 
+def map_llvm_baseline_statistic(original_name):
+    if original_name == "Time[ns]":
+        return "LLVMOptBaselineTime[ns]"
+
+    return "LLVMOptBaseline-" + original_name
+
 # For each statistic, this dict contains which values to keep
 # If the entry is a tuple (name, rename), the statistic called `name` will be kept, but be called `rename`
 # If the entry is a function, it takes the old name and provides the new name, or None to discard
 METRICS_MAPPING = {
     "AndersenAnalysis": [
-        "#RvsdgNodes",
+        "#RvsdgNodes", "#PointerObjects", "#BaseConstraints", "#SupersetConstraints",
         "#PointsToGraphAllocaNodes", "#PointsToGraphMallocNodes", "#PointsToGraphDeltaNodes", "#PointsToGraphImportNodes", "#PointsToGraphLambdaNodes",
         "#PointsToGraphMemoryNodes", "#PointsToGraphRegisterNodes", "#PointsToGraphEscapedNodes", "#PointsToGraphNodes", "#PointsToGraphEdges",
         ("AnalysisTimer[ns]", "AndersenAnalysisTimer[ns]"),
@@ -83,6 +90,29 @@ METRICS_MAPPING = {
     "RVSDGOPTIMIZATION": map_optimization_statistic,
     "RVSDGDESTRUCTION": [
         ("Time[ns]", "RvsdgDestructionTime[ns]")
+    ],
+    # Only present if the file was split into chunks before running jlm-opt
+    "SplitModule": [
+        "#SplitChunks"
+    ],
+    # Only present in runs with --llvmBaseline, where opt replaces jlm-opt
+    "LLVMOptBaseline": map_llvm_baseline_statistic,
+    # The wall time of the whole jlm-opt task, as measured by benchmark.py
+    "JlmOptTask": [
+        ("WallTime[ns]", "JlmOptWallTime[ns]"),
+        "#InputBytes"
+    ],
+    # Only present in runs with --rssSampleInterval
+    "MemoryTimeline": [
+        "PeakRss[kB]", "PeakPss[kB]", "PeakRssTime[ms]"
+    ],
+    # Only present in profiled runs, whose timers are left out, see stats_ingest.drop_profiled_timers
+    "Profiled": [
+        ("Profiler", "Profiled")
+    ],
+    # Only present in runs with --perfCounters. Events that could not be counted are missing
+    "PerfCounters": [
+        "#Cycles", "#Instructions", "#BranchMisses", "#LLCLoadMisses", "#dTLBLoadMisses"
     ]
 }
 
@@ -104,66 +134,30 @@ def read_rvsdg_tree(path, prefix):
 
     return { f"{prefix}{key}": value for key, value in data.items() }
 
-def get_metric_name(statistic, original_name):
-    if statistic not in METRICS_MAPPING:
-        return None
-
-    mapping = METRICS_MAPPING[statistic]
-
-    if callable(mapping):
-        return mapping(original_name)
-
-    for entry in mapping:
-        if isinstance(entry, tuple):
-            old, new = entry
-            if original_name == old:
-                return new
-        elif original_name == entry:
-            return entry
-
-    return None
+METRICS_LOOKUP = stats_ingest.ColumnLookup(METRICS_MAPPING)
 
-def extract_file_data(folder):
-    file_datas = []
+def read_file_data(cfile, stats_path, related_paths):
+    file_data = {"cfile": cfile}
+    file_data.update(stats_ingest.read_stats_file(stats_path, METRICS_LOOKUP))
 
-    files = os.listdir(folder)
-
-    for fil in files:
-        if not fil.endswith(".log"):
+    for path in related_paths:
+        fil = os.path.basename(path)
+        if not fil.startswith(cfile + "-rvsdgTree"):
             continue
 
-        file_data = {}
-        cfile = fil[:-4]
-        file_data["cfile"] = cfile
-
-        with open(os.path.join(folder, fil), "r", encoding="utf-8") as fd:
-            for line in fd:
-                statistic, _, *parts = line.split(" ")
-
-                for part in parts:
-                    original_name, value = part.split(":")
-
-                    metric_name = get_metric_name(statistic, original_name)
-                    if not metric_name:
-                        continue
-
-                    try:
-                        file_data[metric_name] = int(value)
-                    except:
-                        file_data[metric_name] = value
-
-        for fil2 in files:
-            if not fil2.startswith(cfile):
-                continue
-            if "rvsdgTree" not in fil2:
-                continue
-
-            num = fil2[:-4].split("-")[-1]
-            file_data.update(read_rvsdg_tree(os.path.join(folder, fil2), f"Tree{num}-"))
+        num = fil[:-4].split("-")[-1]
+        file_data.update(read_rvsdg_tree(path, f"Tree{num}-"))
 
-        file_datas.append(file_data)
+    return file_data
 
-    return pd.DataFrame(file_datas)
+def extract_file_data(folder, cache_path, workers=None):
+    """
+    Reads the statistics files in the given folder, reusing rows from the cache for files that have not changed
+    """
+    # Statistics from whole-program jlm-opt runs are named after the program, and are not included in the index
+    index = stats_ingest.StatsDirectoryIndex(folder)
+    version = stats_ingest.hash_sources(__file__, stats_ingest.__file__)
+    return stats_ingest.ingest_incrementally(index, read_file_data, cache_path, version, workers)
 
 def calculate_total_ramrs_time(file_data):
     file_data["RegionAwareModRefSummarizerTime[ns]"] = (
@@ -175,8 +169,18 @@ def calculate_total_ramrs_time(file_data):
         file_data["AnnotationTimer[ns]"] +
         file_data["SolvingTimer[ns]"])
 
-def make_file_data(folder, configuration):
-    file_data = extract_file_data(folder)
+def calculate_perf_counter_rates(file_data):
+    """Adds instructions per cycle, and misses per thousand instructions, for the counters that are present"""
+    if "#Instructions" not in file_data:
+        return
+    if "#Cycles" in file_data:
+        file_data["IPC"] = file_data["#Instructions"] / file_data["#Cycles"]
+    for counter in ["#BranchMisses", "#LLCLoadMisses", "#dTLBLoadMisses"]:
+        if counter in file_data:
+            file_data[counter[1:] + "PerKiloInstruction"] = file_data[counter] / file_data["#Instructions"] * 1000
+
+def make_file_data(folder, configuration, cache_dir, workers=None):
+    file_data = extract_file_data(folder, os.path.join(cache_dir, f"memstates-{os.path.basename(folder)}"), workers)
     file_data["Configuration"] = configuration
 
     return file_data
@@ -187,6 +191,12 @@ def main():
                         help='The folder where statistics files are located')
     parser.add_argument('--stats-out', dest='stats_out', action='store', default="statistics-out",
                         help='Folder where aggregated statistics should be placed')
+    parser.add_argument('--workers', metavar='N', dest='workers', action='store', default=None, type=int,
+                        help='The number of processes reading statistics files in parallel. [one per CPU]')
+    parser.add_argument('--clean', dest='clean', action='store_true',
+                        help='Read all statistics files again, instead of only new or changed files')
+    parser.add_argument('--csv', dest='csv', action='store_true',
+                        help='Also write the aggregated statistics as memstate-file-data.csv')
     args = parser.parse_args()
 
     if not os.path.exists(args.stats_out):
@@ -194,23 +204,33 @@ def main():
     def stats_out(filename=""):
         return os.path.join(args.stats_out, filename)
 
+    # Rows read from each statistics folder are kept here, to only read new or changed files in later runs
+    cache_dir = stats_out("ingest-cache")
+    if args.clean:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
     data = (
-        #make_file_data(os.path.join(args.stats_in, "debug-raware"), "RegionAwareModRef"),
-        make_file_data(os.path.join(args.stats_in, "raware"), "RegionAwareModRef"),
-        #make_file_data(os.path.join(args.stats_in, "raware-no-tricks"), "RegionAwareModRef-NoTricks"),
-        #make_file_data(os.path.join(args.stats_in, "raware-only-dead-alloca-blocklist"), "RegionAwareModRef-OnlyDeadAllocaBlocking"),
-        #make_file_data(os.path.join(args.stats_in, "raware-only-non-reentrant-alloca-blocklist"), "RegionAwareModRef-OnlyNonReeentrantAllocaBlocking"),
-        #make_file_data(os.path.join(args.stats_in, "raware-only-operation-size-blocking"), "RegionAwareModRef-OnlyOperationSizeBlocking"),
-        #make_file_data(os.path.join(args.stats_in, "raware-only-constant-memory-blocking"), "RegionAwareModRef-OnlyConstantMemoryBlocking"),
-        #make_file_data(os.path.join(args.stats_in, "agnostic"), "AgnosticModRef"),
-        make_file_data(os.path.join(args.stats_in, "m2r"), "Mem2Reg")
+        #make_file_data(os.path.join(args.stats_in, "debug-raware"), "RegionAwareModRef", cache_dir, args.workers),
+        make_file_data(os.path.join(args.stats_in, "raware"), "RegionAwareModRef", cache_dir, args.workers),
+        #make_file_data(os.path.join(args.stats_in, "raware-no-tricks"), "RegionAwareModRef-NoTricks", cache_dir, args.workers),
+        #make_file_data(os.path.join(args.stats_in, "raware-only-dead-alloca-blocklist"), "RegionAwareModRef-OnlyDeadAllocaBlocking", cache_dir, args.workers),
+        #make_file_data(os.path.join(args.stats_in, "raware-only-non-reentrant-alloca-blocklist"), "RegionAwareModRef-OnlyNonReeentrantAllocaBlocking", cache_dir, args.workers),
+        #make_file_data(os.path.join(args.stats_in, "raware-only-operation-size-blocking"), "RegionAwareModRef-OnlyOperationSizeBlocking", cache_dir, args.workers),
+        #make_file_data(os.path.join(args.stats_in, "raware-only-constant-memory-blocking"), "RegionAwareModRef-OnlyConstantMemoryBlocking", cache_dir, args.workers),
+        #make_file_data(os.path.join(args.stats_in, "agnostic"), "AgnosticModRef", cache_dir, args.workers),
+        make_file_data(os.path.join(args.stats_in, "m2r"), "Mem2Reg", cache_dir, args.workers)
     )
     file_data = pd.concat(data)
 
     # Remove tons of duplicated utilities/polybench.c
     file_data = file_data[~file_data["cfile"].str.contains("utilities_polybench.c")]
 
+    num_profiled = stats_ingest.drop_profiled_timers(file_data)
+    if num_profiled != 0:
+        print(f"Left out the timers of {num_profiled} profiled runs")
+
     calculate_total_ramrs_time(file_data)
+    calculate_perf_counter_rates(file_data)
 
     file_data["TotalTime[ns]"] = file_data["RvsdgConstructionTime[ns]"] + file_data["OptimizationTime[ns]"] + file_data["RvsdgDestructionTime[ns]"]
 
@@ -229,8 +249,12 @@ def main():
     add_total_memory_state_column("sThroughStore")
     add_total_memory_state_column("sIntoCallEntryMerge")
 
+    file_data["program"] = file_data["cfile"].str.split("+").str[0]
 
-    file_data.to_csv(stats_out("memstate-file-data.csv"))
+    # Analysis scripts load the store with stats_ingest.load_table, reading only the partitions and columns they use
+    stats_ingest.write_table_store(file_data, stats_out("memstate-file-data.store"), ["Configuration", "program"])
+    if args.csv:
+        file_data.to_csv(stats_out("memstate-file-data.csv"), index=False)
 
 if __name__ == "__main__":
     main()
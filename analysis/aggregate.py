@@ -6,6 +6,8 @@ import shutil
 import pandas as pd
 import argparse
 import re
+import statistics
+import stats_ingest
 
 # Values from the AndersenAnalysis that should be the same for all configuration
 PER_FILE_STATS = [
@@ -44,6 +46,17 @@ PRECISION_EVALUATION_KEEP_PER_AA = [
 
     "PrecisionEvaluationTimer[ns]"]
 
+# The timers of the Andersen solver that make up the TotalTime of a configuration.
+# Which timers are present depends on the configuration, and missing timers count as 0
+TOTAL_TIME_TIMERS = [
+    "OVSTimer[ns]", "OfflineNormTimer[ns]",
+    "ConstraintSolvingWorklistTimer[ns]", "ConstraintSolvingNaiveTimer[ns]",
+    "ConstraintSolvingWavePropagationTimer[ns]", "ConstraintSolvingDeepPropagationTimer[ns]"
+]
+
+# The columns of file_config_data, apart from the timers
+FILE_CONFIG_STATS = ["Configuration", "cfile", "program", "#Repetitions", "#RvsdgNodes", "#PointerObjects", "#ExplicitPointees"]
+
 def line_to_dict(stats_line):
     """
     Splits the given line into a tuple (statistic, {key:value})
@@ -82,10 +95,15 @@ def keep_file_stats(program, cfile, line_stats):
 
     return stats
 
-# Due to splitting workloads, the same cfile can have multiple statistics files
-def handle_statistics_file(stats_filename, cfile, file_datas):
+def read_statistics_file(cfile, stats_filename, related_filenames):
+    """
+    Reads the statistics file of one cfile into a single row.
+    @return the row as a dict, or None if the file did not contain any AndersenAnalysis statistics
+    """
     file_precision_stats = {}
     file_andersen_stats = None
+    file_split_stats = {}
+    file_perf_stats = {}
 
     program = cfile.split("+")[0]
 
@@ -104,6 +122,27 @@ def handle_statistics_file(stats_filename, cfile, file_datas):
                     line_stats[aaType + col] = line_stats[col]
                 file_precision_stats.update(line_stats)
 
+            elif statistic == "SplitModule":
+                # The statistics are the sum of running jlm-opt on multiple chunks of the file
+                file_split_stats.update(line_stats)
+
+            elif statistic == "JlmOptTask":
+                # The wall time of the whole jlm-opt task, and the size of its input
+                file_perf_stats["JlmOptWallTime[ns]"] = line_stats["WallTime[ns]"]
+                file_perf_stats["#InputBytes"] = line_stats["#InputBytes"]
+
+            elif statistic == "PerfCounters":
+                # Hardware performance counters for the whole jlm-opt process, from runs with --perfCounters
+                file_perf_stats.update(line_stats)
+
+            elif statistic == "MemoryTimeline":
+                # Peak memory use of the jlm-opt process, from runs with --rssSampleInterval
+                file_perf_stats.update(line_stats)
+
+            elif statistic == "Profiled":
+                # The run was slowed down by a profiler, so its timers are left out after ingestion
+                file_perf_stats["Profiled"] = line_stats["Profiler"]
+
             else:
                 print("Ignoring unknown statistic:", statistic)
 
@@ -112,75 +151,169 @@ def handle_statistics_file(stats_filename, cfile, file_datas):
         if col in file_precision_stats:
             del file_precision_stats[col]
 
-    if cfile not in file_datas:
-        file_datas[cfile] = {}
-    if file_andersen_stats is not None:
-        file_datas[cfile].update(file_andersen_stats)
-    if file_precision_stats is not None:
-        file_datas[cfile].update(file_precision_stats)
+    # Skip files that did not actually have statistics
+    if file_andersen_stats is None:
+        return None
+
+    file_data = file_andersen_stats
+    file_data.update(file_precision_stats)
+    file_data.update(file_split_stats)
+    file_data.update(file_perf_stats)
+    return file_data
 
-def extract_statistics(stats_folder):
+def reduce_sweep_repetitions(program, cfile, configuration, repetitions):
     """
-    Create one dataframe with one row for each cfile.
-    @return file_data, file_config_data
+    Reduces the repetitions of one Andersen configuration on one cfile into a single row.
+    Each timer becomes a <timer>Min[ns] and <timer>Median[ns] column. Other values are the same in every
+    repetition, and are taken from the first one.
     """
+    row = {
+        "cfile": cfile,
+        "program": program,
+        "Configuration": configuration,
+        "#Repetitions": len(repetitions)
+    }
+    for name in dict.fromkeys(name for repetition in repetitions for name in repetition):
+        values = [repetition[name] for repetition in repetitions if name in repetition]
+        if name.endswith("[ns]"):
+            row[f"{name[:-4]}Min[ns]"] = min(values)
+            row[f"{name[:-4]}Median[ns]"] = int(statistics.median(values))
+        else:
+            row[name] = values[0]
+    return row
 
-    if not os.path.exists(stats_folder):
-        return pd.DataFrame(), pd.DataFrame()
-
-    files = os.listdir(stats_folder)
-    file_datas = {}
+def read_sweep_statistics_file(cfile, stats_filename, related_filenames):
+    """
+    Reads every AndersenAnalysis line of a run with --configSweepIterations,
+    where each line has the Configuration it was solved with.
+    The TotalTime of each repetition is the sum of its solver timers. Profiled runs have no timers.
+    The repetitions of each configuration are reduced here, so only one row per configuration leaves the worker.
+    @return a list with one row per configuration
+    """
+    program = cfile.split("+")[0]
+    repetitions = {}
+    profiled = False
 
-    for filename in files:
-        if "+" not in filename or not filename.endswith(".log"):
+    for statistic, values in stats_ingest.iter_stats_file(stats_filename):
+        if statistic == "Profiled":
+            profiled = True
+        if statistic != "AndersenAnalysis":
             continue
+        line_stats = {}
+        for name, value in values:
+            try:
+                line_stats[name] = int(value)
+            except ValueError:
+                line_stats[name] = value
+        configuration = line_stats.pop("Configuration", None)
+        if configuration is None:
+            continue
+        line_stats["TotalTime[ns]"] = sum(line_stats.get(timer, 0) for timer in TOTAL_TIME_TIMERS)
+        repetitions.setdefault(configuration, []).append(line_stats)
 
-        # remove .log suffix
-        cfile = filename[:-4]
+    if profiled:
+        for lines in repetitions.values():
+            for line_stats in lines:
+                for name in [name for name in line_stats if name.endswith("[ns]")]:
+                    del line_stats[name]
 
-        stats_filename = os.path.join(stats_folder, filename)
-        handle_statistics_file(stats_filename, cfile, file_datas)
+    return [reduce_sweep_repetitions(program, cfile, configuration, lines)
+            for configuration, lines in repetitions.items()]
 
-    # Skip files that did not actually have statistics
-    file_datas = { cfile: data for cfile, data in file_datas.items() if "cfile" in data }
+def extract_sweep_statistics(stats_folder, sweep_data_out, chunk_rows, workers=None):
+    """
+    Creates a table store with one row per cfile and Andersen configuration, from a configuration sweep.
+    Rows are written in chunks while the statistics files are read, so memory use does not grow with the sweep.
+    """
+    if not os.path.exists(stats_folder):
+        return
+
+    index = stats_ingest.StatsDirectoryIndex(stats_folder)
+    with stats_ingest.TableStoreWriter(sweep_data_out, ["Configuration", "program"]) as writer:
+        num_rows = stats_ingest.ingest_streaming(index, read_sweep_statistics_file, writer, chunk_rows, workers)
+    print(f"Wrote {num_rows} cfile and configuration pairs from {stats_folder}")
+
+def make_file_config_data(sweep_data, file_config_data_out, reduce, file_config_data_csv_out=None):
+    """
+    Creates the long format table with one row per cfile and configuration used by compare-anf.py,
+    where each timer of a configuration is the minimum or median over its repetitions.
+    Only the needed columns of the sweep are loaded, one file of the store at a time,
+    so memory use does not grow with the sweep.
+    @param reduce: either "min" or "median"
+    """
+    if not os.path.isdir(sweep_data):
+        return
+
+    suffix = f"{reduce.capitalize()}[ns]"
+    timers = [timer[:-4] + suffix for timer in ["TotalTime[ns]", *TOTAL_TIME_TIMERS]]
+    renames = {timer: timer[:-len(suffix)] + "[ns]" for timer in timers}
+    available = [renames.get(column, column) for column in stats_ingest.read_table_store_columns(sweep_data)]
+    columns = [column for column in FILE_CONFIG_STATS + ["TotalTime[ns]", *TOTAL_TIME_TIMERS] if column in available]
+    if len(columns) == 0:
+        return
+
+    num_rows = 0
+    with stats_ingest.TableStoreWriter(file_config_data_out, ["Configuration", "program"]) as writer:
+        for part in stats_ingest.iter_table_store(sweep_data, columns=FILE_CONFIG_STATS + timers):
+            # Every part has the same columns, so the CSV file can be written one part at a time
+            part = part.rename(columns=renames).reindex(columns=columns)
+            writer.write(part)
+            if file_config_data_csv_out is not None:
+                part.to_csv(file_config_data_csv_out, mode="w" if num_rows == 0 else "a",
+                            header=num_rows == 0, index=False)
+            num_rows += len(part)
+
+def extract_statistics(stats_folder, cache_path, workers=None):
+    """
+    Create one dataframe with one row for each cfile.
+    Only statistics files that are new or changed since the last run with the same cache_path are read.
+    @return file_data
+    """
+
+    if not os.path.exists(stats_folder):
+        return pd.DataFrame()
+
+    index = stats_ingest.StatsDirectoryIndex(stats_folder)
+    version = stats_ingest.hash_sources(__file__, stats_ingest.__file__)
+    file_datas = stats_ingest.ingest_incrementally(index, read_statistics_file, cache_path, version, workers)
 
     if len(file_datas) == 0:
         return pd.DataFrame()
 
-    file_datas = pd.DataFrame(file_datas.values()).set_index("cfile")
-
-    # Calculate a TotalTime column, using 0 where values are missing
-    #with_nan0 = file_config_datas.fillna(0)
-    #total_time = 0
-    #if "OVSTimer[ns]" in with_nan0:
-    #    total_time += with_nan0["OVSTimer[ns]"]
-    #if "OfflineNormTimer[ns]" in with_nan0:
-    #    total_time += with_nan0["OfflineNormTimer[ns]"]
-    #if "ConstraintSolvingWorklistTimer[ns]" in with_nan0:
-    #    total_time += with_nan0["ConstraintSolvingWorklistTimer[ns]"]
-    #if "ConstraintSolvingNaiveTimer[ns]" in with_nan0:
-    #    total_time += with_nan0["ConstraintSolvingNaiveTimer[ns]"]
-    #if "ConstraintSolvingWavePropagationTimer[ns]" in with_nan0:
-    #    total_time += with_nan0["ConstraintSolvingWavePropagationTimer[ns]"]
-    #if "ConstraintSolvingDeepPropagationTimer[ns]" in with_nan0:
-    #    total_time += with_nan0["ConstraintSolvingDeepPropagationTimer[ns]"]
-    #file_config_datas["TotalTime[ns]"] = total_time
+    file_datas = file_datas.set_index("cfile")
 
-    return file_datas
+    num_profiled = stats_ingest.drop_profiled_timers(file_datas)
+    if num_profiled != 0:
+        print(f"Left out the timers of {num_profiled} profiled runs in {stats_folder}")
+
+    # Rates that make performance counters comparable between files of different sizes
+    if "#Instructions" in file_datas:
+        if "#Cycles" in file_datas:
+            file_datas["IPC"] = file_datas["#Instructions"] / file_datas["#Cycles"]
+        for counter in ["#BranchMisses", "#LLCLoadMisses", "#dTLBLoadMisses"]:
+            if counter in file_datas:
+                file_datas[counter[1:] + "PerKiloInstruction"] = file_datas[counter] / file_datas["#Instructions"] * 1000
 
+    return file_datas
 
-def extract_or_load(stats_in, file_data_out):
-    if os.path.exists(file_data_out):
-        file_data = pd.read_csv(file_data_out)
 
-    else:
-        file_data_raware = extract_statistics(os.path.join(stats_in, "raware"))
+def extract_or_load(stats_in, file_data_out, cache_dir, workers=None, file_data_csv_out=None):
+    """
+    Reads new and changed statistics files, and merges them into the rows of previous runs, kept in cache_dir.
+    The result is written to file_data_out as a table store partitioned by program,
+    and to file_data_csv_out as CSV if it is given.
+    """
+    file_data_raware = extract_statistics(os.path.join(stats_in, "raware"),
+                                          os.path.join(cache_dir, "file_data-raware"),
+                                          workers)
 
-        file_data = pd.concat([file_data_raware.reset_index()], axis="rows")
-        file_data.drop_duplicates(subset="cfile", inplace=True)
-        file_data.set_index("cfile", inplace=True)
+    file_data = pd.concat([file_data_raware.reset_index()], axis="rows")
+    file_data.drop_duplicates(subset="cfile", inplace=True)
+    stats_ingest.write_table_store(file_data, file_data_out, ["program"])
+    if file_data_csv_out is not None:
+        file_data.to_csv(file_data_csv_out, index=False)
 
-        file_data.to_csv(file_data_out)
+    file_data.set_index("cfile", inplace=True)
 
     return file_data
 
@@ -192,6 +325,17 @@ def main():
                         help='Folder where aggregated statistics files should be placed')
     parser.add_argument('--clean', dest='clean', action='store_true',
                         help='Remove previous extracted aggregation files before running')
+    parser.add_argument('--workers', metavar='N', dest='workers', action='store', default=None, type=int,
+                        help='The number of processes reading statistics files in parallel. [one per CPU]')
+    parser.add_argument('--csv', dest='csv', action='store_true',
+                        help='Also write the aggregated statistics as file_data.csv')
+    parser.add_argument('--sweep', dest='sweep', action='store_true',
+                        help='Also aggregate every configuration of a run with --configSweepIterations into sweep_data.store, '
+                             'and the TotalTime of each configuration into file_config_data.store')
+    parser.add_argument('--sweep-chunk', metavar='N', dest='sweep_chunk', action='store', default=100_000, type=int,
+                        help='The number of sweep rows held in memory before they are written. [100000]')
+    parser.add_argument('--reduce', dest='reduce', action='store', default="min", choices=["min", "median"],
+                        help='How the repetitions of a configuration are reduced in file_config_data. [min]')
     args = parser.parse_args()
 
     if args.clean:
@@ -203,7 +347,20 @@ def main():
         return os.path.join(args.stats_out, filename)
 
     file_data = extract_or_load(args.stats_in,
-                                stats_out("file_data.csv"))
+                                stats_out("file_data.store"),
+                                stats_out("ingest-cache"),
+                                args.workers,
+                                stats_out("file_data.csv") if args.csv else None)
+
+    if args.sweep:
+        extract_sweep_statistics(os.path.join(args.stats_in, "raware"),
+                                 stats_out("sweep_data.store"),
+                                 args.sweep_chunk,
+                                 args.workers)
+        make_file_config_data(stats_out("sweep_data.store"),
+                              stats_out("file_config_data.store"),
+                              args.reduce,
+                              stats_out("file_config_data.csv") if args.csv else None)
 
 
 if __name__ == "__main__":
@@ -7,6 +7,7 @@ import matplotlib.pyplot as plt
 import matplotlib.lines as mlines
 import re
 import numpy as np
+import stats_ingest
 
 def print_average_points_to_external_info(file_data):
     # Only includes PointerObjects marked "CanPoint"
@@ -34,7 +35,7 @@ def calculate_average_for_aa(aaName):
     file_data[aaPrefix + "CA_MustAlias"] = module_num_clobbers * clobber_average_must_alias
 
     # Calculate weighted average per program
-    per_program = file_data.groupby("program").sum()
+    per_program = file_data.groupby("program", observed=True).sum()
     program_no_alias = per_program[aaPrefix + "CA_NoAlias"] / per_program[aaPrefix + "ModuleNumClobbers"]
     program_may_alias = per_program[aaPrefix + "CA_MayAlias"] / per_program[aaPrefix + "ModuleNumClobbers"]
     program_must_alias = per_program[aaPrefix + "CA_MustAlias"] / per_program[aaPrefix + "ModuleNumClobbers"]
@@ -56,7 +57,7 @@ def calculate_average_for_aa(aaName):
 def calculate_total_query_responses_for_aa(file_data, aa_name):
     """This function is used when considering the total number of alias responses"""
     aa_prefix = aa_name + "-"
-    per_program = file_data.groupby("program").sum()
+    per_program = file_data.groupby("program", observed=True).sum()
 
     result = pd.DataFrame({
         "NoAlias": per_program[aa_prefix + "#TotalNoAlias"],
@@ -165,15 +166,19 @@ def main():
                         help='The output folder for plots')
     args = parser.parse_args()
 
-    file_data = pd.read_csv(os.path.join(args.stats, "file_data.csv"), index_col=0)
+    aas = ["LocalAA", "PointsToGraphAA", "ChainedAA(PointsToGraphAA,LocalAA)"]
+
+    # Only load the per program precision statistics of the alias analyses, and the pointer object counts
+    pointer_columns = ["#PointsToExternalRelations", "#MemoryPointerObjectsCanPoint", "#RegisterPointerObjects"]
+    file_data = stats_ingest.load_table(args.stats, "file_data",
+        columns=lambda column: column == "program" or column in pointer_columns or
+                               any(column.startswith(aa + "-") for aa in aas))
 
     print("LoadsConsideredClobbers:", file_data["LocalAA-LoadsConsideredClobbers"].unique())
     print("DeduplicatingPointers:", file_data["LocalAA-DeduplicatingPointers"].unique())
 
     print_average_points_to_external_info(file_data)
 
-    aas = ["LocalAA", "PointsToGraphAA", "ChainedAA(PointsToGraphAA,LocalAA)"]
-
     # Contains may alias rates, per benchmark and per AA, as numbers between 0 and 100
     may_alias_rates = []
 
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+import os
+import os.path
+import sys
+import re
+import argparse
+import numpy as np
+import pandas as pd
+import stats_ingest
+
+try:
+    import scipy.stats
+except ImportError:
+    scipy = None # Only needed for --test mannwhitney
+
+TESTS = ["mannwhitney", "bootstrap"]
+
+# The number of resamples used by bootstrap tests and confidence intervals
+BOOTSTRAP_SAMPLES = 2000
+
+# Statistics whose counts describe the run or its input rather than what jlm-opt did, such as perf events,
+# RSS samples and the size of the input. They are not compared as counts
+RUN_COUNT_PREFIXES = ["PerfCounters-", "MemoryTimeline-", "JlmOptTask-"]
+
+def read_run_stats(path):
+    """
+    Reads the statistics file of one A/B run. Every number is kept, named <statistic>-<name>.
+    Timers of statistics that occur several times, such as the passes of the optimization pipeline, are summed.
+    Other values keep their first occurrence.
+    """
+    data = {}
+    for statistic, values in stats_ingest.iter_stats_file(path):
+        for name, value in values:
+            if statistic == "ABRun":
+                data[name] = value
+                continue
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+
+            column = f"{statistic}-{name}"
+            if name.endswith("[ns]"):
+                data[column] = data.get(column, 0) + value
+            else:
+                data.setdefault(column, value)
+    return data
+
+def extract_ab_runs(stats_folder):
+    """
+    Finds all <cfile>-ab folders made by benchmark.py --jlm-opt-b, and creates one row per run of each binary.
+    Runs without an ABRun line did not finish, and are skipped.
+    """
+    rows = []
+    for folder in sorted(os.listdir(stats_folder)):
+        if not folder.endswith("-ab"):
+            continue
+        cfile = folder[:-len("-ab")]
+        folder_path = os.path.join(stats_folder, folder)
+        for fil in sorted(os.listdir(folder_path)):
+            if not fil.endswith(".log"):
+                continue
+            row = read_run_stats(os.path.join(folder_path, fil))
+            if "Binary" not in row:
+                continue
+            row["cfile"] = cfile
+            rows.append(row)
+
+    return pd.DataFrame(rows)
+
+def bootstrap_median_ratios(a, b, rng):
+    """
+    :return: the ratio median(b) / median(a) in each of BOOTSTRAP_SAMPLES resamples of the runs
+    """
+    a_medians = np.median(rng.choice(a, size=(BOOTSTRAP_SAMPLES, len(a))), axis=1)
+    b_medians = np.median(rng.choice(b, size=(BOOTSTRAP_SAMPLES, len(b))), axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return b_medians / a_medians
+
+def compare_runs(a, b, test, rng):
+    """
+    Compares the runs of binary A and B on one file.
+    :return: a tuple (median(b) / median(a), p-value for both having the same distribution of times).
+             The p-value is NaN if either binary has fewer than two runs
+    """
+    median_a = np.median(a)
+    ratio = np.median(b) / median_a if median_a > 0 else np.nan
+    if len(a) < 2 or len(b) < 2:
+        return ratio, np.nan
+    if np.all(a == a[0]) and np.all(b == a[0]):
+        return ratio, 1.0
+
+    if test == "mannwhitney":
+        return ratio, scipy.stats.mannwhitneyu(a, b, alternative="two-sided").pvalue
+
+    ratios = bootstrap_median_ratios(a, b, rng)
+    return ratio, min(1.0, 2 * min(np.mean(ratios <= 1), np.mean(ratios >= 1)))
+
+def adjust_p_values(p_values):
+    """
+    Adjusts p-values for testing many files at once, using the Benjamini-Hochberg procedure.
+    NaN p-values are kept, and are not counted as tests.
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full(len(p_values), np.nan)
+    tested = np.flatnonzero(~np.isnan(p_values))
+    order = tested[np.argsort(p_values[tested])]
+    scaled = p_values[order] * len(order) / np.arange(1, len(order) + 1)
+    adjusted[order] = np.minimum(1, np.minimum.accumulate(scaled[::-1])[::-1])
+    return adjusted
+
+def compare_files(runs, timers, test, rng):
+    """
+    :return: a table with one row per file and timer, with the median time of each binary and the p-value.
+             The p-values are adjusted per timer, so each timer is ranked among files as if tested alone
+    """
+    rows = []
+    for cfile, file_runs in runs.groupby("cfile"):
+        binary_a = file_runs[file_runs["Binary"] == "A"]
+        binary_b = file_runs[file_runs["Binary"] == "B"]
+        if len(binary_a) == 0 or len(binary_b) == 0:
+            print(f"WARNING: {cfile} is missing the runs of one of the binaries")
+            continue
+
+        for timer in timers:
+            a = binary_a[timer].dropna().to_numpy(dtype=np.float64)
+            b = binary_b[timer].dropna().to_numpy(dtype=np.float64)
+            if len(a) == 0 or len(b) == 0:
+                continue
+            ratio, p_value = compare_runs(a, b, test, rng)
+            rows.append({"cfile": cfile, "Timer": timer, "#RunsA": len(a), "#RunsB": len(b),
+                         "MedianA[ns]": np.median(a), "MedianB[ns]": np.median(b),
+                         "Delta[ns]": np.median(b) - np.median(a), "Ratio": ratio, "p": p_value})
+
+    per_file = pd.DataFrame(rows, columns=["cfile", "Timer", "#RunsA", "#RunsB", "MedianA[ns]", "MedianB[ns]",
+                                           "Delta[ns]", "Ratio", "p"])
+    per_file["pAdjusted"] = per_file.groupby("Timer", sort=False)["p"].transform(adjust_p_values)
+    return per_file
+
+def summarize_timers(per_file, alpha, rng):
+    """
+    Summarizes each timer over all files. The ratio of a timer is the geometric mean of its ratio on each file,
+    with a bootstrap confidence interval from resampling the files.
+    """
+    rows = []
+    for timer, timer_files in per_file.groupby("Timer", sort=False):
+        log_ratios = np.log(timer_files["Ratio"].to_numpy())
+        log_ratios = log_ratios[np.isfinite(log_ratios)]
+        if len(log_ratios) == 0:
+            continue
+
+        resampled = log_ratios[rng.integers(0, len(log_ratios), size=(BOOTSTRAP_SAMPLES, len(log_ratios)))].mean(axis=1)
+        significant = timer_files["pAdjusted"] < alpha
+        rows.append({
+            "Timer": timer, "#Files": len(log_ratios),
+            "TotalA[ns]": timer_files["MedianA[ns]"].sum(), "TotalB[ns]": timer_files["MedianB[ns]"].sum(),
+            "Ratio": np.exp(log_ratios.mean()),
+            "RatioLow": np.exp(np.quantile(resampled, alpha / 2)),
+            "RatioHigh": np.exp(np.quantile(resampled, 1 - alpha / 2)),
+            "#Slower": int((significant & (timer_files["Ratio"] > 1)).sum()),
+            "#Faster": int((significant & (timer_files["Ratio"] < 1)).sum()),
+        })
+    return pd.DataFrame(rows)
+
+def compare_counts(runs, counts):
+    """
+    Compares values that do not depend on timing, such as the number of memory states, using the median of the runs.
+    :return: a table with one row per count, with the totals of each binary and how many files changed
+    """
+    columns = ["Count", "#FilesChanged", "TotalA", "TotalB", "Change%"]
+    if len(counts) == 0:
+        return pd.DataFrame(columns=columns)
+
+    medians = runs.groupby(["cfile", "Binary"])[counts].median().unstack("Binary")
+    rows = []
+    for count in counts:
+        a = medians[(count, "A")]
+        b = medians[(count, "B")]
+        present = a.notna() & b.notna()
+        rows.append({"Count": count, "#FilesChanged": int((a[present] != b[present]).sum()),
+                     "TotalA": a[present].sum(), "TotalB": b[present].sum()})
+
+    counts_table = pd.DataFrame(rows, columns=columns[:-1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        counts_table["Change%"] = (counts_table["TotalB"] / counts_table["TotalA"] - 1) * 100
+    return counts_table
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two jlm-opt binaries from the A/B runs of benchmark.py --jlm-opt-b. '
+                                                 'Exits with status 1 if B is significantly slower than A.')
+    parser.add_argument('--stats', dest='stats', action='store', default="statistics/default",
+                        help='The statistics folder of benchmark.py, containing <cfile>-ab folders. [statistics/default]')
+    parser.add_argument('--out', dest='out_dir', action='store', default=None,
+                        help='Folder where the per-file, per-timer and count comparisons should be placed')
+    parser.add_argument('--test', dest='test', action='store', default="mannwhitney", choices=TESTS,
+                        help='The test used to compare the runs of each file. [mannwhitney]')
+    parser.add_argument('--alpha', dest='alpha', action='store', default=0.05, type=float,
+                        help='The significance level, after adjusting each timer for the number of files. [0.05]')
+    parser.add_argument('--top', metavar='N', dest='top', action='store', default=20, type=int,
+                        help='The number of most regressed files to list. [20]')
+    parser.add_argument('--rank-timer', metavar='TIMER', dest='rank_timer', action='store', default="JlmOptTask-WallTime[ns]",
+                        help='The timer used to rank regressed files. [JlmOptTask-WallTime[ns]]')
+    parser.add_argument('--gate', metavar='REGEX', dest='gate', action='store', default=r"^JlmOptTask-WallTime\[ns\]$",
+                        help='Fail if a timer matching REGEX is significantly slower in B, by more than --max-slowdown. '
+                             '[the wall time of jlm-opt]')
+    parser.add_argument('--max-slowdown', metavar='PCT', dest='max_slowdown', action='store', default=2, type=float,
+                        help='The slowdown in percent that a gated timer may have, even when significant. [2]')
+    parser.add_argument('--gate-counts', dest='gate_counts', action='store_true',
+                        help='Also fail if any count, such as the number of memory state arguments, differs on any file')
+    args = parser.parse_args()
+
+    if args.test == "mannwhitney" and scipy is None:
+        parser.error("--test mannwhitney requires the scipy module, use --test bootstrap")
+
+    runs = extract_ab_runs(args.stats)
+    if len(runs) == 0:
+        sys.exit(f"No A/B runs found in {args.stats}")
+
+    timers = [column for column in runs.columns if column.endswith("[ns]")]
+    counts = [column for column in runs.columns
+              if "-#" in column and not column.startswith(tuple(RUN_COUNT_PREFIXES))]
+    print(f"Files: {runs['cfile'].nunique()}, runs: {(runs['Binary'] == 'A').sum()} of A and {(runs['Binary'] == 'B').sum()} of B")
+    print()
+
+    # A fixed seed, so the same runs always give the same intervals
+    rng = np.random.default_rng(0)
+    per_file = compare_files(runs, timers, args.test, rng)
+    if len(per_file) == 0:
+        sys.exit(f"No file in {args.stats} has timers from the runs of both binaries")
+    if len(counts) == 0:
+        print("WARNING: the runs have no counts to compare")
+    per_timer = summarize_timers(per_file, args.alpha, rng)
+    counts_table = compare_counts(runs, counts)
+
+    with pd.option_context("display.float_format", "{:,.3f}".format, "display.width", 200,
+                           "display.max_colwidth", 80):
+        print(f"Timers of B relative to A, with {(1 - args.alpha) * 100:g}% confidence intervals:")
+        print(per_timer.to_string(index=False))
+        print()
+
+        changed = counts_table[counts_table["#FilesChanged"] > 0]
+        if len(changed) > 0:
+            print("Counts that changed:")
+            print(changed.to_string(index=False))
+        else:
+            print("No counts changed")
+        print()
+
+        ranked = per_file[(per_file["Timer"] == args.rank_timer) & (per_file["pAdjusted"] < args.alpha)
+                          & (per_file["Ratio"] > 1)].sort_values("Delta[ns]", ascending=False)
+        print(f"Files most significantly regressed in {args.rank_timer}: {len(ranked)}")
+        if len(ranked) > 0:
+            print(ranked.head(args.top)[["cfile", "MedianA[ns]", "MedianB[ns]", "Delta[ns]", "Ratio", "pAdjusted"]]
+                  .to_string(index=False))
+        print()
+
+    if args.out_dir is not None:
+        if not os.path.exists(args.out_dir):
+            os.mkdir(args.out_dir)
+        per_file.to_csv(os.path.join(args.out_dir, "ab-per-file.csv"), index=False)
+        per_timer.to_csv(os.path.join(args.out_dir, "ab-per-timer.csv"), index=False)
+        counts_table.to_csv(os.path.join(args.out_dir, "ab-counts.csv"), index=False)
+
+    # The gate fails on timers that are significantly slower as a whole, and by more than the allowed slowdown
+    gated = per_timer[per_timer["Timer"].str.contains(args.gate)]
+    regressed = gated[(gated["RatioLow"] > 1) & (gated["Ratio"] > 1 + args.max_slowdown / 100)]
+    failures = [f"{row.Timer} is {(row.Ratio - 1) * 100:.1f}% slower" for row in regressed.itertuples()]
+    if args.gate_counts:
+        failures.extend(f"{row.Count} changed on {row['#FilesChanged']} files"
+                        for _, row in counts_table[counts_table["#FilesChanged"] > 0].iterrows())
+
+    if len(gated) == 0:
+        print(f"WARNING: no timers match the gate {args.gate}")
+    if len(failures) > 0:
+        print("FAIL:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("PASS")
+    return 0
+
+if __name__ == "__main__":
+    returncode = main()
+    sys.exit(returncode)
@@ -6,6 +6,7 @@ import seaborn as sns
 import numpy as np
 import argparse
 import os
+import stats_ingest
 
 # This file makes plots and tables with general information about the different configurations
 # "anf" refers to ANDERSEN_NO_FLAGS, and is equivalent to the EP representation, btw.
@@ -33,8 +34,9 @@ args = parser.parse_args()
 def out_path(filename):
     return os.path.join(args.out_dir, filename)
 
-file_data = pd.read_csv(os.path.join(args.stats, "file_data.csv"))
-all_configs = pd.read_csv(os.path.join(args.stats, "file_config_data.csv"))
+file_data = stats_ingest.load_table(args.stats, "file_data", columns=["cfile", "#RvsdgNodes", "#PointerObjects"])
+all_configs = stats_ingest.load_table(args.stats, "file_config_data",
+                                      columns=["Configuration", "cfile", "TotalTime[ns]", "#RvsdgNodes", "#ExplicitPointees"])
 
 # Remove empty files
 file_data = file_data[file_data["#RvsdgNodes"] > 0]
@@ -50,17 +52,17 @@ print("Number of configurations with EP:", len(all_ep_configs["Configuration"].u
 
 # All IP configuration should have exactly the same sets of cfiles
 cfiles_of_ip_configs = all_ip_configs["cfile"].unique()
-assert (all_ip_configs.groupby("Configuration")["cfile"].nunique() == len(cfiles_of_ip_configs)).all()
+assert (all_ip_configs.groupby("Configuration", observed=True)["cfile"].nunique() == len(cfiles_of_ip_configs)).all()
 
 # Remove any cfiles that have only been solved by EP configs
 all_configs = all_configs[all_configs["cfile"].isin(cfiles_of_ip_configs)]
 
 # Find configurations that solved every cfile solved by the IP configs
-solved_all_cfiles = all_configs.groupby("Configuration")["cfile"].nunique() == len(cfiles_of_ip_configs)
+solved_all_cfiles = all_configs.groupby("Configuration", observed=True)["cfile"].nunique() == len(cfiles_of_ip_configs)
 solved_all_cfiles = solved_all_cfiles[solved_all_cfiles]
 
 # Among configurations that have successfully solved all cfiles, add up their total runtime
-total_runtime_per_config = all_configs.groupby("Configuration")["TotalTime[ns]"].sum()
+total_runtime_per_config = all_configs.groupby("Configuration", observed=True)["TotalTime[ns]"].sum()
 total_runtime_per_config = total_runtime_per_config[total_runtime_per_config.index.isin(solved_all_cfiles.index)]
 print("Number of configs left after skipping half-finished:", len(total_runtime_per_config))
 assert len(total_runtime_per_config) > 0
@@ -119,7 +121,7 @@ if has_ep:
 
 # Among all rows in data, picks the fastest TotalTime per cfile and uses that
 def add_oracle_config_per_cfile(data, column_name):
-    idx_per_cfile = data.groupby("cfile")["TotalTime[ns]"].idxmin()
+    idx_per_cfile = data.groupby("cfile", observed=True)["TotalTime[ns]"].idxmin()
     data = data.loc[idx_per_cfile, :]
     add_column_to_total_time(data, column_name)
     return data.set_index("cfile")
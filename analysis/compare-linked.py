@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import os
+import os.path
+import argparse
+import importlib
+import pandas as pd
+import stats_ingest
+
+# The statistics are read with the same mapping as when aggregating, so the compared metrics get the same names
+aggregate_memstates = importlib.import_module("aggregate-memstates")
+
+TIME_METRICS = ["AndersenAnalysisTimer[ns]", "TotalTime[ns]"]
+# The counts of pointer objects and points-to graph edges are used as a proxy for memory use
+SIZE_METRICS = ["#RvsdgNodes", "#PointerObjects", "#PointsToGraphEdges"]
+
+def read_stats_file(path):
+    """
+    Reads the metrics of the given statistics file, named as in memstate-file-data
+    """
+    data = stats_ingest.read_stats_file(path, aggregate_memstates.METRICS_LOOKUP)
+
+    if all(metric in data for metric in ["RvsdgConstructionTime[ns]", "OptimizationTime[ns]", "RvsdgDestructionTime[ns]"]):
+        data["TotalTime[ns]"] = data["RvsdgConstructionTime[ns]"] + data["OptimizationTime[ns]"] + data["RvsdgDestructionTime[ns]"]
+    return data
+
+def extract_linked_comparison(folder):
+    """
+    Finds every program that has been analyzed as a whole, and compares it to the sum of its files.
+    Per-file statistics are named <program>+<file>.log, while whole-program statistics are named <program>.log
+    @return a dataframe with one row per program
+    """
+    files = [fil for fil in os.listdir(folder) if fil.endswith(".log")]
+
+    per_file_logs = {}
+    for fil in files:
+        if "+" in fil:
+            program = fil.split("+")[0]
+            per_file_logs.setdefault(program, []).append(fil)
+
+    rows = []
+    for fil in files:
+        if "+" in fil:
+            continue
+        program = fil[:-4]
+        if program not in per_file_logs:
+            continue
+
+        whole = read_stats_file(os.path.join(folder, fil))
+        per_file = pd.DataFrame([read_stats_file(os.path.join(folder, cfile_log)) for cfile_log in per_file_logs[program]])
+
+        row = {"program": program, "#Files": len(per_file)}
+        for metric in [*SIZE_METRICS, *TIME_METRICS]:
+            if metric not in whole or metric not in per_file:
+                continue
+            row[f"{metric}PerFileSum"] = per_file[metric].sum()
+            row[f"{metric}PerFileMax"] = per_file[metric].max()
+            row[f"{metric}WholeProgram"] = whole[metric]
+            row[f"{metric}Ratio"] = whole[metric] / per_file[metric].sum()
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+def print_scaling_summary(comparison):
+    """
+    For each pair of time and size metric, prints how much faster the time grows than the size
+    when going from per-file analysis to whole-program analysis, across all programs.
+    """
+    for time_metric in TIME_METRICS:
+        for size_metric in SIZE_METRICS:
+            time_ratio = f"{time_metric}Ratio"
+            size_ratio = f"{size_metric}Ratio"
+            if time_ratio not in comparison or size_ratio not in comparison:
+                continue
+            relative = comparison[time_ratio] / comparison[size_ratio]
+            print(f"{time_metric} / {size_metric}: whole-program is {relative.median():.3f}x the per-file sum "
+                  f"(median, min {relative.min():.3f}, max {relative.max():.3f})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-file and whole-program statistics from a linked benchmark run.')
+    parser.add_argument('--stats-in', dest='stats_in', action='store', required=True,
+                        help='The folder where the statistics files of a run with --link are located')
+    parser.add_argument('--out', dest='out', action='store', default=None,
+                        help='Folder where the comparison should be placed as linked-comparison.csv')
+    args = parser.parse_args()
+
+    comparison = extract_linked_comparison(args.stats_in)
+    if len(comparison) == 0:
+        print(f"No whole-program statistics found in {args.stats_in}")
+        return
+
+    comparison.sort_values("#Files", inplace=True)
+    comparison.set_index("program", inplace=True)
+
+    ratio_columns = [column for column in comparison.columns if column.endswith("Ratio")]
+    print(comparison[["#Files", *ratio_columns]].to_string())
+    print()
+    print_scaling_summary(comparison)
+
+    if args.out is not None:
+        if not os.path.exists(args.out):
+            os.mkdir(args.out)
+        comparison.to_csv(os.path.join(args.out, "linked-comparison.csv"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import os
+import os.path
+import argparse
+import pandas as pd
+import numpy as np
+import stats_ingest
+
+def read_stats_file(path):
+    """
+    Reads the total time and problem size from a statistics file made by either jlm-opt or opt.
+    Only the first occurrence of each statistic is used.
+    """
+    data = {}
+    for statistic, values in stats_ingest.iter_stats_file(path):
+        for name, value in values:
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+
+            if statistic == "AndersenAnalysis" and name == "#RvsdgNodes":
+                data.setdefault("#RvsdgNodes", value)
+            elif statistic in ["InterProceduralGraphToRvsdg", "RVSDGOPTIMIZATION", "RVSDGDESTRUCTION"] and name == "Time[ns]":
+                data.setdefault(f"{statistic}Time[ns]", value)
+            elif statistic == "LLVMOptBaseline" and name == "Time[ns]":
+                data.setdefault("LLVMOptBaselineTime[ns]", value)
+
+    jlm_timers = ["InterProceduralGraphToRvsdgTime[ns]", "RVSDGOPTIMIZATIONTime[ns]", "RVSDGDESTRUCTIONTime[ns]"]
+    if all(timer in data for timer in jlm_timers):
+        data["JlmOptTime[ns]"] = sum(data[timer] for timer in jlm_timers)
+    return data
+
+def read_stats_folder(folder):
+    """
+    Reads all per-file statistics files in the given folder
+    @return a dataframe with one row per cfile
+    """
+    rows = []
+    for fil in os.listdir(folder):
+        if not fil.endswith(".log") or "+" not in fil:
+            continue
+        row = read_stats_file(os.path.join(folder, fil))
+        row["cfile"] = fil[:-4]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def make_bucket_table(comparison):
+    """
+    Places files into buckets by the order of magnitude of their #RvsdgNodes,
+    and summarizes the time of jlm-opt relative to the LLVM baseline within each bucket.
+    """
+    magnitude = np.floor(np.log10(comparison["#RvsdgNodes"].clip(lower=1))).astype(int)
+    comparison["Bucket"] = [f"[1e{m}, 1e{m+1})" for m in magnitude]
+    comparison["Magnitude"] = magnitude
+
+    table = comparison.groupby(["Magnitude", "Bucket"]).agg(**{
+        "#Files": ("cfile", "count"),
+        "JlmOptTimeMedian[ns]": ("JlmOptTime[ns]", "median"),
+        "LLVMOptBaselineTimeMedian[ns]": ("LLVMOptBaselineTime[ns]", "median"),
+        "RatioMedian": ("Ratio", "median"),
+        "RatioMax": ("Ratio", "max"),
+    })
+    return table.reset_index("Magnitude", drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the time spent in jlm-opt to the time spent in a comparable opt pipeline, '
+                                                 'per file, bucketed by the size of the file.')
+    parser.add_argument('--jlm-stats', dest='jlm_stats', action='store', required=True,
+                        help='The folder where the statistics files of a normal jlm-opt run are located')
+    parser.add_argument('--baseline-stats', dest='baseline_stats', action='store', required=True,
+                        help='The folder where the statistics files of a run with --llvmBaseline are located')
+    parser.add_argument('--out', dest='out', action='store', default=None,
+                        help='Folder where the comparison should be placed as llvm-baseline-comparison.csv')
+    args = parser.parse_args()
+
+    jlm = read_stats_folder(args.jlm_stats)
+    baseline = read_stats_folder(args.baseline_stats)
+    if len(jlm) == 0 or len(baseline) == 0:
+        print("No statistics found in at least one of the folders")
+        return
+
+    for folder, data, columns in [(args.jlm_stats, jlm, ["#RvsdgNodes", "JlmOptTime[ns]"]),
+                                  (args.baseline_stats, baseline, ["LLVMOptBaselineTime[ns]"])]:
+        missing = [column for column in columns if column not in data.columns]
+        if len(missing) != 0:
+            print(f"The statistics in {folder} are missing {', '.join(missing)}")
+            return
+
+    comparison = jlm[["cfile", "#RvsdgNodes", "JlmOptTime[ns]"]].merge(
+        baseline[["cfile", "LLVMOptBaselineTime[ns]"]], on="cfile", how="inner")
+    comparison = comparison.dropna()
+    if len(comparison) == 0:
+        print("No files have statistics from both jlm-opt and the LLVM baseline")
+        return
+
+    comparison["Ratio"] = comparison["JlmOptTime[ns]"] / comparison["LLVMOptBaselineTime[ns]"]
+    print(f"Files compared: {len(comparison)}, jlm-opt is {comparison['Ratio'].median():.2f}x the LLVM baseline (median)")
+    print(make_bucket_table(comparison).to_string())
+
+    if args.out is not None:
+        if not os.path.exists(args.out):
+            os.mkdir(args.out)
+        comparison.sort_values("#RvsdgNodes").to_csv(os.path.join(args.out, "llvm-baseline-comparison.csv"), index=False)
+
+if __name__ == "__main__":
+    main()
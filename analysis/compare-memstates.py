@@ -5,6 +5,8 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import plotly.express as px
+import stats_ingest
+from quantile_table import QuantileSummary, print_table
 
 def extract_column(data, column, configuration):
     return data[data["Configuration"] == configuration].set_index("cfile")[column]
@@ -153,107 +155,13 @@ def plot_scatter_between_configs(file_data, column, x_axis, y_axis, savefig=None
     else:
         plt.show()
 
-def print_table(data, name="", number_fmt="{:.0f}"):
-    """
-    Pretty prints the given pandas DataFrame
-    """
-
-    # row major
-    cells = [[""] + ["" for _ in data.columns] for _ in range(len(data) + 1)]
-    cells[0][0] = name
-
-    for j, column in enumerate(data.columns):
-        cells[0][j + 1] = column
-
-    for i, index in enumerate(data.index):
-        cells[i + 1][0] = index
-
-        for j, column in enumerate(data.columns):
-            cells[i + 1][j + 1] = data.loc[index, column]
-
-    # Find the length of the longest cell in each column
-    max_column_width = [0 for _ in cells[0]]
-    for i, row in enumerate(cells):
-        for j, val in enumerate(row):
-
-            if isinstance(val, str):
-                val_len = len(val)
-            else:
-                val_len = len(number_fmt.format(val))
-
-            max_column_width[j] = max(max_column_width[j], val_len)
-
-    START = "| "
-    HSTART = "+-"
-
-    END = " |\n"
-    HEND = "-+\n"
-
-    VBAR = " | "
-    HVBAR = "-+-"
-    HBAR = "-"
-
-    # Now print the whole thing
-
-    result = []
-    def out(text):
-        result.append(text)
-
-    def print_hline():
-        out(HSTART)
-        for j, column_width in enumerate(max_column_width):
-            if j != 0:
-                out(HVBAR)
-            out(HBAR * column_width)
-        out(HEND)
-
-    print_hline()
-    for i, row in enumerate(cells):
-        if i == 1:
-            print_hline()
-        out(START)
-        for j, val in enumerate(row):
-            if j != 0:
-                out(VBAR)
-            if isinstance(val, str):
-                out(val + " " * (max_column_width[j] - len(val)))
-            else:
-                val = number_fmt.format(val).replace(",", " ")
-                out(" " * (max_column_width[j] - len(val)) + val)
-        out(END)
-    print_hline()
-
-    print("".join(result))
-
-def table_quartiles_per_configuration(file_data, configurations, column, fmt="{:,.0f}"):
-    df = pd.DataFrame(columns=["p25", "p50", "p75", "p90", "p99", "max", "mean"])
-
-    for configuration in configurations:
-        data = extract_column(file_data, column, configuration)
-        df.loc[configuration, "p25"] = data.quantile(q=0.25)
-        df.loc[configuration, "p50"] = data.quantile(q=0.50)
-        df.loc[configuration, "p75"] = data.quantile(q=0.75)
-        df.loc[configuration, "p90"] = data.quantile(q=0.90)
-        df.loc[configuration, "p99"] = data.quantile(q=0.99)
-        df.loc[configuration, "max"] = data.max()
-        df.loc[configuration, "mean"] = data.mean()
-
+def table_quartiles_per_configuration(summary, configurations, column, fmt="{:,.0f}"):
+    df = summary.per_group(column, configurations, fmt)
     print_table(df, name=column, number_fmt=fmt)
     return df
 
-def table_quartiles_per_column(file_data, configuration, columns, fmt="{:,.0f}"):
-    df = pd.DataFrame(columns=["p25", "p50", "p75", "p90", "p99", "max", "mean"])
-
-    for column in columns:
-        data = extract_column(file_data, column, configuration)
-        df.loc[column, "p25"] = data.quantile(q=0.25)
-        df.loc[column, "p50"] = data.quantile(q=0.50)
-        df.loc[column, "p75"] = data.quantile(q=0.75)
-        df.loc[column, "p90"] = data.quantile(q=0.90)
-        df.loc[column, "p99"] = data.quantile(q=0.99)
-        df.loc[column, "max"] = data.max()
-        df.loc[column, "mean"] = data.mean()
-
+def table_quartiles_per_column(summary, configuration, columns, fmt="{:,.0f}"):
+    df = summary.per_column(configuration, columns, fmt)
     print_table(df, name=configuration, number_fmt=fmt)
     return df
 
@@ -268,16 +176,38 @@ def main():
     args = parser.parse_args()
 
     plotly = args.plotly
-    file_data = pd.read_csv(os.path.join(args.stats, "memstate-file-data.csv"))
+
+    raware_steps = [
+        "CallGraphTimer[ns]",
+        "AllocasDeadInSccsTimer[ns]",
+        "SimpleAllocasSetTimer[ns]",
+        "NonReentrantAllocaSetsTimer[ns]",
+        "CreateExternalModRefSetTimer[ns]",
+        "AnnotationTimer[ns]",
+        "SolvingTimer[ns]",
+        ]
+    andersen_steps = ["AndersenSetBuildingTimer[ns]", "AndersenOVSTimer[ns]", "AndersenWorklistTimer[ns]", "PointsToGraphConstructionTimer[ns]", "AndersenAnalysisTimer[ns]"]
+    tree_columns = [f"Tree{tree}-Num{node}Nodes" for tree in range(5) for node in ["Alloca", "Store", "Load"]]
+    total_time_columns = ["MemoryStateEncodingTime[ns]", "RegionAwareModRefSummarizerTime[ns]", "StoreValueForwardingTime[ns]"]
+
+    # Only load the columns used by the tables below. Add to the list when enabling more of them
+    columns = ["cfile", "Configuration", *raware_steps, *andersen_steps, *total_time_columns, *tree_columns,
+               "#TotalLoads", "#LoadsForwarded"]
+    file_data = stats_ingest.load_table(args.stats, "memstate-file-data", columns=columns)
 
     def result(filename=""):
         return os.path.join(args.out, filename)
 
     # Remove all files that are not present in all configurations
     nconfigs = file_data["Configuration"].nunique()
-    keep_cfiles = file_data.groupby("cfile")["Configuration"].nunique() == nconfigs
+    keep_cfiles = file_data.groupby("cfile", observed=True)["Configuration"].nunique() == nconfigs
     file_data = file_data[file_data["cfile"].map(keep_cfiles)]
 
+    # The statistics of every column and configuration, computed once. The tables below are slices of it.
+    # Columns missing from the aggregated statistics are left out, and show up as empty rows in the tables
+    summary = QuantileSummary(file_data, [column for column in columns
+                                          if column in file_data and column not in ["cfile", "Configuration"]])
+
     raware_configurations = ["RegionAwareModRef",
                              "RegionAwareModRef-OnlyDeadAllocaBlocking",
                              "RegionAwareModRef-OnlyNonReeentrantAllocaBlocking",
@@ -289,21 +219,11 @@ def main():
     #    "RvsdgDestructionTime[us]",
     #]
 
-    #table_quartiles_per_column(file_data, "RegionAwareModRef", passes)
+    #table_quartiles_per_column(summary, "RegionAwareModRef", passes)
 
-    raware_steps = [
-        "CallGraphTimer[ns]",
-        "AllocasDeadInSccsTimer[ns]",
-        "SimpleAllocasSetTimer[ns]",
-        "NonReentrantAllocaSetsTimer[ns]",
-        "CreateExternalModRefSetTimer[ns]",
-        "AnnotationTimer[ns]",
-        "SolvingTimer[ns]",
-        ]
-    table_quartiles_per_column(file_data, "RegionAwareModRef", raware_steps)
+    table_quartiles_per_column(summary, "RegionAwareModRef", raware_steps)
 
-    andersen_steps = ["AndersenSetBuildingTimer[ns]", "AndersenOVSTimer[ns]", "AndersenWorklistTimer[ns]", "PointsToGraphConstructionTimer[ns]", "AndersenAnalysisTimer[ns]"]
-    table_quartiles_per_column(file_data, "RegionAwareModRef", andersen_steps)
+    table_quartiles_per_column(summary, "RegionAwareModRef", andersen_steps)
 
     #plot_scatter(file_data, "RegionAwareModRef", x_axis="#RvsdgNodes", y_axis="RegionAwareModRefSummarizerTime[us]", savefig=result("rawmr-time-vs-size.pdf"), plotly=plotly)
     #plot_scatter(file_data, "RegionAwareModRef", x_axis="#RvsdgNodes", y_axis="MemoryStateEncodingTime[us]", savefig=result("mse-time-vs-size.pdf"), plotly=plotly)
@@ -319,39 +239,44 @@ def main():
     #for step in ramrs_steps:
     #    plot_scatter(file_data, "RegionAwareModRef", x_axis="#RelevantOperations", y_axis=step, plotly=True)
 
-    table_quartiles_per_configuration(file_data, raware_configurations, "MemoryStateEncodingTime[ns]")
-    table_quartiles_per_configuration(file_data, raware_configurations, "RegionAwareModRefSummarizerTime[ns]")
-    table_quartiles_per_configuration(file_data, raware_configurations, "StoreValueForwardingTime[ns]")
+    table_quartiles_per_configuration(summary, raware_configurations, "MemoryStateEncodingTime[ns]")
+    table_quartiles_per_configuration(summary, raware_configurations, "RegionAwareModRefSummarizerTime[ns]")
+    table_quartiles_per_configuration(summary, raware_configurations, "StoreValueForwardingTime[ns]")
 
     print()
 
-    #table_quartiles_per_configuration(file_data, raware_configurations, "#TotalMemoryStateArguments")
+    #table_quartiles_per_configuration(summary, raware_configurations, "#TotalMemoryStateArguments")
     #file_data["AverageMemoryStateArguments"] = file_data["#TotalMemoryStateArguments"] / file_data["#IntraProceduralRegions"]
-    #table_quartiles_per_configuration(file_data, raware_configurations, "AverageMemoryStateArguments")
+    #table_quartiles_per_configuration(summary, raware_configurations, "AverageMemoryStateArguments")
 
     #file_data["ReentrantAllocaRatio"] = 1 - file_data["#NonReentrantAllocas"] / file_data["#PointsToGraphAllocaNodes"]
-    #table_quartiles_per_configuration(file_data, ["RegionAwareModRef", "Mem2Reg"], "ReentrantAllocaRatio", fmt="{:.4f}")
+    #table_quartiles_per_configuration(summary, ["RegionAwareModRef", "Mem2Reg"], "ReentrantAllocaRatio", fmt="{:.4f}")
 
     print()
 
-    table_quartiles_per_column(file_data, "RegionAwareModRef", ["Tree0-NumAllocaNodes", "Tree1-NumAllocaNodes", "Tree2-NumAllocaNodes", "Tree3-NumAllocaNodes", "Tree4-NumAllocaNodes"])
-    table_quartiles_per_column(file_data, "RegionAwareModRef", ["Tree0-NumStoreNodes", "Tree1-NumStoreNodes", "Tree2-NumStoreNodes", "Tree3-NumStoreNodes", "Tree4-NumStoreNodes"])
-    table_quartiles_per_column(file_data, "RegionAwareModRef", ["Tree0-NumLoadNodes", "Tree1-NumLoadNodes", "Tree2-NumLoadNodes", "Tree3-NumLoadNodes", "Tree4-NumLoadNodes"])
+    table_quartiles_per_column(summary, "RegionAwareModRef", ["Tree0-NumAllocaNodes", "Tree1-NumAllocaNodes", "Tree2-NumAllocaNodes", "Tree3-NumAllocaNodes", "Tree4-NumAllocaNodes"])
+    table_quartiles_per_column(summary, "RegionAwareModRef", ["Tree0-NumStoreNodes", "Tree1-NumStoreNodes", "Tree2-NumStoreNodes", "Tree3-NumStoreNodes", "Tree4-NumStoreNodes"])
+    table_quartiles_per_column(summary, "RegionAwareModRef", ["Tree0-NumLoadNodes", "Tree1-NumLoadNodes", "Tree2-NumLoadNodes", "Tree3-NumLoadNodes", "Tree4-NumLoadNodes"])
 
-    table_quartiles_per_column(file_data, "Mem2Reg", ["Tree0-NumAllocaNodes", "Tree1-NumAllocaNodes", "Tree2-NumAllocaNodes", "Tree3-NumAllocaNodes"])
-    table_quartiles_per_column(file_data, "Mem2Reg", ["Tree0-NumStoreNodes", "Tree1-NumStoreNodes", "Tree2-NumStoreNodes", "Tree3-NumStoreNodes"])
-    table_quartiles_per_column(file_data, "Mem2Reg", ["Tree0-NumLoadNodes", "Tree1-NumLoadNodes", "Tree2-NumLoadNodes", "Tree3-NumLoadNodes"])
+    table_quartiles_per_column(summary, "Mem2Reg", ["Tree0-NumAllocaNodes", "Tree1-NumAllocaNodes", "Tree2-NumAllocaNodes", "Tree3-NumAllocaNodes"])
+    table_quartiles_per_column(summary, "Mem2Reg", ["Tree0-NumStoreNodes", "Tree1-NumStoreNodes", "Tree2-NumStoreNodes", "Tree3-NumStoreNodes"])
+    table_quartiles_per_column(summary, "Mem2Reg", ["Tree0-NumLoadNodes", "Tree1-NumLoadNodes", "Tree2-NumLoadNodes", "Tree3-NumLoadNodes"])
 
     print()
 
-    table_quartiles_per_column(file_data, "RegionAwareModRef", ["#TotalLoads", "#LoadsForwarded"])
-    table_quartiles_per_column(file_data, "Mem2Reg", ["#TotalLoads", "#LoadsForwarded"])
+    table_quartiles_per_column(summary, "RegionAwareModRef", ["#TotalLoads", "#LoadsForwarded"])
+    table_quartiles_per_column(summary, "Mem2Reg", ["#TotalLoads", "#LoadsForwarded"])
+
+    #table_quartiles_per_column(summary, "AgnosticModRef", ["Tree0-NumAllocaNodes", "Tree1-NumAllocaNodes", "Tree2-NumAllocaNodes", "Tree3-NumAllocaNodes"])
+    #table_quartiles_per_column(summary, "AgnosticModRef", ["Tree0-NumStoreNodes", "Tree1-NumStoreNodes", "Tree2-NumStoreNodes", "Tree3-NumStoreNodes"])
+    #table_quartiles_per_column(summary, "AgnosticModRef", ["Tree0-NumLoadNodes", "Tree1-NumLoadNodes", "Tree2-NumLoadNodes", "Tree3-NumLoadNodes"])
 
-    #table_quartiles_per_column(file_data, "AgnosticModRef", ["Tree0-NumAllocaNodes", "Tree1-NumAllocaNodes", "Tree2-NumAllocaNodes", "Tree3-NumAllocaNodes"])
-    #table_quartiles_per_column(file_data, "AgnosticModRef", ["Tree0-NumStoreNodes", "Tree1-NumStoreNodes", "Tree2-NumStoreNodes", "Tree3-NumStoreNodes"])
-    #table_quartiles_per_column(file_data, "AgnosticModRef", ["Tree0-NumLoadNodes", "Tree1-NumLoadNodes", "Tree2-NumLoadNodes", "Tree3-NumLoadNodes"])
+    #table_quartiles_per_configuration(summary, ["RegionAwareModRef", "Mem2Reg"], "#RvsdgNodes")
 
-    #table_quartiles_per_configuration(file_data, ["RegionAwareModRef", "Mem2Reg"], "#RvsdgNodes")
+    if not os.path.exists(args.out):
+        os.mkdir(args.out)
+    summary.write_latex(result("quantile-tables.tex"))
+    summary.write_csv(result("quantile-tables.csv"))
 
     # plot_ratio_between_configs(file_data, "#TotalMemoryStateArguments", "RegionAwareModRef", "RegionAwareModRef-Curtailed", savefig="results/memrefs-raware-vs-curtailed.pdf")
 
@@ -0,0 +1,126 @@
+"""
+Fits how the runtime of a pass grows with the size of its input, across many files.
+Runtimes are modeled as a power law time = c * size^k, fitted by least squares in log-log space.
+The exponent k is the empirical complexity: close to 1 is linear, and close to 2 is quadratic.
+"""
+import statistics
+import numpy as np
+
+try:
+    import scipy.stats
+except ImportError:
+    scipy = None # Confidence intervals use the normal distribution instead of Student's t
+
+def get_critical_value(confidence, degrees_of_freedom):
+    if scipy is not None:
+        return scipy.stats.t.ppf((1 + confidence) / 2, degrees_of_freedom)
+    return statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+
+def get_log_points(sizes, times):
+    """
+    :return: the logarithms of the sizes and times, skipping points where either is missing or not positive
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    mask = np.isfinite(sizes) & np.isfinite(times) & (sizes > 0) & (times > 0)
+    return np.log(sizes[mask]), np.log(times[mask])
+
+class PowerLawFit:
+    """
+    The fit log(time) = intercept + exponent * log(size), with a confidence interval for the exponent
+    """
+    def __init__(self, x, y, confidence):
+        self.num_points = len(x)
+        x_mean = x.mean()
+        y_mean = y.mean()
+        sxx = ((x - x_mean) ** 2).sum()
+        self.exponent = ((x - x_mean) * (y - y_mean)).sum() / sxx
+        self.intercept = y_mean - self.exponent * x_mean
+
+        residuals = y - self.predict_log(x)
+        ssr = (residuals ** 2).sum()
+        sst = ((y - y_mean) ** 2).sum()
+        self.r2 = 1 - ssr / sst if sst > 0 else 1.0
+        self.residual_std = np.sqrt(ssr / (self.num_points - 2))
+
+        margin = get_critical_value(confidence, self.num_points - 2) * self.residual_std / np.sqrt(sxx)
+        self.exponent_low = self.exponent - margin
+        self.exponent_high = self.exponent + margin
+
+    def predict_log(self, x):
+        return self.intercept + self.exponent * x
+
+    def predict(self, sizes):
+        return np.exp(self.predict_log(np.log(np.asarray(sizes, dtype=np.float64))))
+
+def fit_power_law(sizes, times, confidence=0.95):
+    """
+    :return: a PowerLawFit, or None if there are fewer than 3 usable points, or only one distinct size
+    """
+    x, y = get_log_points(sizes, times)
+    if len(x) < 3 or np.unique(x).size < 2:
+        return None
+    return PowerLawFit(x, y, confidence)
+
+class PiecewisePowerLawFit:
+    """
+    A power law whose exponent changes at a breakpoint, continuous in log-log space:
+    log(time) = intercept + exponent_below * x + (exponent_above - exponent_below) * max(0, x - log(breakpoint))
+    """
+    def __init__(self, breakpoint, coefficients, ssr, num_points):
+        self.breakpoint = breakpoint
+        self.intercept, self.exponent_below, change = coefficients
+        self.exponent_above = self.exponent_below + change
+        self.ssr = ssr
+        self.num_points = num_points
+
+    def get_bic(self):
+        # The breakpoint counts as a fourth parameter
+        return self.num_points * np.log(self.ssr / self.num_points) + 4 * np.log(self.num_points)
+
+def get_power_law_bic(fit):
+    ssr = fit.residual_std ** 2 * (fit.num_points - 2)
+    return fit.num_points * np.log(ssr / fit.num_points) + 2 * np.log(fit.num_points)
+
+def fit_piecewise_power_law(sizes, times, min_points=10, num_candidates=50):
+    """
+    Tries breakpoints at quantiles of the sizes, keeping at least min_points on each side,
+    and keeps the one with the least squared error.
+    :return: a PiecewisePowerLawFit, or None if there are too few points
+    """
+    x, y = get_log_points(sizes, times)
+    if len(x) < 2 * min_points + 1:
+        return None
+
+    sorted_x = np.sort(x)
+    candidates = np.unique(np.quantile(sorted_x[min_points - 1:len(x) - min_points], np.linspace(0, 1, num_candidates)))
+    best = None
+    for candidate in candidates:
+        design = np.column_stack([np.ones_like(x), x, np.maximum(0, x - candidate)])
+        coefficients, _, rank, _ = np.linalg.lstsq(design, y, rcond=None)
+        if rank < 3:
+            continue
+        ssr = ((y - design @ coefficients) ** 2).sum()
+        if best is None or ssr < best.ssr:
+            best = PiecewisePowerLawFit(np.exp(candidate), coefficients, ssr, len(x))
+    return best
+
+def find_outliers(fit, sizes, times, threshold=3.0):
+    """
+    Finds points far above the fitted curve. The spread of the residuals is estimated robustly,
+    from the median absolute deviation, so the outliers themselves do not hide each other.
+    :return: a tuple (boolean array marking outliers, array of time divided by the predicted time)
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    usable = np.isfinite(sizes) & np.isfinite(times) & (sizes > 0) & (times > 0)
+
+    residuals = np.full(len(sizes), np.nan)
+    residuals[usable] = np.log(times[usable]) - fit.predict_log(np.log(sizes[usable]))
+    median = np.nanmedian(residuals)
+    spread = 1.4826 * np.nanmedian(np.abs(residuals - median))
+    if not spread > 0:
+        spread = fit.residual_std
+
+    outliers = usable & (residuals - median > threshold * spread)
+    return outliers, np.exp(residuals)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import os
+import os.path
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import stats_ingest
+import complexity_fit
+
+# The timers of the passes whose complexity is fitted, as named in memstate-file-data
+TIMERS = [
+    "AndersenAnalysisTimer[ns]", "AndersenSetBuildingTimer[ns]", "AndersenOVSTimer[ns]",
+    "AndersenWorklistTimer[ns]", "PointsToGraphConstructionTimer[ns]",
+    "CallGraphTimer[ns]", "AllocasDeadInSccsTimer[ns]", "SimpleAllocasSetTimer[ns]",
+    "NonReentrantAllocaSetsTimer[ns]", "CreateExternalModRefSetTimer[ns]", "AnnotationTimer[ns]", "SolvingTimer[ns]",
+    "RegionAwareModRefSummarizerTime[ns]",
+    "MemoryStateEncodingTime[ns]",
+    "StoreValueForwardingTime[ns]",
+]
+
+# The measures of input size that each timer is fitted against
+SIZES = ["#RvsdgNodes", "#PointsToGraphNodes", "#PointsToGraphEdges", "#IntraProceduralRegions"]
+
+def fit_all(file_data, timers, sizes, confidence, outlier_threshold, min_points):
+    """
+    Fits every timer against every size measure
+    @return a tuple (one row per fit, one row per outlier)
+    """
+    fits = []
+    outliers = []
+    for timer in timers:
+        for size in sizes:
+            fit = complexity_fit.fit_power_law(file_data[size], file_data[timer], confidence)
+            if fit is None:
+                continue
+
+            row = {
+                "Timer": timer, "Size": size, "#Files": fit.num_points,
+                "Exponent": fit.exponent, "ExponentLow": fit.exponent_low, "ExponentHigh": fit.exponent_high,
+                "R2": fit.r2,
+            }
+            piecewise = complexity_fit.fit_piecewise_power_law(file_data[size], file_data[timer], min_points)
+            if piecewise is not None:
+                row.update({
+                    "Breakpoint": piecewise.breakpoint,
+                    "ExponentBelow": piecewise.exponent_below,
+                    "ExponentAbove": piecewise.exponent_above,
+                    "PiecewiseBetter": piecewise.get_bic() < complexity_fit.get_power_law_bic(fit),
+                })
+
+            is_outlier, ratio = complexity_fit.find_outliers(fit, file_data[size], file_data[timer], outlier_threshold)
+            row["#Outliers"] = int(is_outlier.sum())
+            fits.append(row)
+
+            for i in np.flatnonzero(is_outlier):
+                outliers.append({
+                    "cfile": file_data["cfile"].iloc[i], "Timer": timer, "Size": size,
+                    "SizeValue": file_data[size].iloc[i], "Time[ns]": file_data[timer].iloc[i],
+                    "TimesFitted": ratio[i],
+                })
+
+    return pd.DataFrame(fits), pd.DataFrame(outliers)
+
+def compare_fits(fits, previous):
+    """
+    Puts the exponents of a previous run next to the current ones.
+    An exponent counts as changed when the confidence intervals of the two runs do not overlap.
+    """
+    merged = fits.merge(previous[["Timer", "Size", "Exponent", "ExponentLow", "ExponentHigh"]],
+                        on=["Timer", "Size"], suffixes=("", "Previous"))
+    merged["Changed"] = (merged["ExponentLow"] > merged["ExponentHighPrevious"]) | \
+                        (merged["ExponentHigh"] < merged["ExponentLowPrevious"])
+    return merged[["Timer", "Size", "ExponentPrevious", "Exponent", "Changed"]]
+
+def plot_fit(file_data, timer, size, fit, savefig=None):
+    x = file_data[size]
+    y = file_data[timer]
+    usable = (x > 0) & (y > 0)
+
+    plt.figure(figsize=(7,3))
+    plt.scatter(x[usable], y[usable] / 1e6, alpha=0.5, marker=".", color="gray")
+    line = np.geomspace(x[usable].min(), x[usable].max(), 100)
+    plt.plot(line, fit.predict(line) / 1e6, color="red",
+             label=f"k = {fit.exponent:.2f} [{fit.exponent_low:.2f}, {fit.exponent_high:.2f}]")
+    plt.xscale("log")
+    plt.yscale("log")
+    plt.xlabel(size)
+    plt.ylabel(f"{timer[:-4]} [ms]")
+    plt.legend(fontsize=7)
+    plt.tight_layout(pad=0.2)
+
+    if savefig is not None:
+        plt.savefig(savefig)
+        plt.close()
+    else:
+        plt.show()
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit the empirical complexity of jlm-opt passes '
+                                                 'as power laws of the input size, across all files.')
+    parser.add_argument('--stats', dest='stats', action='store', default="statistics-out",
+                        help='The folder where aggregated statistics are located')
+    parser.add_argument('--out', dest='out', action='store', default="results",
+                        help='Folder where the fits, outliers and plots should be placed')
+    parser.add_argument('--configuration', dest='configuration', action='store', default="RegionAwareModRef",
+                        help='The configuration whose timers are fitted. [RegionAwareModRef]')
+    parser.add_argument('--confidence', dest='confidence', action='store', default=0.95, type=float,
+                        help='The confidence level of the exponent intervals. [0.95]')
+    parser.add_argument('--outlier-threshold', metavar='T', dest='outlier_threshold', action='store', default=3.0, type=float,
+                        help='Files more than T robust standard deviations above the fit are outliers. [3]')
+    parser.add_argument('--min-points', metavar='N', dest='min_points', action='store', default=20, type=int,
+                        help='The fewest files on each side of the breakpoint of a piecewise fit. [20]')
+    parser.add_argument('--compare', metavar='CSV', dest='compare', action='store', default=None,
+                        help='The complexity-fits.csv of a previous run, such as an older version of jlm-opt')
+    parser.add_argument('--plots', dest='plots', action='store_true',
+                        help='Plot each timer against #RvsdgNodes with its fit')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.out):
+        os.mkdir(args.out)
+    def out(filename=""):
+        return os.path.join(args.out, filename)
+
+    file_data = stats_ingest.load_table(args.stats, "memstate-file-data", columns=["cfile", *TIMERS, *SIZES],
+                                        partitions={"Configuration": [args.configuration]})
+    timers = [timer for timer in TIMERS if timer in file_data]
+    sizes = [size for size in SIZES if size in file_data]
+
+    fits, outliers = fit_all(file_data, timers, sizes, args.confidence, args.outlier_threshold, args.min_points)
+    if len(fits) == 0:
+        print(f"Nothing to fit for {args.configuration} in {args.stats}")
+        return
+
+    fits.to_csv(out("complexity-fits.csv"), index=False)
+    outliers.to_csv(out("complexity-outliers.csv"), index=False)
+
+    with pd.option_context("display.float_format", "{:.3f}".format, "display.width", 200):
+        print(fits.to_string(index=False))
+        if len(outliers) > 0:
+            print()
+            print("Files most above their fitted runtime:")
+            print(outliers.sort_values("TimesFitted", ascending=False).head(20).to_string(index=False))
+
+        if args.compare is not None:
+            print()
+            print("Exponents compared to the previous run:")
+            print(compare_fits(fits, pd.read_csv(args.compare)).to_string(index=False))
+
+    if args.plots and "#RvsdgNodes" in sizes:
+        for timer in timers:
+            fit = complexity_fit.fit_power_law(file_data["#RvsdgNodes"], file_data[timer], args.confidence)
+            if fit is not None:
+                plot_fit(file_data, timer, "#RvsdgNodes", fit, savefig=out(f"complexity-{timer[:-4]}.pdf"))
+
+if __name__ == "__main__":
+    main()
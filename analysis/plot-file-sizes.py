@@ -9,10 +9,16 @@ import matplotlib.pyplot as plt
 from matplotlib import ticker
 import seaborn as sns
 import numpy as np
+import stats_ingest
+
+CONSTRAINT_COLUMNS = ['#BaseConstraints', '#SupersetConstraints', '#StoreConstraints', '#LoadConstraints',
+                      '#FunctionCallConstraints', '#ScalarFlagConstraints', '#OtherFlagConstraints']
 
 def load_aggregated_statistics(stats_folder):
-    file_data = pd.read_csv(os.path.join(stats_folder, "file_data.csv"))
-    file_config_data = pd.read_csv(os.path.join(stats_folder, "file_config_data.csv"))
+    file_data = stats_ingest.load_table(stats_folder, "file_data",
+                                        columns=['cfile', 'program', '#RvsdgNodes', '#PointerObjects', *CONSTRAINT_COLUMNS])
+    file_config_data = stats_ingest.load_table(stats_folder, "file_config_data",
+                                               columns=['Configuration', 'cfile', 'TotalTime[ns]', '#RvsdgNodes'])
     return file_data, file_config_data
 
 def main():
@@ -41,7 +47,7 @@ def main():
 
     file_data.sort_values(by="program", inplace=True)
 
-    grouped = file_data.groupby('program')
+    grouped = file_data.groupby('program', observed=True)
 
     table = pd.DataFrame({
         'C file count': grouped['cfile'].count(),
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+import os
+import os.path
+import argparse
+import pandas as pd
+import matplotlib.pyplot as plt
+import stats_ingest
+
+TIMELINE_SUFFIX = "-memory-timeline.csv"
+
+# The timers of the phases that jlm-opt goes through, in order
+OUTER_PHASES = [
+    ("InterProceduralGraphToRvsdg", "Time[ns]", "RvsdgConstruction"),
+    ("RVSDGOPTIMIZATION", "Time[ns]", "Optimization"),
+    ("RVSDGDESTRUCTION", "Time[ns]", "RvsdgDestruction"),
+]
+
+# Phases that happen during optimization. Their timers are summed if there are multiple
+INNER_PHASES = {
+    "AndersenAnalysis": (["AnalysisTimer[ns]"], "Andersen"),
+    "RegionAwareModRefSummarizer": ([
+        "CallGraphTimer[ns]", "AllocasDeadInSccsTimer[ns]", "SimpleAllocasSetTimer[ns]",
+        "NonReentrantAllocaSetsTimer[ns]", "CreateExternalModRefSetTimer[ns]", "AnnotationTimer[ns]", "SolvingTimer[ns]"
+    ], "ModRefSummarizer"),
+    "MemoryStateEncoder": (["Time[ns]"], "MemoryStateEncoder"),
+    "StoreValueForwarding": (["Time[ns]"], "StoreValueForwarding"),
+}
+
+PHASE_COLORS = {
+    "Parsing": "lightgray",
+    "RvsdgConstruction": "tab:blue",
+    "Andersen": "tab:red",
+    "ModRefSummarizer": "tab:orange",
+    "MemoryStateEncoder": "tab:green",
+    "StoreValueForwarding": "tab:purple",
+    "RvsdgDestruction": "tab:cyan",
+}
+
+def read_phase_durations(stats_file):
+    """
+    Reads the duration of each phase from a statistics file, in milliseconds.
+    Only the first occurrence of each statistic is used.
+    @return a tuple (outer phases, inner phases), each a list of (phase, duration), in the order they ran
+    """
+    outer = {}
+    inner = []
+    seen = set()
+    for statistic, values in stats_ingest.iter_stats_file(stats_file):
+        if statistic in seen:
+            continue
+        seen.add(statistic)
+        values = dict(values)
+
+        for outer_statistic, timer, phase in OUTER_PHASES:
+            if statistic == outer_statistic and timer in values:
+                outer[phase] = int(values[timer]) / 1e6
+        if statistic in INNER_PHASES:
+            timers, phase = INNER_PHASES[statistic]
+            inner.append((phase, sum(int(values.get(timer, 0)) for timer in timers) / 1e6))
+
+    return [(phase, outer[phase]) for _, _, phase in OUTER_PHASES if phase in outer], inner
+
+def get_phase_intervals(stats_file, end_time):
+    """
+    Places the phases of jlm-opt on the timeline of the process, which has no timestamps of its own.
+    The outer phases are assumed to end when the process ends, as only writing the output file comes after them.
+    Anything before them is parsing the LLVM IR. Phases inside optimization are placed back to back,
+    in the order their statistics were printed, from the start of optimization.
+    @return a list of (phase, start, end) in milliseconds, where inner phases come before outer phases
+    """
+    outer, inner = read_phase_durations(stats_file)
+    start = end_time - sum(duration for _, duration in outer)
+
+    intervals = [("Parsing", 0, start)]
+    for phase, duration in outer:
+        if phase == "Optimization":
+            inner_start = start
+            for inner_phase, inner_duration in inner:
+                intervals.insert(0, (inner_phase, inner_start, inner_start + inner_duration))
+                inner_start += inner_duration
+        intervals.append((phase, start, start + duration))
+        start += duration
+    return intervals
+
+def get_phase_at(intervals, time):
+    for phase, start, end in intervals:
+        if start <= time <= end:
+            return phase
+    return None
+
+def get_phase_growth(timeline, intervals, phase):
+    """@return how much the RSS grows from the start of the phase to its highest point, in kB"""
+    for interval_phase, start, end in intervals:
+        if interval_phase != phase:
+            continue
+        before = timeline[timeline["Time[ms]"] <= start]
+        during = timeline[(timeline["Time[ms]"] >= start) & (timeline["Time[ms]"] <= end)]
+        if len(during) == 0:
+            return 0
+        baseline = before["Rss[kB]"].iloc[-1] if len(before) > 0 else 0
+        return max(during["Rss[kB]"].max() - baseline, 0)
+    return 0
+
+def extract_timelines(stats_folder):
+    """
+    Finds every memory timeline, and the phases of the jlm-opt run it belongs to
+    @return a dict from cfile to (timeline dataframe, phase intervals)
+    """
+    timelines = {}
+    for fil in os.listdir(stats_folder):
+        if not fil.endswith(TIMELINE_SUFFIX):
+            continue
+        cfile = fil[:-len(TIMELINE_SUFFIX)]
+        timeline = pd.read_csv(os.path.join(stats_folder, fil))
+        stats_file = os.path.join(stats_folder, f"{cfile}.log")
+        if len(timeline) == 0 or not os.path.exists(stats_file):
+            continue
+        timelines[cfile] = (timeline, get_phase_intervals(stats_file, timeline["Time[ms]"].max()))
+    return timelines
+
+def make_peak_table(timelines):
+    rows = []
+    for cfile, (timeline, intervals) in timelines.items():
+        peak = timeline.loc[timeline["Rss[kB]"].idxmax()]
+        rows.append({
+            "cfile": cfile,
+            "PeakRss[kB]": peak["Rss[kB]"],
+            "PeakPss[kB]": timeline["Pss[kB]"].max(),
+            "PeakTime[ms]": peak["Time[ms]"],
+            "PeakPhase": get_phase_at(intervals, peak["Time[ms]"]),
+            **{f"{phase}Growth[kB]": get_phase_growth(timeline, intervals, phase)
+               for phase in ["Andersen", "ModRefSummarizer", "MemoryStateEncoder"]},
+        })
+    return pd.DataFrame(rows)
+
+def plot_timeline(cfile, timeline, intervals, savefig=None):
+    plt.figure(figsize=(7,3))
+    for phase, start, end in intervals:
+        if end > start and phase in PHASE_COLORS:
+            plt.axvspan(start / 1000, end / 1000, color=PHASE_COLORS[phase], alpha=0.2, label=phase, linewidth=0)
+    plt.plot(timeline["Time[ms]"] / 1000, timeline["Rss[kB]"] / 1024, color="black", label="RSS")
+    if timeline["Pss[kB]"].notna().any():
+        plt.plot(timeline["Time[ms]"] / 1000, timeline["Pss[kB]"] / 1024, color="black", linestyle="--", label="PSS")
+
+    plt.title(cfile, fontsize=10)
+    plt.xlabel("Time [s]", fontsize=7)
+    plt.ylabel("Memory [MiB]", fontsize=7)
+    plt.legend(fontsize=6)
+    plt.tight_layout(pad=0.2)
+
+    if savefig is not None:
+        plt.savefig(savefig)
+        plt.close()
+    else:
+        plt.show()
+
+def main():
+    parser = argparse.ArgumentParser(description='Plot memory use over time from runs with --rssSampleInterval, '
+                                                 'and attribute memory peaks to jlm-opt phases.')
+    parser.add_argument('--stats-in', dest='stats_in', action='store', required=True,
+                        help='The folder where the statistics files and memory timelines of the run are located')
+    parser.add_argument('--out', dest='out', action='store', required=True,
+                        help='The output folder for the peak table and plots')
+    parser.add_argument('--top', metavar='N', dest='top', action='store', default=10, type=int,
+                        help='Plot the N files with the highest peak RSS. [10]')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.out):
+        os.mkdir(args.out)
+    def out(filename=""):
+        return os.path.join(args.out, filename)
+
+    timelines = extract_timelines(args.stats_in)
+    if len(timelines) == 0:
+        print(f"No memory timelines found in {args.stats_in}")
+        return
+
+    peaks = make_peak_table(timelines).sort_values("PeakRss[kB]", ascending=False)
+    peaks.to_csv(out("memory-peaks.csv"), index=False)
+    print(peaks.head(args.top).to_string(index=False))
+    print()
+    print("Phase of the peak RSS:")
+    print(peaks["PeakPhase"].value_counts().to_string())
+
+    for cfile in peaks["cfile"].head(args.top):
+        timeline, intervals = timelines[cfile]
+        plot_timeline(cfile, timeline, intervals, savefig=out(f"memory-{cfile}.pdf"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+import os
+import os.path
+import argparse
+import numpy as np
+import pandas as pd
+import stats_ingest
+from solver_matrix import RuntimeMatrix
+
+try:
+    from sklearn.tree import DecisionTreeClassifier
+except ImportError:
+    DecisionTreeClassifier = None # The NumPy tree below is used instead
+
+# Statistics that jlm-opt knows before solving the constraint graph, used to pick a configuration
+FEATURES = [
+    "#RvsdgNodes", "#PointerObjects", "#MemoryPointerObjects", "#MemoryPointerObjectsCanPoint",
+    "#RegisterPointerObjects", "#AllocaPointerObjects", "#MallocPointerObjects", "#GlobalPointerObjects",
+    "#FunctionPointerObjects", "#ImportPointerObjects",
+    "#BaseConstraints", "#SupersetConstraints", "#StoreConstraints", "#LoadConstraints",
+    "#FunctionCallConstraints", "#ScalarFlagConstraints", "#OtherFlagConstraints"
+]
+
+class NumpyDecisionTree:
+    """
+    A CART classification tree using weighted Gini impurity, for when scikit-learn is not installed.
+    The tree is kept as a list of nodes, in the form returned by get_tree_nodes.
+    """
+    def __init__(self, max_depth, min_samples_leaf):
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+
+    def fit(self, X, y, sample_weight):
+        self.classes_ = np.unique(y)
+        # The weight of each sample, in the column of its class
+        Y = (y[:, None] == self.classes_[None, :]) * sample_weight[:, None]
+        self.nodes = []
+        self._build(X, Y, 0)
+        return self
+
+    def _build(self, X, Y, depth):
+        index = len(self.nodes)
+        totals = Y.sum(axis=0)
+        node = {"feature": None, "threshold": None, "left": None, "right": None, "label": int(np.argmax(totals))}
+        self.nodes.append(node)
+
+        if depth >= self.max_depth or len(X) < 2 * self.min_samples_leaf or np.count_nonzero(totals) <= 1:
+            return index
+        split = self._find_split(X, Y, totals)
+        if split is None:
+            return index
+
+        node["feature"], node["threshold"] = split
+        left = X[:, node["feature"]] <= node["threshold"]
+        node["left"] = self._build(X[left], Y[left], depth + 1)
+        node["right"] = self._build(X[~left], Y[~left], depth + 1)
+        return index
+
+    @staticmethod
+    def _impurity(counts):
+        """The weighted Gini impurity of each row of class weights, multiplied by the total weight of the row"""
+        weight = counts.sum(axis=-1)
+        squares = (counts ** 2).sum(axis=-1)
+        return weight - np.divide(squares, weight, out=np.zeros_like(weight), where=weight > 0)
+
+    def _find_split(self, X, Y, totals):
+        """
+        :return: the (feature, threshold) that reduces impurity the most, or None if no split reduces it
+        """
+        best_impurity = self._impurity(totals)
+        best = None
+        n = len(X)
+        for feature in range(X.shape[1]):
+            order = np.argsort(X[:, feature], kind="stable")
+            values = X[order, feature]
+            # Splitting after position i puts samples 0..i on the left
+            left_counts = np.cumsum(Y[order], axis=0)[:-1]
+            impurity = self._impurity(left_counts) + self._impurity(totals - left_counts)
+
+            sizes = np.arange(1, n)
+            valid = (values[:-1] < values[1:]) & (sizes >= self.min_samples_leaf) & (n - sizes >= self.min_samples_leaf)
+            if not valid.any():
+                continue
+            i = np.flatnonzero(valid)[np.argmin(impurity[valid])]
+            if impurity[i] < best_impurity - 1e-9 * abs(best_impurity):
+                best_impurity = impurity[i]
+                best = (feature, (values[i] + values[i + 1]) / 2)
+        return best
+
+    def predict(self, X):
+        result = np.empty(len(X), dtype=self.classes_.dtype)
+        stack = [(0, np.arange(len(X)))]
+        while stack:
+            index, rows = stack.pop()
+            node = self.nodes[index]
+            if node["feature"] is None:
+                result[rows] = self.classes_[node["label"]]
+                continue
+            left = X[rows, node["feature"]] <= node["threshold"]
+            stack.append((node["left"], rows[left]))
+            stack.append((node["right"], rows[~left]))
+        return result
+
+def make_model(max_depth, min_samples_leaf):
+    if DecisionTreeClassifier is not None:
+        return DecisionTreeClassifier(max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=0)
+    return NumpyDecisionTree(max_depth, min_samples_leaf)
+
+def get_tree_nodes(model):
+    """
+    :return: the nodes of a trained tree as a list of dicts with the keys feature, threshold, left, right and label,
+             where leaves have no feature, samples with feature <= threshold go left,
+             and label is an index into model.classes_
+    """
+    if isinstance(model, NumpyDecisionTree):
+        return model.nodes
+
+    tree = model.tree_
+    nodes = []
+    for i in range(tree.node_count):
+        leaf = tree.children_left[i] == -1
+        nodes.append({
+            "feature": None if leaf else int(tree.feature[i]),
+            "threshold": None if leaf else float(tree.threshold[i]),
+            "left": None if leaf else int(tree.children_left[i]),
+            "right": None if leaf else int(tree.children_right[i]),
+            "label": int(np.argmax(tree.value[i][0]))
+        })
+    return nodes
+
+def get_training_labels(matrix, num_candidates):
+    """
+    Picks the candidate configurations, the greedy portfolio of the given size,
+    and labels each file with the fastest of them. Files are weighted by how much time a wrong choice can cost,
+    so the tree focuses on files where the choice matters.
+    @return a tuple (candidate configurations, labels, weights)
+    """
+    candidates = [configuration for configuration, _ in matrix.greedy_portfolio(num_candidates)]
+    times = matrix.times[:, matrix.get_indices(candidates)]
+    labels = times.argmin(axis=1)
+    weights = times.max(axis=1) - times.min(axis=1) + 1
+    return candidates, labels, weights
+
+def train(matrix, features, num_candidates, max_depth, min_samples_leaf):
+    """
+    @return a tuple (candidate configurations, trained model), where the model predicts indices into the candidates
+    """
+    candidates, labels, weights = get_training_labels(matrix, num_candidates)
+    model = make_model(max_depth, min_samples_leaf)
+    model.fit(features, labels, sample_weight=weights)
+    return candidates, model
+
+def cross_validate(matrix, features, groups, folds, num_candidates, max_depth, min_samples_leaf, seed):
+    """
+    Trains on all but one fold, and measures the runtime of the predicted configurations on the held out fold.
+    The best single configuration is also picked from the training folds only.
+    @return a dict from strategy to its total runtime over all held out folds
+    """
+    rng = np.random.default_rng(seed)
+    unique_groups = np.unique(groups)
+    fold_of_group = dict(zip(unique_groups, rng.permutation(len(unique_groups)) % folds))
+    fold = np.array([fold_of_group[group] for group in groups])
+
+    totals = {"Best single configuration": 0.0, "Predicted": 0.0, "Oracle of candidates": 0.0, "Oracle": 0.0}
+    for k in range(folds):
+        train_rows = np.flatnonzero(fold != k)
+        test_rows = np.flatnonzero(fold == k)
+        if len(test_rows) == 0 or len(train_rows) == 0:
+            continue
+
+        train_matrix = matrix.select_files(train_rows)
+        candidates, model = train(train_matrix, features[train_rows], num_candidates, max_depth, min_samples_leaf)
+        test_matrix = matrix.select_files(test_rows)
+
+        predicted = test_matrix.get_indices(candidates)[model.predict(features[test_rows])]
+        best_single = train_matrix.single_scores().index[0]
+        totals["Best single configuration"] += test_matrix.score([best_single])
+        totals["Predicted"] += test_matrix.times[np.arange(len(test_rows)), predicted].sum()
+        totals["Oracle of candidates"] += test_matrix.score(candidates)
+        totals["Oracle"] += test_matrix.score()
+    return totals
+
+def get_variable_name(feature):
+    """Turns a statistic like #PointerObjects into a C++ style variable name like numPointerObjects"""
+    return "num" + feature[1:] if feature.startswith("#") else feature
+
+def get_subtree_label(nodes, index):
+    """
+    :return: the label of every leaf below the node, or None if the leaves have different labels
+    """
+    node = nodes[index]
+    if node["feature"] is None:
+        return node["label"]
+    left = get_subtree_label(nodes, node["left"])
+    return left if left == get_subtree_label(nodes, node["right"]) else None
+
+def format_rules(nodes, feature_names, candidates, index=0, indent=""):
+    """
+    Prints the tree as nested if statements in C++ style, that return the name of the configuration to use.
+    Splits where both sides pick the same configuration are left out.
+    """
+    label = get_subtree_label(nodes, index)
+    if label is not None:
+        return f'{indent}return "{candidates[label]}";\n'
+
+    node = nodes[index]
+    left = format_rules(nodes, feature_names, candidates, node["left"], indent + "  ")
+    right = format_rules(nodes, feature_names, candidates, node["right"], indent + "  ")
+    condition = f"{get_variable_name(feature_names[node['feature']])} <= {node['threshold']:.1f}"
+    return f"{indent}if ({condition})\n{indent}{{\n{left}{indent}}}\n{indent}else\n{indent}{{\n{right}{indent}}}\n"
+
+def main():
+    parser = argparse.ArgumentParser(description='Learn to pick an Andersen solver configuration per file '
+                                                 'from the statistics of its constraint graph.')
+    parser.add_argument('--stats', dest='stats', action='store', required=True,
+                        help='The folder with aggregated statistics, containing file_data and file_config_data')
+    parser.add_argument('--out', dest='out_dir', action='store', default=None,
+                        help='Folder where the learned rules should be placed')
+    parser.add_argument('--candidates', metavar='K', dest='candidates', action='store', default=4, type=int,
+                        help='Pick between the K configurations of the greedy portfolio. [4]')
+    parser.add_argument('--max-depth', metavar='D', dest='max_depth', action='store', default=3, type=int,
+                        help='The largest depth of the decision tree. [3]')
+    parser.add_argument('--min-samples-leaf', metavar='N', dest='min_samples_leaf', action='store', default=20, type=int,
+                        help='The smallest number of files in a leaf of the decision tree. [20]')
+    parser.add_argument('--folds', metavar='N', dest='folds', action='store', default=5, type=int,
+                        help='The number of cross-validation folds. [5]')
+    parser.add_argument('--group-by-program', dest='group_by_program', action='store_true',
+                        help='Keep all files of a program in the same fold, to evaluate on unseen programs')
+    parser.add_argument('--timeout', metavar='S', dest='timeout', action='store', default=None, type=float,
+                        help='Runtimes above S seconds count as timeouts. [the largest runtime]')
+    parser.add_argument('--seed', metavar='N', dest='seed', action='store', default=0, type=int,
+                        help='The seed used to assign files to folds. [0]')
+    args = parser.parse_args()
+
+    file_config_data = stats_ingest.load_table(args.stats, "file_config_data",
+                                               columns=["Configuration", "cfile", "TotalTime[ns]"])
+    file_data = stats_ingest.load_table(args.stats, "file_data", columns=["cfile", "program", *FEATURES])
+
+    timeout = args.timeout * 1e9 if args.timeout is not None else None
+    matrix = RuntimeMatrix.from_long_table(file_config_data, timeout=timeout)
+
+    # Only use files that have every feature
+    feature_names = [feature for feature in FEATURES if feature in file_data]
+    file_data = file_data.astype({"cfile": str}).set_index("cfile").reindex(matrix.cfiles)
+    has_features = file_data[feature_names].notna().all(axis=1).to_numpy()
+    matrix = matrix.select_files(np.flatnonzero(has_features))
+    file_data = file_data[has_features]
+    features = file_data[feature_names].to_numpy(dtype=np.float64)
+    groups = file_data["program"].astype(str).to_numpy() if args.group_by_program else np.array(matrix.cfiles)
+
+    print(f"Files: {matrix.num_files}, configurations: {matrix.num_configurations}, features: {len(feature_names)}")
+    print(f"Model: {'scikit-learn' if DecisionTreeClassifier is not None else 'NumPy'} decision tree "
+          f"of depth {args.max_depth}, choosing between {args.candidates} configurations")
+    print()
+
+    totals = cross_validate(matrix, features, groups, args.folds, args.candidates,
+                            args.max_depth, args.min_samples_leaf, args.seed)
+    single = totals["Best single configuration"]
+    oracle = totals["Oracle"]
+    print(f"{args.folds}-fold cross-validation{' by program' if args.group_by_program else ''}:")
+    for strategy, total in totals.items():
+        print(f"  {strategy:<26} {total / 1e9:12.3f}s  speedup {single / total:6.3f}")
+    if single > oracle:
+        print(f"  The predictor captures {(single - totals['Predicted']) / (single - oracle) * 100:.1f}% of the oracle speedup")
+    print()
+
+    candidates, model = train(matrix, features, args.candidates, args.max_depth, args.min_samples_leaf)
+    rules = format_rules(get_tree_nodes(model), feature_names, [candidates[label] for label in model.classes_])
+    print("Rules learned from all files:")
+    print(rules)
+
+    if args.out_dir is not None:
+        if not os.path.exists(args.out_dir):
+            os.mkdir(args.out_dir)
+        with open(os.path.join(args.out_dir, "solver-config-rules.txt"), "w", encoding="utf-8") as fd:
+            fd.write(f"// Learned by predict-solver-config.py from {matrix.num_files} files\n")
+            fd.write(rules)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Tables of quantiles and other summary statistics, for many columns and configurations at once.
+All statistics of all columns are computed in one groupby pass over the data,
+and each table is then a slice of the result, instead of filtering the data again for every cell.
+Tables can be printed to the terminal, and every table taken can be written to one LaTeX or CSV file.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_STATISTICS = ["p25", "p50", "p75", "p90", "p99", "max", "mean"]
+AGGREGATIONS = ["min", "max", "mean", "sum"]
+
+def get_quantile(statistic):
+    """
+    :return: the quantile of a statistic like "p99" or "p99.9" as a fraction, or None if it is not a quantile
+    """
+    if statistic.startswith("p") and statistic[1:].replace(".", "", 1).isdigit():
+        return float(statistic[1:]) / 100
+    return None
+
+def summarize(data, columns, by="Configuration", statistics=None):
+    """
+    Computes the statistics of every column, for every group in one pass.
+    :param data: a table with one row per file and group, such as memstate-file-data
+    :param statistics: quantiles like "p90", and any of AGGREGATIONS. Defaults to DEFAULT_STATISTICS
+    :return: a DataFrame indexed by (group, column), with one column per statistic
+    """
+    if statistics is None:
+        statistics = DEFAULT_STATISTICS
+    quantiles = {statistic: get_quantile(statistic) for statistic in statistics if get_quantile(statistic) is not None}
+    aggregations = [statistic for statistic in statistics if statistic not in quantiles]
+    for statistic in aggregations:
+        if statistic not in AGGREGATIONS:
+            raise ValueError(f"Unknown statistic: {statistic}")
+
+    grouped = data.groupby(by, observed=True)[columns]
+    groups = pd.Index(grouped.size().index.astype(str), name=by)
+    index = pd.MultiIndex.from_product([groups, columns], names=[by, "Column"])
+    parts = []
+
+    if len(quantiles) > 0:
+        # One row per group and quantile, in that order
+        values = grouped.quantile(list(quantiles.values())).to_numpy(dtype=np.float64)
+        values = values.reshape(len(groups), len(quantiles), len(columns)).transpose(0, 2, 1)
+        parts.append(pd.DataFrame(values.reshape(-1, len(quantiles)), index=index, columns=list(quantiles)))
+
+    if len(aggregations) > 0:
+        # One row per group, with the aggregations of each column next to each other
+        values = grouped.agg(aggregations).to_numpy(dtype=np.float64)
+        parts.append(pd.DataFrame(values.reshape(-1, len(aggregations)), index=index, columns=aggregations))
+
+    return pd.concat(parts, axis=1)[list(statistics)]
+
+class QuantileSummary:
+    """
+    The statistics of many columns per configuration, from which tables are taken.
+    Every table taken is remembered, so they can all be written to one file at the end.
+    """
+    def __init__(self, data, columns, by="Configuration", statistics=None):
+        self.summary = summarize(data, columns, by, statistics)
+        self.tables = []
+
+    def per_group(self, column, groups, fmt="{:,.0f}"):
+        """
+        :return: a table with one row per group, such as a configuration, with the statistics of the column
+        """
+        table = self.summary.xs(column, level="Column").reindex(groups)
+        self.tables.append((column, table, fmt))
+        return table
+
+    def per_column(self, group, columns, fmt="{:,.0f}"):
+        """
+        :return: a table with one row per column, with the statistics of the group
+        """
+        table = self.summary.xs(group, level=0).reindex(columns)
+        self.tables.append((group, table, fmt))
+        return table
+
+    def write_csv(self, path):
+        """
+        Writes every table taken so far to one CSV file, with the number and name of the table on each row
+        """
+        rows = [table.assign(Table=i, Name=name).rename_axis("Row").reset_index()
+                for i, (name, table, _) in enumerate(self.tables)]
+        pd.concat(rows).set_index(["Table", "Name", "Row"]).to_csv(path)
+
+    def write_latex(self, path):
+        """
+        Writes every table taken so far as a LaTeX tabular, one after another
+        """
+        with open(path, 'w', encoding='utf-8') as fd:
+            for name, table, fmt in self.tables:
+                print_latex_table(table, name, fmt, fd)
+                print(file=fd)
+
+def escape_latex(text):
+    for special in ["\\", "#", "_", "%", "&", "$"]:
+        text = text.replace(special, "\\" + special)
+    return text
+
+def print_latex_table(data, name="", number_fmt="{:,.0f}", fd=None):
+    """
+    Prints the DataFrame as a booktabs LaTeX tabular, using thin spaces as thousands separators
+    """
+    print("\\begin{tabular}{l" + "r" * len(data.columns) + "}", file=fd)
+    print("\\toprule", file=fd)
+    print(" & ".join([escape_latex(str(name)), *data.columns]) + " \\\\", file=fd)
+    print("\\midrule", file=fd)
+    for index, row in data.iterrows():
+        print(f"{escape_latex(str(index)):<30}", end=" ", file=fd)
+        for number in row:
+            number = number_fmt.format(number).replace(",", "\\;")
+            print(f"& {number:>8}", end=" ", file=fd)
+        print("\\\\", file=fd)
+    print("\\bottomrule", file=fd)
+    print("\\end{tabular}", file=fd)
+
+def print_table(data, name="", number_fmt="{:.0f}"):
+    """
+    Pretty prints the given pandas DataFrame
+    """
+
+    # row major
+    cells = [[""] + ["" for _ in data.columns] for _ in range(len(data) + 1)]
+    cells[0][0] = name
+
+    for j, column in enumerate(data.columns):
+        cells[0][j + 1] = column
+
+    for i, index in enumerate(data.index):
+        cells[i + 1][0] = index
+
+        for j, column in enumerate(data.columns):
+            cells[i + 1][j + 1] = data.loc[index, column]
+
+    # Find the length of the longest cell in each column
+    max_column_width = [0 for _ in cells[0]]
+    for i, row in enumerate(cells):
+        for j, val in enumerate(row):
+
+            if isinstance(val, str):
+                val_len = len(val)
+            else:
+                val_len = len(number_fmt.format(val))
+
+            max_column_width[j] = max(max_column_width[j], val_len)
+
+    START = "| "
+    HSTART = "+-"
+
+    END = " |\n"
+    HEND = "-+\n"
+
+    VBAR = " | "
+    HVBAR = "-+-"
+    HBAR = "-"
+
+    # Now print the whole thing
+
+    result = []
+    def out(text):
+        result.append(text)
+
+    def print_hline():
+        out(HSTART)
+        for j, column_width in enumerate(max_column_width):
+            if j != 0:
+                out(HVBAR)
+            out(HBAR * column_width)
+        out(HEND)
+
+    print_hline()
+    for i, row in enumerate(cells):
+        if i == 1:
+            print_hline()
+        out(START)
+        for j, val in enumerate(row):
+            if j != 0:
+                out(VBAR)
+            if isinstance(val, str):
+                out(val + " " * (max_column_width[j] - len(val)))
+            else:
+                val = number_fmt.format(val).replace(",", " ")
+                out(" " * (max_column_width[j] - len(val)) + val)
+        out(END)
+    print_hline()
+
+    print("".join(result))
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import os
+import os.path
+import argparse
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+import complexity_fit
+import stats_ingest
+
+# Timers that are the sum of several timers in the statistics files
+SUMMED_TIMERS = {
+    "RegionAwareModRefSummarizerTime[ns]": [
+        "RegionAwareModRefSummarizer-CallGraphTimer[ns]",
+        "RegionAwareModRefSummarizer-AllocasDeadInSccsTimer[ns]",
+        "RegionAwareModRefSummarizer-SimpleAllocasSetTimer[ns]",
+        "RegionAwareModRefSummarizer-NonReentrantAllocaSetsTimer[ns]",
+        "RegionAwareModRefSummarizer-CreateExternalModRefSetTimer[ns]",
+        "RegionAwareModRefSummarizer-AnnotationTimer[ns]",
+        "RegionAwareModRefSummarizer-SolvingTimer[ns]",
+    ]
+}
+
+# The measures of problem size that timers can be plotted against
+SIZE_COLUMNS = ["#RvsdgNodes", "#Functions"]
+
+def read_subset_stats(path):
+    """
+    Reads one statistics file from a scaling series.
+    Every timer is kept, named <statistic>-<timer>. Only the first occurrence of each statistic is used.
+    """
+    data = {}
+    for statistic, values in stats_ingest.iter_stats_file(path):
+        for name, value in values:
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+
+            if statistic == "ScalingSubset" or (statistic == "AndersenAnalysis" and name == "#RvsdgNodes"):
+                data.setdefault(name, value)
+            elif name.endswith("[ns]"):
+                data.setdefault(f"{statistic}-{name}", value)
+
+    for summed, timers in SUMMED_TIMERS.items():
+        if all(timer in data for timer in timers):
+            data[summed] = sum(data[timer] for timer in timers)
+    return data
+
+def extract_scaling_curves(stats_folder):
+    """
+    Finds all <cfile>-scaling folders, and creates one row per subset of each file
+    """
+    rows = []
+    for folder in os.listdir(stats_folder):
+        if not folder.endswith("-scaling"):
+            continue
+        cfile = folder[:-len("-scaling")]
+        folder_path = os.path.join(stats_folder, folder)
+        for fil in os.listdir(folder_path):
+            if not fil.endswith(".log"):
+                continue
+            row = read_subset_stats(os.path.join(folder_path, fil))
+            row["cfile"] = cfile
+            rows.append(row)
+
+    return pd.DataFrame(rows)
+
+def fit_scaling_exponent(sizes, times):
+    """
+    Fits time = c * size^k by least squares in log-log space.
+    An exponent close to 1 means linear, slightly above 1 suggests n log n, and close to 2 means quadratic.
+    @return the exponent k, or NaN if there are too few non-zero points
+    """
+    fit = complexity_fit.fit_power_law(sizes, times)
+    if fit is None:
+        return np.nan
+    return fit.exponent
+
+def describe_exponent(k):
+    if np.isnan(k):
+        return "unknown"
+    if k < 0.9:
+        return "sublinear"
+    if k < 1.2:
+        return "linear / n log n"
+    if k < 1.7:
+        return "superlinear"
+    return "quadratic or worse"
+
+def get_timer_columns(curves):
+    return [column for column in curves.columns if column.endswith("[ns]")]
+
+def make_exponent_table(curves, size_column):
+    rows = []
+    for cfile, file_curve in curves.groupby("cfile"):
+        for timer in get_timer_columns(curves):
+            k = fit_scaling_exponent(file_curve[size_column], file_curve[timer])
+            rows.append({"cfile": cfile, "Timer": timer, "Exponent": k, "Class": describe_exponent(k)})
+    return pd.DataFrame(rows)
+
+def plot_scaling_curves(curves, cfile, size_column, timers, savefig=None):
+    file_curve = curves[curves["cfile"] == cfile].sort_values(size_column)
+
+    plt.figure(figsize=(7,4))
+    for timer in timers:
+        if timer in file_curve and (file_curve[timer] > 0).any():
+            plt.plot(file_curve[size_column], file_curve[timer], marker="o", label=timer)
+
+    plt.xscale("log")
+    plt.yscale("log")
+    plt.title(cfile, fontsize=10)
+    plt.xlabel(size_column, fontsize=7)
+    plt.ylabel("Time [ns]", fontsize=7)
+    plt.legend(fontsize=6)
+    plt.tight_layout(pad=0.2)
+
+    if savefig is not None:
+        plt.savefig(savefig)
+        plt.close()
+    else:
+        plt.show()
+
+def main():
+    parser = argparse.ArgumentParser(description='Create per-file scaling curves from runs with --scalingSeries.')
+    parser.add_argument('--stats-in', dest='stats_in', action='store', required=True,
+                        help='The folder where the statistics files of the run are located')
+    parser.add_argument('--out', dest='out', action='store', required=True,
+                        help='The output folder for curves, exponents and plots')
+    parser.add_argument('--size', dest='size', action='store', default="#RvsdgNodes", choices=SIZE_COLUMNS,
+                        help='The measure of problem size to use. [#RvsdgNodes]')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.out):
+        os.mkdir(args.out)
+    def out(filename=""):
+        return os.path.join(args.out, filename)
+
+    curves = extract_scaling_curves(args.stats_in)
+    if len(curves) == 0:
+        print(f"No scaling series found in {args.stats_in}")
+        return
+
+    curves.sort_values(["cfile", "Percent"], inplace=True)
+    curves.to_csv(out("scaling-curves.csv"), index=False)
+
+    exponents = make_exponent_table(curves, args.size)
+    exponents.to_csv(out("scaling-exponents.csv"), index=False)
+
+    main_timers = ["AndersenAnalysis-AnalysisTimer[ns]", "RegionAwareModRefSummarizerTime[ns]", "MemoryStateEncoder-Time[ns]"]
+    print(exponents[exponents["Timer"].isin(main_timers)].to_string(index=False))
+
+    for cfile in curves["cfile"].unique():
+        plot_scaling_curves(curves, cfile, args.size, main_timers, savefig=out(f"scaling-{cfile}.pdf"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import os
+import os.path
+import argparse
+import pandas as pd
+import stats_ingest
+from solver_matrix import RuntimeMatrix, OBJECTIVES
+
+def print_portfolio(name, portfolio, best_single_score, oracle_score, fd=None):
+    """
+    Prints a table with one row per configuration added to the portfolio, with the speedup over the best
+    single configuration, and how much of the gap between the best single configuration and the oracle is closed
+    """
+    print(f"{name}:", file=fd)
+    for size, (configuration, score) in enumerate(portfolio, start=1):
+        gap = best_single_score - oracle_score
+        closed = (best_single_score - score) / gap * 100 if gap > 0 else 100
+        print(f"  {size:>2} {configuration:<60} {score / 1e9:12.3f}s  speedup {best_single_score / score:6.3f}  "
+              f"oracle gap closed {closed:5.1f}%", file=fd)
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the oracle and the best portfolios of Andersen solver configurations '
+                                                 'from the aggregated statistics of a configuration sweep.')
+    parser.add_argument('--stats', dest='stats', action='store', required=True,
+                        help='The folder with aggregated statistics, containing file_config_data')
+    parser.add_argument('--out', dest='out_dir', action='store', default=None,
+                        help='Folder where the per-file oracle choices and portfolios should be placed')
+    parser.add_argument('-k', metavar='K', dest='k', action='store', default=3, type=int,
+                        help='The largest portfolio size to search for. [3]')
+    parser.add_argument('--objective', dest='objective', action='store', default="total", choices=OBJECTIVES,
+                        help='Minimize the total runtime, or the 99th percentile runtime. [total]')
+    parser.add_argument('--timeout', metavar='S', dest='timeout', action='store', default=None, type=float,
+                        help='Runtimes above S seconds count as timeouts. [the largest runtime]')
+    parser.add_argument('--par', metavar='K', dest='par', action='store', default=10, type=float,
+                        help='Configurations that time out or did not finish a file get K times the timeout. [10]')
+    parser.add_argument('--configurations', metavar='REGEX', dest='configurations', action='store', default=None,
+                        help='Only consider configurations matching the regex, such as "^IP_"')
+    parser.add_argument('--exact', dest='exact', action='store_true',
+                        help='Also find the best portfolio of each size exactly, and not only greedily')
+    args = parser.parse_args()
+
+    file_config_data = stats_ingest.load_table(args.stats, "file_config_data",
+                                               columns=["Configuration", "cfile", "TotalTime[ns]"])
+    if args.configurations is not None:
+        matching = file_config_data["Configuration"].astype(str).str.contains(args.configurations)
+        file_config_data = file_config_data[matching]
+
+    timeout = args.timeout * 1e9 if args.timeout is not None else None
+    matrix = RuntimeMatrix.from_long_table(file_config_data, timeout=timeout, par=args.par)
+    print(f"Files: {matrix.num_files}, configurations: {matrix.num_configurations}")
+    print(f"Time limit: {matrix.timeout / 1e9:.3f}s, unfinished runs: {(~matrix.finished).sum()}")
+    print(f"Configurations not dominated by another: {len(matrix.get_undominated())}")
+    print()
+
+    single_scores = matrix.single_scores(args.objective)
+    best_single = single_scores.index[0]
+    oracle_score = matrix.score(objective=args.objective)
+    print(f"Best single configuration: {best_single} {single_scores.iloc[0] / 1e9:.3f}s")
+    print(f"Oracle of all configurations: {oracle_score / 1e9:.3f}s, speedup {single_scores.iloc[0] / oracle_score:.3f}")
+    print()
+
+    greedy = matrix.greedy_portfolio(args.k, args.objective)
+    print_portfolio("Greedy portfolio, adding one configuration at a time", greedy, single_scores.iloc[0], oracle_score)
+    # Each portfolio is listed with all its configurations
+    portfolios = {"greedy": [(" + ".join(configuration for configuration, _ in greedy[:size]), score)
+                             for size, (_, score) in enumerate(greedy, start=1)]}
+
+    if args.exact:
+        exact = []
+        for k in range(1, args.k + 1):
+            print(f"Searching {matrix.count_portfolios(k):,} portfolios of size {k}")
+            configurations, score = matrix.exact_portfolio(k, args.objective)
+            exact.append((" + ".join(configurations), score))
+        portfolios["exact"] = exact
+        print_portfolio("Best portfolio of each size", exact, single_scores.iloc[0], oracle_score)
+
+    if args.out_dir is not None:
+        if not os.path.exists(args.out_dir):
+            os.mkdir(args.out_dir)
+        matrix.oracle_choices().to_csv(os.path.join(args.out_dir, "oracle-configurations.csv"), index_label="cfile")
+        rows = [{"Search": search, "Size": size, "Configurations": configuration, "Score[ns]": score}
+                for search, portfolio in portfolios.items()
+                for size, (configuration, score) in enumerate(portfolio, start=1)]
+        pd.DataFrame(rows).to_csv(os.path.join(args.out_dir, "portfolios.csv"), index=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Runtimes of Andersen solver configurations as a matrix with one row per C file and one column per configuration.
+Used to find the oracle, the per-file best configuration, of any subset of configurations,
+and the portfolio of k configurations that comes closest to the oracle of all of them.
+
+Configurations that did not finish a file, because they timed out or crashed, have no runtime.
+They are given a PAR-k penalty: k times the time limit, like in SAT competitions.
+"""
+import math
+import numpy as np
+import pandas as pd
+
+OBJECTIVES = ["total", "p99"]
+
+def evaluate_objective(times, objective):
+    """
+    Scores runtimes, where lower is better.
+    :param times: an array of runtimes per file, or a 2D array with one column of runtimes per file per candidate
+    :param objective: "total" for the sum of runtimes, or "p99" for the 99th percentile of runtimes
+    """
+    if objective == "total":
+        return times.sum(axis=0)
+    if objective == "p99":
+        return np.percentile(times, 99, axis=0)
+    raise ValueError(f"Unknown objective: {objective}")
+
+class RuntimeMatrix:
+    def __init__(self, times, cfiles, configurations, timeout=None, par=10):
+        """
+        :param times: a 2D array of runtimes, with NaN where a configuration did not finish a file
+        :param timeout: runtimes above the timeout count as not finished. Defaults to the largest runtime
+        :param par: the penalty for not finishing, as a multiple of the timeout
+        """
+        self.cfiles = list(cfiles)
+        self.configurations = list(configurations)
+        self.raw_times = np.asarray(times, dtype=np.float64)
+
+        if timeout is None:
+            timeout = np.nanmax(self.raw_times)
+        self.timeout = timeout
+        self.par = par
+
+        self.finished = ~np.isnan(self.raw_times) & (self.raw_times <= timeout)
+        self.times = np.where(self.finished, self.raw_times, timeout * par)
+
+    @classmethod
+    def from_long_table(cls, data, value="TotalTime[ns]", timeout=None, par=10):
+        """
+        Creates the matrix from a table with one row per cfile and Configuration, such as file_config_data.
+        C files without a row for some configuration are counted as not finished by it.
+        """
+        pivot = data.pivot_table(index="cfile", columns="Configuration", values=value, aggfunc="min", observed=True)
+        return cls(pivot.to_numpy(), pivot.index.astype(str), pivot.columns.astype(str), timeout, par)
+
+    def select_files(self, rows):
+        """
+        :return: a RuntimeMatrix with only the given rows, and the same time limit and penalty
+        """
+        return RuntimeMatrix(self.raw_times[rows], np.array(self.cfiles)[rows], self.configurations, self.timeout, self.par)
+
+    @property
+    def num_files(self):
+        return self.times.shape[0]
+
+    @property
+    def num_configurations(self):
+        return self.times.shape[1]
+
+    def get_indices(self, configurations=None):
+        if configurations is None:
+            return np.arange(self.num_configurations)
+        lookup = {configuration: i for i, configuration in enumerate(self.configurations)}
+        return np.array([lookup[configuration] for configuration in configurations], dtype=int)
+
+    def oracle_times(self, configurations=None):
+        """
+        :return: the runtime of each file with the fastest of the given configurations, all by default
+        """
+        return self.times[:, self.get_indices(configurations)].min(axis=1)
+
+    def oracle_choices(self, configurations=None):
+        """
+        :return: the fastest of the given configurations for each file, as a Series indexed by cfile
+        """
+        indices = self.get_indices(configurations)
+        best = indices[self.times[:, indices].argmin(axis=1)]
+        return pd.Series(np.array(self.configurations)[best], index=self.cfiles, name="Configuration")
+
+    def score(self, configurations=None, objective="total"):
+        """
+        :return: the objective of running the best of the given configurations on each file
+        """
+        return evaluate_objective(self.oracle_times(configurations), objective)
+
+    def single_scores(self, objective="total"):
+        """
+        :return: the objective of each configuration on its own, as a Series sorted from best to worst
+        """
+        scores = evaluate_objective(self.times, objective)
+        return pd.Series(scores, index=self.configurations).sort_values()
+
+    def get_undominated(self):
+        """
+        :return: the indices of configurations that are not dominated by another configuration.
+                 A configuration is dominated if another is at least as fast on every file, and faster on some.
+                 Dominated configurations are never needed in a portfolio. Of identical configurations, the first is kept
+        """
+        keep = []
+        for i in range(self.num_configurations):
+            column = self.times[:, i:i+1]
+            at_least_as_fast = (self.times <= column).all(axis=0)
+            faster = (self.times < column).any(axis=0)
+            dominators = at_least_as_fast & (faster | (np.arange(self.num_configurations) < i))
+            dominators[i] = False
+            if not dominators.any():
+                keep.append(i)
+        return np.array(keep, dtype=int)
+
+    def greedy_portfolio(self, k, objective="total", configurations=None):
+        """
+        Builds a portfolio by repeatedly adding the configuration that improves the objective the most.
+        :return: a list of (configuration, objective of the portfolio so far), one per added configuration
+        """
+        candidates = list(self.get_indices(configurations))
+        current = np.full(self.num_files, np.inf)
+        portfolio = []
+        for _ in range(min(k, len(candidates))):
+            scores = evaluate_objective(np.minimum(current[:, None], self.times[:, candidates]), objective)
+            best = int(np.argmin(scores))
+            chosen = candidates.pop(best)
+            current = np.minimum(current, self.times[:, chosen])
+            portfolio.append((self.configurations[chosen], scores[best]))
+        return portfolio
+
+    def count_portfolios(self, k, configurations=None):
+        """
+        :return: how many portfolios of exactly k configurations exact_portfolio has to consider at most
+        """
+        candidates = np.intersect1d(self.get_indices(configurations), self.get_undominated())
+        return math.comb(len(candidates), min(k, len(candidates)))
+
+    def exact_portfolio(self, k, objective="total", configurations=None):
+        """
+        Finds the portfolio of k configurations with the best objective, using branch and bound.
+        Dominated configurations are skipped. A partial portfolio is pruned when even adding the oracle
+        of all remaining candidates would not beat the best portfolio found so far.
+        :return: a tuple (list of configurations, objective)
+        """
+        candidates = np.intersect1d(self.get_indices(configurations), self.get_undominated())
+        k = min(k, len(candidates))
+        times = self.times[:, candidates]
+        # Start with the greedy portfolio, to prune from the beginning
+        greedy = self.greedy_portfolio(k, objective, [self.configurations[i] for i in candidates])
+        best_score = greedy[-1][1]
+        best = [configuration for configuration, _ in greedy]
+
+        # suffix_oracle[:, i] is the oracle of candidates i and later
+        suffix_oracle = np.minimum.accumulate(times[:, ::-1], axis=1)[:, ::-1]
+
+        def visit(start, chosen, current):
+            nonlocal best, best_score
+            remaining = k - len(chosen)
+            if evaluate_objective(np.minimum(current, suffix_oracle[:, start]), objective) >= best_score:
+                return
+            if remaining == 1:
+                # Evaluate every choice of the last configuration at once
+                scores = evaluate_objective(np.minimum(current[:, None], times[:, start:]), objective)
+                last = int(np.argmin(scores))
+                if scores[last] < best_score:
+                    best_score = scores[last]
+                    best = [self.configurations[candidates[i]] for i in [*chosen, start + last]]
+                return
+            for i in range(start, len(candidates) - remaining + 1):
+                visit(i + 1, [*chosen, i], np.minimum(current, times[:, i]))
+
+        visit(0, [], np.full(self.num_files, np.inf))
+        return best, best_score
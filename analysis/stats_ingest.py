@@ -0,0 +1,565 @@
+"""
+Shared engine for reading the statistics folders written by benchmark.py.
+Used by the aggregation scripts, which import it from the analysis folder.
+
+A statistics folder contains one <cfile>.log per C file, where cfile contains a +,
+and any number of related files named <cfile>-<suffix>, such as RVSDG tree dumps.
+
+Aggregated tables are written as table stores, which the analysis scripts load with load_table.
+"""
+import os
+import os.path
+import multiprocessing
+import hashlib
+import json
+import shutil
+import urllib.parse
+import pandas as pd
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None # Without pyarrow, table stores are written as CSV files
+
+class StatsDirectoryIndex:
+    """
+    Groups the files in a statistics folder by the C file they belong to, using a single listing of the folder.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        # Maps from cfile to the name of its statistics file
+        self.logs = {}
+        # Maps from cfile to the names of the other files starting with <cfile>-
+        self.related = {}
+
+        others = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(".log") and "+" in entry.name:
+                    self.logs[entry.name[:-4]] = entry.name
+                elif entry.is_file():
+                    others.append(entry.name)
+
+        for name in others:
+            # C file names can contain -, so try every prefix ending before a -, starting with the longest
+            end = name.rfind("-")
+            while end > 0:
+                if name[:end] in self.logs:
+                    self.related.setdefault(name[:end], []).append(name)
+                    break
+                end = name.rfind("-", 0, end)
+
+    def get_path(self, name):
+        return os.path.join(self.folder, name)
+
+    def get_entries(self):
+        """
+        :return: a list of (cfile, path to statistics file, paths to related files), sorted by cfile
+        """
+        return [(cfile, self.get_path(log), [self.get_path(name) for name in sorted(self.related.get(cfile, []))])
+                for cfile, log in sorted(self.logs.items())]
+
+class ColumnLookup:
+    """
+    Maps (statistic, name) pairs from statistics files to column names, following a metrics mapping.
+    The mapping is a dict from statistic to either a list or a function:
+     - In a list, an entry `name` keeps the value under the same name, and (name, rename) keeps it as rename
+     - A function takes the name and returns the column name, or None to discard the value
+    Lists are compiled into a single dict up front, and the results of functions are cached.
+    """
+    def __init__(self, metrics_mapping):
+        self.table = {}
+        self.functions = {}
+        for statistic, mapping in metrics_mapping.items():
+            if callable(mapping):
+                self.functions[statistic] = mapping
+                continue
+            for entry in mapping:
+                old, new = entry if isinstance(entry, tuple) else (entry, entry)
+                # If a name is listed multiple times, the first entry is used
+                self.table.setdefault((statistic, old), new)
+
+    def get(self, statistic, name):
+        key = (statistic, name)
+        try:
+            return self.table[key]
+        except KeyError:
+            pass
+
+        function = self.functions.get(statistic)
+        column = function(name) if function is not None else None
+        self.table[key] = column
+        return column
+
+def parse_stats_line(line):
+    """
+    Splits a line of a statistics file, of the form "<statistic> <file> <name>:<value> ...".
+    Tokens without a : are skipped.
+    :return: a tuple (statistic, list of (name, value)), where values are strings, or None for blank or truncated lines
+    """
+    fields = line.split()
+    if len(fields) < 2:
+        return None
+
+    values = []
+    for part in fields[2:]:
+        name, colon, value = part.partition(":")
+        if colon:
+            values.append((name, value))
+    return fields[0], values
+
+def iter_stats_file(path):
+    """
+    Yields a tuple (statistic, list of (name, value)) for every line of the statistics file, see parse_stats_line
+    """
+    with open(path, "r", encoding="utf-8") as fd:
+        for line in fd:
+            parsed = parse_stats_line(line)
+            if parsed is not None:
+                yield parsed
+
+def read_stats_file(path, lookup):
+    """
+    Reads the values of a statistics file that have a column in the given ColumnLookup.
+    If the same column occurs multiple times, the last value is used.
+    :return: a dict from column name to value, where numbers are ints
+    """
+    row = {}
+    for statistic, values in iter_stats_file(path):
+        for name, value in values:
+            column = lookup.get(statistic, name)
+            if not column:
+                continue
+            try:
+                row[column] = int(value)
+            except ValueError:
+                row[column] = value
+    return row
+
+def drop_profiled_timers(data):
+    """
+    Removes the timers of rows from profiled runs, marked by a value in the Profiled column,
+    as profiling slows jlm-opt down. The other values of the rows are kept.
+    :return: the number of profiled rows
+    """
+    if "Profiled" not in data:
+        return 0
+
+    profiled = data["Profiled"].notna()
+    for column in data.columns:
+        if column.endswith("[ns]"):
+            data[column] = data[column].mask(profiled)
+    return int(profiled.sum())
+
+class ColumnTable:
+    """
+    Collects rows into one list of values per column, instead of keeping a dict per row.
+    Columns that only contain ints become integer columns, which are nullable if some rows lack a value.
+    """
+    def __init__(self):
+        self.num_rows = 0
+        # Maps from column name to a tuple (row indices, values)
+        self.columns = {}
+
+    def append(self, row):
+        for name, value in row.items():
+            indices, values = self.columns.setdefault(name, ([], []))
+            indices.append(self.num_rows)
+            values.append(value)
+        self.num_rows += 1
+
+    def to_dataframe(self):
+        data = {}
+        for name, (indices, values) in self.columns.items():
+            dtype = None
+            if all(type(value) is int for value in values):
+                dtype = "int64" if len(values) == self.num_rows else "Int64"
+            data[name] = pd.Series(values, index=indices, dtype=dtype)
+        return pd.DataFrame(data, index=pd.RangeIndex(self.num_rows))
+
+# The function used to read files in worker processes. Set when the worker starts, as it may not be picklable
+_worker_read_file = None
+
+def _init_worker(read_file):
+    global _worker_read_file
+    _worker_read_file = read_file
+
+def _read_entry(entry):
+    return _worker_read_file(*entry)
+
+def ingest(index, read_file, workers=None, chunksize=16):
+    """
+    Reads the statistics of every C file in the index, using a pool of worker processes.
+    :param read_file: called as read_file(cfile, stats_path, related_paths), returning a dict with the row
+                      of the C file, or None to skip it
+    :param workers: the number of worker processes, one per available CPU by default.
+                    With 1, files are read in this process
+    :return: a ColumnTable with one row per C file, in the order of the index
+    """
+    return ingest_entries(index.get_entries(), read_file, workers, chunksize)
+
+def _read_entries(entries, read_file, workers, chunksize):
+    """
+    Yields the result of read_file for each entry, in order, reading them in worker processes
+    """
+    if workers is None:
+        # Only count the CPUs this process may use, such as the ones given to a Slurm job
+        workers = len(os.sched_getaffinity(0))
+
+    if workers == 1 or len(entries) <= 1:
+        for entry in entries:
+            yield read_file(*entry)
+        return
+
+    # Forking lets the workers use read_file without pickling it
+    context = multiprocessing.get_context("fork")
+    with context.Pool(workers, initializer=_init_worker, initargs=(read_file,)) as pool:
+        yield from pool.imap(_read_entry, entries, chunksize=chunksize)
+
+def ingest_entries(entries, read_file, workers=None, chunksize=16):
+    """
+    Like ingest, but only reads the given entries, as returned by StatsDirectoryIndex.get_entries
+    """
+    table = ColumnTable()
+    for row in _read_entries(entries, read_file, workers, chunksize):
+        if row is not None:
+            table.append(row)
+    return table
+
+def ingest_streaming(index, read_file, writer, chunk_rows=100_000, workers=None, chunksize=16):
+    """
+    Like ingest, but for statistics files that become many rows each, such as configuration sweeps.
+    Rows are passed to the writer in chunks of about chunk_rows rows as they are read,
+    so memory use is bounded by the chunk size instead of the number of files.
+    Anything that should be reduced, like repetitions of a measurement, must be reduced by read_file,
+    which runs in the worker processes.
+    :param read_file: called as read_file(cfile, stats_path, related_paths), returning a list of dicts
+    :param writer: has a write(DataFrame) method, such as a TableStoreWriter
+    :return: the number of rows written
+    """
+    table = ColumnTable()
+    num_rows = 0
+    for rows in _read_entries(index.get_entries(), read_file, workers, chunksize):
+        for row in rows:
+            table.append(row)
+        if table.num_rows >= chunk_rows:
+            writer.write(table.to_dataframe())
+            num_rows += table.num_rows
+            table = ColumnTable()
+
+    if table.num_rows > 0:
+        writer.write(table.to_dataframe())
+        num_rows += table.num_rows
+    return num_rows
+
+def hash_file(path):
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fd:
+        while chunk := fd.read(1 << 20):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def hash_sources(*paths):
+    """
+    Hashes the given source files, such as the aggregation script itself.
+    Used as the version of an IngestManifest, making changes to how files are read invalidate ingested rows.
+    """
+    return "-".join(hash_file(path)[:8] for path in paths)
+
+class IngestManifest:
+    """
+    Remembers which files each ingested row was read from, by path, size, modification time and content hash.
+    A C file must be read again if any of its files are new, removed or changed.
+    The content hash is only computed when the size or modification time differs,
+    so touching a file without changing it does not make it be read again.
+    """
+    VERSION = 1
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        # Maps from cfile to a dict from file path to [size, mtime_ns, hash]
+        self.entries = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fd:
+                manifest = json.load(fd)
+            if manifest.get("manifest_version") == self.VERSION and manifest.get("version") == version:
+                self.entries = manifest["entries"]
+
+    @staticmethod
+    def get_file_signature(path, known=None):
+        stat = os.stat(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known
+        return [stat.st_size, stat.st_mtime_ns, hash_file(path)]
+
+    def update_entry(self, entry):
+        """
+        Updates the manifest with the current signatures of the files of the entry.
+        :return: True if the entry must be read again
+        """
+        cfile, stats_path, related_paths = entry
+        known = self.entries.get(cfile, {})
+        signatures = {path: self.get_file_signature(path, known.get(path)) for path in [stats_path, *related_paths]}
+        changed = signatures.keys() != known.keys() or \
+            any(signature[2] != known[path][2] for path, signature in signatures.items())
+        self.entries[cfile] = signatures
+        return changed
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fd:
+            json.dump({"manifest_version": self.VERSION, "version": self.version, "entries": self.entries}, fd)
+        os.replace(tmp_path, self.path)
+
+def ingest_incrementally(index, read_file, cache_path, version, workers=None):
+    """
+    Like ingest, but only reads C files that are new or have changed since the last call with the same cache_path.
+    The ingested rows are kept in <cache_path>.pickle, and a manifest of the files they were read from
+    in <cache_path>.manifest.json. Rows of C files that no longer have statistics are removed.
+    :param read_file: like in ingest, but every returned row must include the cfile in a "cfile" column
+    :param version: identifies how files are read, such as the result of hash_sources.
+                    If it differs from the version of the manifest, everything is read again
+    :return: a DataFrame with one row per C file, sorted by cfile
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    table_path = f"{cache_path}.pickle"
+    manifest = IngestManifest(f"{cache_path}.manifest.json", version)
+
+    previous = None
+    if len(manifest.entries) > 0 and os.path.exists(table_path):
+        previous = pd.read_pickle(table_path)
+    else:
+        manifest.entries = {}
+
+    entries = index.get_entries()
+    changed_entries = [entry for entry in entries if manifest.update_entry(entry)]
+    current_cfiles = {cfile for cfile, _, _ in entries}
+    for cfile in list(manifest.entries):
+        if cfile not in current_cfiles:
+            del manifest.entries[cfile]
+
+    new_rows = ingest_entries(changed_entries, read_file, workers).to_dataframe()
+    print(f"Read {len(changed_entries)} new or changed of {len(entries)} statistics files in {index.folder}")
+
+    if previous is not None and len(previous) > 0:
+        changed_cfiles = {cfile for cfile, _, _ in changed_entries}
+        keep = previous["cfile"].isin(current_cfiles) & ~previous["cfile"].isin(changed_cfiles)
+        table = pd.concat([previous[keep], new_rows], ignore_index=True)
+    else:
+        table = new_rows
+
+    if len(table) > 0:
+        table = table.sort_values("cfile", kind="stable", ignore_index=True)
+
+    # The table is written before the manifest, so an interrupted run at worst reads some files again
+    table.to_pickle(table_path)
+    manifest.save()
+    return table
+
+# Columns with few distinct strings, that are stored as categories
+CATEGORICAL_COLUMNS = ["cfile", "program", "Configuration"]
+
+def downcast_columns(data):
+    """
+    Makes the columns of the given DataFrame smaller, in place.
+    Integer columns use the smallest of int32 and int64 that fits their values. Smaller types are not used,
+    as sums of columns, such as the total number of constraints, would silently overflow.
+    Timers in nanoseconds are always kept as int64, as they are added together into total times.
+    """
+    for column in data.columns:
+        if column in CATEGORICAL_COLUMNS:
+            if isinstance(data[column].dtype, pd.CategoricalDtype):
+                data[column] = data[column].cat.remove_unused_categories()
+            else:
+                data[column] = data[column].astype("category")
+            continue
+
+        dtype = data[column].dtype
+        if not pd.api.types.is_integer_dtype(dtype) or dtype.itemsize <= 4 or column.endswith("[ns]"):
+            continue
+        values = data[column].dropna()
+        if len(values) == 0 or (values.min() >= -2**31 and values.max() < 2**31):
+            nullable = isinstance(dtype, pd.api.extensions.ExtensionDtype)
+            data[column] = data[column].astype("Int32" if nullable else "int32")
+    return data
+
+class TableStoreWriter:
+    """
+    Writes a table store: a folder with files for each combination of values in the partition columns,
+    in nested folders named <column>=<value>. Rows are buffered per partition, and a partition is written
+    to a new file once it has part_rows rows. If more than max_buffered_rows rows are buffered in total,
+    the largest partitions are written until half of that remains, so memory use is bounded
+    while a table is written in chunks. The remaining rows are written when the writer is closed.
+    The files are Parquet if pyarrow is available, and CSV otherwise. The index is not written.
+    Any previous store at the path is replaced when the writer is closed.
+    """
+    def __init__(self, path, partition_cols, part_rows=100_000, max_buffered_rows=1_000_000):
+        self.path = path
+        self.partition_cols = partition_cols
+        self.part_rows = part_rows
+        self.max_buffered_rows = max_buffered_rows
+        self.tmp_path = path + ".tmp"
+        # Maps from partition folder to a list of DataFrames not yet written
+        self.buffers = {}
+        # Maps from partition folder to the number of rows in its buffer
+        self.buffered_rows = {}
+        # Maps from partition folder to the number of files written to it
+        self.num_parts = {}
+
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+
+    def write(self, data):
+        data = data.reset_index(drop=True)
+        for values, part in data.groupby(self.partition_cols, observed=True, sort=True):
+            if not isinstance(values, tuple):
+                values = (values,)
+            folders = [f"{column}={urllib.parse.quote(str(value), safe='')}"
+                       for column, value in zip(self.partition_cols, values)]
+            folder = os.path.join(self.tmp_path, *folders)
+
+            self.buffers.setdefault(folder, []).append(part.drop(columns=self.partition_cols))
+            self.buffered_rows[folder] = self.buffered_rows.get(folder, 0) + len(part)
+            if self.buffered_rows[folder] >= self.part_rows:
+                self.flush_partition(folder)
+
+        if sum(self.buffered_rows.values()) > self.max_buffered_rows:
+            for folder in sorted(self.buffered_rows, key=self.buffered_rows.get, reverse=True):
+                if sum(self.buffered_rows.values()) <= self.max_buffered_rows // 2:
+                    break
+                self.flush_partition(folder)
+
+    def flush_partition(self, folder):
+        """
+        Writes the buffered rows of the given partition folder to a new file in it
+        """
+        part = downcast_columns(pd.concat(self.buffers.pop(folder), ignore_index=True))
+        del self.buffered_rows[folder]
+
+        num_parts = self.num_parts.get(folder, 0)
+        self.num_parts[folder] = num_parts + 1
+        part_name = f"part-{num_parts}.parquet" if pyarrow is not None else f"part-{num_parts}.csv"
+        os.makedirs(folder, exist_ok=True)
+        if pyarrow is not None:
+            part.to_parquet(os.path.join(folder, part_name), index=False)
+        else:
+            part.to_csv(os.path.join(folder, part_name), index=False)
+
+    def close(self):
+        for folder in list(self.buffers):
+            self.flush_partition(folder)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+def write_table_store(data, path, partition_cols):
+    """
+    Writes the given DataFrame as a table store, see TableStoreWriter
+    """
+    with TableStoreWriter(path, partition_cols) as writer:
+        writer.write(data)
+
+def _find_parts(folder, partitions, values=()):
+    """
+    :return: a list of (path, ((partition column, value), ...)) for every part file below the folder,
+             skipping partitions whose value is not accepted by the partitions filter
+    """
+    parts = []
+    with os.scandir(folder) as entries:
+        # Parts are ordered by number, which is the order they were written in
+        for entry in sorted(entries, key=lambda entry: (entry.name.startswith("part-") and len(entry.name), entry.name)):
+            if entry.is_dir():
+                column, sep, value = entry.name.partition("=")
+                if not sep:
+                    continue
+                value = urllib.parse.unquote(value)
+                if partitions is not None and column in partitions and value not in partitions[column]:
+                    continue
+                parts.extend(_find_parts(entry.path, partitions, (*values, (column, value))))
+            elif entry.name.startswith("part-"):
+                parts.append((entry.path, values))
+    return parts
+
+def _select_columns(available, columns):
+    if columns is None:
+        return list(available)
+    if callable(columns):
+        return [column for column in available if columns(column)]
+    return [column for column in available if column in columns]
+
+def _filter_partitions(data, partitions):
+    if partitions is None:
+        return data
+    for column, accepted in partitions.items():
+        if column in data:
+            data = data[data[column].isin(accepted)]
+    return data.reset_index(drop=True)
+
+def iter_table_store(path, columns=None, partitions=None):
+    """
+    Yields the files of a table store written by write_table_store one at a time, each as a DataFrame,
+    so a store can be processed without holding all of it in memory. See read_table_store for the arguments
+    """
+    for part_path, values in _find_parts(path, partitions):
+        if part_path.endswith(".parquet"):
+            available = pyarrow.parquet.read_schema(part_path).names
+            frame = pd.read_parquet(part_path, columns=_select_columns(available, columns))
+        else:
+            frame = pd.read_csv(part_path, usecols=lambda column: len(_select_columns([column], columns)) > 0)
+
+        for column, value in values:
+            if len(_select_columns([column], columns)) > 0:
+                frame[column] = value
+        yield frame
+
+def read_table_store_columns(path):
+    """
+    :return: the names of every column in a table store, including partition columns, without reading any rows
+    """
+    names = {}
+    for part_path, values in _find_parts(path, None):
+        if part_path.endswith(".parquet"):
+            available = pyarrow.parquet.read_schema(part_path).names
+        else:
+            available = pd.read_csv(part_path, nrows=0).columns
+        names.update(dict.fromkeys(available))
+        names.update(dict.fromkeys(column for column, _ in values))
+    return list(names)
+
+def read_table_store(path, columns=None, partitions=None):
+    """
+    Reads a table store written by write_table_store.
+    :param columns: the columns to read, either a list of names or a function that takes a name and returns
+                    True if the column should be read. Columns that do not exist in the store are skipped.
+                    All columns are read by default
+    :param partitions: a dict from partition column to the list of values to read. Other partitions are
+                       skipped without being opened
+    """
+    frames = list(iter_table_store(path, columns, partitions))
+    if len(frames) == 0:
+        return pd.DataFrame()
+    return downcast_columns(pd.concat(frames, ignore_index=True))
+
+def load_table(stats_folder, name, columns=None, partitions=None):
+    """
+    Loads the aggregated table with the given name from the statistics folder.
+    Uses the table store <name>.store if it exists, and otherwise <name>.csv.
+    The columns and partitions are as in read_table_store. With a CSV file, every row is read and then filtered.
+    """
+    store_path = os.path.join(stats_folder, f"{name}.store")
+    if os.path.isdir(store_path):
+        return read_table_store(store_path, columns, partitions)
+
+    data = pd.read_csv(os.path.join(stats_folder, f"{name}.csv"),
+                       usecols=lambda column: len(_select_columns([column], columns)) > 0)
+    return downcast_columns(_filter_partitions(data, partitions))
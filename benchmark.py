@@ -15,6 +15,20 @@ import queue
 import json
 import functools
 import traceback
+import hashlib
+import gzip
+import pickle
+import itertools
+import types
+import math
+import random
+import signal
+import statistics
+
+try:
+    import psutil
+except ImportError:
+    psutil = None # Only needed for --rssSampleInterval
 
 class TaskTimeoutError(Exception):
     pass
@@ -30,12 +44,17 @@ class Options:
     DEFAULT_JLM_OPT = "../jlm/build-release/jlm-opt"
     DEFAULT_JLM_OPT_VERBOSITY = 1
 
-    def __init__(self, llvm_bindir, build_dir, stats_dir, jlm_opt, jlm_opt_verbosity, timeout):
+    def __init__(self, llvm_bindir, build_dir, stats_dir, jlm_opt, jlm_opt_verbosity, timeout, deduplicate=False,
+                 preprocess_cache=False, link_fan_in=8, split_larger_than=None, memory_limit=None,
+                 execution_cpu=None, frontend_trace=False, perf_counters=False, profile_slower_than=None,
+                 rss_sample_interval=None, jlm_opt_b=None, ab_runs=5):
         self.llvm_bindir = llvm_bindir
         self.clang = os.path.join(llvm_bindir, "clang")
         self.clang_link = os.path.join(llvm_bindir, "clang++")
         self.opt = os.path.join(llvm_bindir, "opt")
         self.llvm_link = os.path.join(llvm_bindir, "llvm-link")
+        self.llvm_split = os.path.join(llvm_bindir, "llvm-split")
+        self.llvm_extract = os.path.join(llvm_bindir, "llvm-extract")
 
         self.build_dir = build_dir
         self.stats_dir = stats_dir
@@ -48,6 +67,48 @@ class Options:
         # Any other task that relies on the output of the task is skipped
         self.timeout = timeout
 
+        # When set, compilation units that are identical after preprocessing are only compiled once
+        self.deduplicate = deduplicate
+
+        # When set, C files are first preprocessed into a compressed cache, which LLVM IR is generated from
+        self.preprocess_cache = preprocess_cache
+
+        # The maximum number of files merged by a single llvm-link invocation when linking whole programs.
+        # Larger programs are merged in a tree of llvm-link tasks, which can run in parallel
+        self.link_fan_in = link_fan_in
+
+        # When set, the LLVM IR given to jlm-opt is split into chunks of roughly this many bytes, if larger
+        self.split_larger_than = split_larger_than
+
+        # When set, limits the address space of each jlm-opt process. In bytes.
+        self.memory_limit = memory_limit
+
+        # The CPU that executed benchmark binaries are pinned to, or None to not pin them
+        self.execution_cpu = execution_cpu
+
+        # When set, clang records a -ftime-trace and opt records -time-passes for every C file.
+        # The traces are placed next to the statistics files, see get_frontend_trace_files
+        self.frontend_trace = frontend_trace
+
+        # When set, jlm-opt is run inside perf stat, and its hardware performance counters are added to its statistics
+        self.perf = "perf"
+        self.perf_counters = perf_counters
+
+        # When set, jlm-opt runs that are expected to take longer than this many seconds are profiled, see get_profiler
+        self.profile_slower_than = profile_slower_than
+        # The way profiles are made, either "perf" or "eu-stack". Found by check_profiler_available
+        self.profiler = None
+        # The JlmOptTimeModel used to decide which runs to profile
+        self.jlm_opt_time_model = None
+
+        # When set, the memory use of jlm-opt is sampled at this interval, in seconds, see MemorySampler
+        self.rss_sample_interval = rss_sample_interval
+
+        # When set, every C file is optimized by both jlm_opt and this second jlm-opt binary, ab_runs times each,
+        # to compare the two builds on the same inputs, see add_ab_tasks
+        self.jlm_opt_b = jlm_opt_b
+        self.ab_runs = ab_runs
+
     def get_build_dir(self, filename=""):
         return os.path.abspath(os.path.join(self.build_dir, filename))
 
@@ -57,14 +118,54 @@ class Options:
 
 options: Options = None
 
-def run_command(args, cwd=None, env_vars=None, *, verbose=0, print_prefix="", timeout=None):
+def get_memory_limited_command(command, memory_limit):
+    """
+    If memory_limit is not None, wraps the command in prlimit, limiting its address space to memory_limit bytes.
+    The limit is set before the command starts, and only applies to it, not to any wrapper the result is placed in.
+    """
+    if memory_limit is None:
+        return command
+    return ["prlimit", f"--as={memory_limit}", "--", *command]
+
+def kill_process_group(process):
+    """
+    Kills the given process, and every process it has started, such as jlm-opt started by perf.
+    The process must have been started in a new session.
+    """
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass # Every process in the group has already finished
+    process.wait()
+
+# Commands that are running. Each is in its own session, so Ctrl-C does not reach it, and must be killed when stopping
+running_processes = set()
+# Set when stopping, to keep tasks that are still running from starting new commands
+stop_running_commands = False
+running_processes_lock = threading.Lock()
+
+def kill_running_processes():
+    """
+    Kills every running command, along with every process it has started, and prevents new commands from starting.
+    """
+    global stop_running_commands
+    with running_processes_lock:
+        stop_running_commands = True
+        processes = list(running_processes)
+    for process in processes:
+        kill_process_group(process)
+
+def run_command(args, cwd=None, env_vars=None, *, verbose=0, print_prefix="", timeout=None, monitor=None):
     """
     Runs the given command, with the given environment variables set.
     :param verbose: how much output to provide
      - 0 no output unless the command fails, in which case stdout and stderr are printed
      - 1 if no new output has been produced in 1 minute, the last line is printed. Stderr is always printed.
      - 2 prints the command being run, as well as all output immediately
-    :param timeout: the timeout for the command, in seconds. If reached, TaskTimeoutError is raised
+    :param timeout: the timeout for the command, in seconds. If reached, TaskTimeoutError is raised,
+                    and the command is killed along with every process it has started
+    :param monitor: if not None, it is called with the Popen object as soon as the command has started.
+                    Used to observe the running process from a separate thread
     """
     assert verbose in [0, 1, 2]
 
@@ -76,7 +177,24 @@ def run_command(args, cwd=None, env_vars=None, *, verbose=0, print_prefix="", ti
         kwargs["stdout"] = subprocess.PIPE
     if verbose == 0:
         kwargs["stderr"] = subprocess.PIPE
-    process = subprocess.Popen(args, cwd=cwd, env=env_vars, text=True, bufsize=1, **kwargs)
+    # In a new session, so that a timeout can kill the processes started by wrappers such as perf
+    with running_processes_lock:
+        if stop_running_commands:
+            raise TaskSubprocessError()
+        process = subprocess.Popen(args, cwd=cwd, env=env_vars, text=True, bufsize=1, start_new_session=True, **kwargs)
+        running_processes.add(process)
+    try:
+        wait_for_command(process, args, verbose=verbose, print_prefix=print_prefix, timeout=timeout, monitor=monitor)
+    finally:
+        with running_processes_lock:
+            running_processes.discard(process)
+
+def wait_for_command(process, args, *, verbose, print_prefix, timeout, monitor):
+    """
+    Waits for a command started by run_command to finish, see run_command for the parameters.
+    """
+    if monitor is not None:
+        monitor(process)
 
     if verbose == 1:
         # Use a queue and a separate thread to send lines as they come
@@ -95,7 +213,7 @@ def run_command(args, cwd=None, env_vars=None, *, verbose=0, print_prefix="", ti
 
             # Check if we have timed out
             if timeout is not None and time.time() - start_time > timeout:
-                process.kill()
+                kill_process_group(process)
                 raise TaskTimeoutError()
 
             try:
@@ -119,7 +237,7 @@ def run_command(args, cwd=None, env_vars=None, *, verbose=0, print_prefix="", ti
     try:
         stdout, stderr = process.communicate(timeout=timeout)
     except subprocess.TimeoutExpired:
-        process.kill()
+        kill_process_group(process)
         raise TaskTimeoutError()
 
     if process.returncode != 0:
@@ -130,8 +248,8 @@ def run_command(args, cwd=None, env_vars=None, *, verbose=0, print_prefix="", ti
             print(f"Stderr:", stderr)
         raise TaskSubprocessError()
 
-def run_command_and_capture(command, env_vars=None):
-    p = subprocess.run(command, env=env_vars, capture_output=True, text=True, check=True)
+def run_command_and_capture(command, env_vars=None, cwd=None):
+    p = subprocess.run(command, cwd=cwd, env=env_vars, capture_output=True, text=True, check=True)
     return p.stdout, p.stderr
 
 def move_output_files(temp_dir, stats_output, other_outputs):
@@ -176,6 +294,16 @@ def clean_temp_dir(temp_dir):
     for fil in os.listdir(temp_dir):
         os.remove(os.path.join(temp_dir, fil))
 
+def get_combined_env_vars(env_vars):
+    """
+    Returns the environment of this process, extended with the given environment variables.
+    The result is read-only, making it safe to share between all tasks.
+    """
+    combined_env_vars = os.environ.copy()
+    if env_vars is not None:
+        combined_env_vars.update(env_vars)
+    return types.MappingProxyType(combined_env_vars)
+
 def ensure_folder_exists(path):
     if os.path.exists(path):
         return
@@ -186,15 +314,30 @@ def ensure_folder_exists(path):
 
 
 class Task:
-    def __init__(self, *, name, input_files, output_files, action, skip_if_any_file_exists=None):
+    # Tasks can number in the hundreds of thousands, so avoid a __dict__ per task
+    __slots__ = ("name", "input_files", "output_files", "action", "stage", "duration",
+                 "skip_if_any_file_exists", "deps_file", "index")
+
+    def __init__(self, *, name, input_files, output_files, action, skip_if_any_file_exists=None, deps_file=None, stage=None):
         self.name = name
         self.input_files = input_files
         self.output_files = output_files
         self.action = action
 
+        # The kind of work done by the task, used when summarizing time spent per stage
+        self.stage = stage
+        # How long the task took to run, set once it has finished successfully
+        self.duration = None
+
         # Bonus list of files that can cause this task to be skipped
         self.skip_if_any_file_exists = [] if skip_if_any_file_exists is None else skip_if_any_file_exists
 
+        # Optional file listing additional inputs discovered the last time the task ran, such as headers
+        self.deps_file = deps_file
+
+        # The position of the task among all created tasks, assigned when tasks are enumerated
+        self.index = None
+
     def run(self):
         self.action(self)
 
@@ -202,14 +345,63 @@ def any_output_matches(task, regex):
     """Returns true if any one of the output files of the given task contains a match for the given regex"""
     return any(regex.search(of) is not None for of in task.output_files)
 
+def read_make_deps_file(make_deps_file, workdir):
+    """
+    Reads a make-style dependency file, as produced by clang -MD -MF.
+    :param workdir: the directory relative paths in the file are relative to
+    :return: a list of absolute paths to every prerequisite in the file
+    """
+    with open(make_deps_file, 'r', encoding='utf-8') as fd:
+        content = fd.read()
+
+    # Join continued lines, and protect escaped spaces from splitting
+    content = content.replace("\\\n", " ").replace("\\ ", "\0")
+    _, _, prerequisites = content.partition(": ")
+
+    return [os.path.abspath(os.path.join(workdir, prerequisite.replace("\0", " ")))
+            for prerequisite in prerequisites.split()]
+
+def write_deps_file(deps_file, dependencies):
+    """Writes a deps file with one absolute path per line"""
+    with open(deps_file, 'w', encoding='utf-8') as fd:
+        for dependency in dependencies:
+            print(dependency, file=fd)
+
+def read_deps_file(deps_file):
+    with open(deps_file, 'r', encoding='utf-8') as fd:
+        return [line.rstrip("\n") for line in fd if line.strip()]
+
+def is_task_up_to_date(task):
+    """
+    Returns true if none of the input files of the task are newer than its oldest output.
+    Uses the task's deps file, if it has one, to also include inputs like headers.
+    Assumes all outputs of the task exist.
+    """
+    oldest_output = min(os.path.getmtime(of) for of in task.output_files)
+
+    inputs = list(task.input_files)
+    if task.deps_file is not None and os.path.isfile(task.deps_file):
+        inputs.extend(read_deps_file(task.deps_file))
+
+    for input_file in inputs:
+        try:
+            if os.path.getmtime(input_file) > oldest_output:
+                return False
+        except FileNotFoundError:
+            # A dependency that has been deleted means the command would now do something different
+            if task.deps_file is not None and input_file not in task.input_files:
+                return False
+
+    return True
+
 def can_skip_task(task):
     """
-    Returns true if all outputs of the given task already exist.
+    Returns true if all outputs of the given task already exist, and are newer than the task's inputs.
     Or the disk has a file that allows the task to be skipped.
     """
     all_outputs_exist = all(os.path.exists(of) for of in task.output_files)
 
-    if all_outputs_exist:
+    if all_outputs_exist and is_task_up_to_date(task):
         return True
 
     for skip_if_exists in task.skip_if_any_file_exists:
@@ -276,6 +468,7 @@ def run_all_tasks(tasks, workers=1, dryrun=False):
             else:
                 task_duration = (datetime.datetime.now() - task_start_time)
                 print(f"{prefix} took {task_duration}", flush=True)
+                task.duration = task_duration
 
         tasks_finished.append(task)
         # Remove all output files from not_ready
@@ -284,59 +477,1026 @@ def run_all_tasks(tasks, workers=1, dryrun=False):
 
     running_futures = set()
 
-    # All tasks where none of the input files are in files_not_ready can be submitted
-    while len(submitted_tasks) < len(tasks):
-        for i, task in enumerate(tasks):
-            if i in submitted_tasks:
-                continue
+    try:
+        # All tasks where none of the input files are in files_not_ready can be submitted
+        while len(submitted_tasks) < len(tasks):
+            for i, task in enumerate(tasks):
+                if i in submitted_tasks:
+                    continue
 
-            # Check if this task depends on any files that have been declared timed out, and thus will never arrive
-            if any(input_file in skippable_out_files for input_file in task.input_files):
-                print(f"({task.index}) {task.name} is skipped due to depending on a failed or timed out task", flush=True)
-                skippable_out_files.update(task.output_files)
-                submitted_tasks.add(i)
-                tasks_skipped.append(task)
-                continue
+                # Check if this task depends on any files that have been declared timed out, and thus will never arrive
+                if any(input_file in skippable_out_files for input_file in task.input_files):
+                    print(f"({task.index}) {task.name} is skipped due to depending on a failed or timed out task", flush=True)
+                    skippable_out_files.update(task.output_files)
+                    submitted_tasks.add(i)
+                    tasks_skipped.append(task)
+                    continue
 
-            if any(input_file in files_not_ready for input_file in task.input_files):
-                continue
+                if any(input_file in files_not_ready for input_file in task.input_files):
+                    continue
 
-            # submit it!
-            submitted_tasks.add(i)
-            running_futures.add(executor.submit(run_task, i, task))
+                # submit it!
+                submitted_tasks.add(i)
+                running_futures.add(executor.submit(run_task, i, task))
 
-        wait = concurrent.futures.wait(running_futures, return_when=concurrent.futures.FIRST_COMPLETED)
-        running_futures = wait.not_done
+            wait = concurrent.futures.wait(running_futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            running_futures = wait.not_done
 
-        # Check if any of the finished futures raised an exception, and abort
-        for d in wait.done:
-            if d.exception() is not None:
-                raise d.exception()
+            # Check if any of the finished futures raised an exception, and abort
+            for d in wait.done:
+                if d.exception() is not None:
+                    raise d.exception()
 
-    # Wait for all tasks to finish
-    executor.shutdown(wait=True)
+        # Wait for all tasks to finish
+        executor.shutdown(wait=True)
+    except KeyboardInterrupt:
+        # Commands run in their own sessions, so Ctrl-C only reaches this process, which must stop them
+        print("Interrupted, stopping all running commands", flush=True)
+        executor.shutdown(wait=False, cancel_futures=True)
+        kill_running_processes()
+        raise
 
     assert len(tasks_finished) + len(tasks_failed) + len(tasks_timed_out) + len(tasks_skipped) == len(tasks)
     return (tasks_finished, tasks_failed, tasks_timed_out, tasks_skipped)
 
 
-def compile_file(tasks, full_name, workdir, cfile, extra_clang_flags, stats_dir,
-                 env_vars=None, opt_flags=None, jlm_opt_flags=None, jlm_opt_suffix=None):
+class PreprocessedSourceCache:
+    """
+    A folder of compressed preprocessed C files, created by clang -E.
+    The file for each C file and set of preprocessing flags has a stable name, keyed by the path of the C file
+    and the flags, allowing IR generation with different clang flags to share a single preprocessing step.
+    Each file is also kept in objects/, keyed by the content of everything that was read to preprocess it,
+    as a hard link to the latest file made with that content. Identical C files in different folders can then
+    share one preprocessing step, once the files they read are known from an earlier run.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        # Maps from path key or content key to the path key of the task that makes the file
+        self.keys_with_tasks = {}
+        # Number of times a compilation used a preprocessed file another compilation also uses
+        self.num_reused = 0
+        # Maps from the path key of each task in this run, to the number of compilations using its file
+        self.num_users = {}
+        # Maps from path key to content key, for the files whose content key is known
+        self.content_keys = {}
+        # Path keys of tasks that copied a file with identical content, instead of preprocessing
+        self.copied_path_keys = []
+        # Maps from path to (mtime, hash of the content), as headers are shared by many C files
+        self.content_hashes = {}
+
+    def get_content_hash(self, path):
+        mtime = os.path.getmtime(path)
+        cached = self.content_hashes.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as fd:
+            content_hash = hashlib.sha256(fd.read()).hexdigest()
+        self.content_hashes[path] = (mtime, content_hash)
+        return content_hash
+
+    def get_path_key(self, workdir, cfile, preprocessing_flags):
+        source = os.path.abspath(os.path.join(workdir, cfile))
+        return hashlib.sha256("\0".join([source, *preprocessing_flags]).encode("utf-8")).hexdigest()
+
+    def get_content_key(self, cfile, preprocessing_flags, input_files):
+        """
+        Keys a preprocessed file by the flags, the name of the C file as given to clang, which __FILE__ expands to,
+        and the content of every file read when preprocessing it, in the order they were read.
+        Include paths are left out, as the content of the headers they lead to is part of the key.
+        :return: the content key, or None if one of the files no longer exists
+        """
+        _, other_flags = split_include_path_flags(preprocessing_flags)
+        key = hashlib.sha256("\0".join([cfile, *other_flags]).encode("utf-8"))
+        try:
+            for input_file in input_files:
+                key.update(b"\0")
+                key.update(self.get_content_hash(input_file).encode("utf-8"))
+        except FileNotFoundError:
+            return None
+        return key.hexdigest()
+
+    def get_keys(self, workdir, cfile, preprocessing_flags):
+        """
+        The content key is found from the files read the last time the C file was preprocessed.
+        :return: a tuple (path key, content key), where the content key is None if the C file has not been
+                 preprocessed before, or a file it read has been removed
+        """
+        path_key = self.get_path_key(workdir, cfile, preprocessing_flags)
+        deps_file = self.get_deps_path(path_key)
+        if not os.path.isfile(deps_file):
+            return path_key, None
+        return path_key, self.get_content_key(cfile, preprocessing_flags, read_deps_file(deps_file))
+
+    def get_path(self, path_key):
+        return os.path.join(self.cache_dir, f"{path_key}.i.gz")
+
+    def get_deps_path(self, path_key):
+        return os.path.join(self.cache_dir, f"{path_key}.deps")
+
+    def get_object_path(self, content_key):
+        return os.path.join(self.objects_dir, f"{content_key}.i.gz")
+
+    def get_time_path(self, content_key):
+        return os.path.join(self.objects_dir, f"{content_key}.time")
+
+    def add_object(self, compressed_file, path_key, content_key, duration=None):
+        """
+        Keeps the given compressed file in objects/ under its content key, replacing any earlier file with that
+        content, so the object stays linked from a preprocessed file for as long as one has the content
+        :param duration: the time in ns it took to make the file, or None to keep the time of the earlier file
+        """
+        object_path = self.get_object_path(content_key)
+        linked_tmp = f"{object_path}.{path_key}.tmp"
+        os.link(compressed_file, linked_tmp)
+        os.replace(linked_tmp, object_path)
+        if duration is not None:
+            with open(self.get_time_path(content_key), 'w', encoding='utf-8') as fd:
+                print(duration, file=fd)
+
+    def remove_unused_objects(self):
+        """
+        Removes the files in objects/ that are no longer linked from any preprocessed file,
+        as the file they were made for has been preprocessed again with different content
+        """
+        with os.scandir(self.objects_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".i.gz") and entry.stat().st_nlink == 1:
+                    os.remove(entry.path)
+                    time_file = self.get_time_path(entry.name[:-len(".i.gz")])
+                    if os.path.exists(time_file):
+                        os.remove(time_file)
+
+    def get_preprocessing_time(self, content_key):
+        """
+        :return: how long it took to make the preprocessed file with the given content key, or None if unknown
+        """
+        if content_key is None:
+            return None
+        try:
+            with open(self.get_time_path(content_key), 'r', encoding='utf-8') as fd:
+                return datetime.timedelta(microseconds=int(fd.read()) / 1000)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def print_time_saved(self):
+        """
+        Prints an estimate of the preprocessing time saved, from the time each shared preprocessed file took to make
+        """
+        shared = datetime.timedelta()
+        copied = datetime.timedelta()
+        num_unknown = 0
+        for path_key, num_users in self.num_users.items():
+            is_copied = path_key in self.copied_path_keys
+            if num_users == 1 and not is_copied:
+                continue
+            duration = self.get_preprocessing_time(self.content_keys.get(path_key))
+            if duration is None:
+                num_unknown += 1
+                continue
+            shared += duration * (num_users - 1)
+            if is_copied:
+                copied += duration
+
+        print(f"Preprocessed sources were shared by {self.num_reused} compilations that did not preprocess themselves")
+        print(f"Preprocessing time saved: {shared + copied} "
+              f"({shared} by sharing in this run, {copied} by copying files with identical content)")
+        if num_unknown != 0:
+            print(f"  The time saved by {num_unknown} preprocessed files is unknown, as their time was not recorded")
+
+# Flags that never affect the output of the preprocessor. The ones in the first list take their value as a separate argument
+NON_PREPROCESSING_FLAGS_WITH_VALUE = ["-o"]
+NON_PREPROCESSING_FLAGS = ["-emit-llvm", "-S", "-c"]
+NON_PREPROCESSING_FLAG_PREFIXES = ["-W", "-g"]
+
+def get_preprocessing_flags(extra_clang_flags):
+    """
+    Splits the given clang flags into flags that must be used when preprocessing, and flags used when generating IR.
+    Every flag is used when preprocessing, except the few known not to affect it,
+    as many flags define macros, such as -O2, -m32, -march=, -fPIC, -ffast-math, -funsigned-char, -fopenmp and -pthread
+    :return: a tuple (preprocessing_flags, ir_generation_flags)
+    """
+    preprocessing_flags = []
+    flags = iter(extra_clang_flags)
+    for flag in flags:
+        if flag in NON_PREPROCESSING_FLAGS_WITH_VALUE:
+            next(flags)
+        elif flag not in NON_PREPROCESSING_FLAGS and \
+                not any(flag.startswith(prefix) for prefix in NON_PREPROCESSING_FLAG_PREFIXES):
+            preprocessing_flags.append(flag)
+
+    _, ir_generation_flags = split_preprocessor_flags(extra_clang_flags)
+    return preprocessing_flags, ir_generation_flags
+
+def add_preprocess_task(full_name, workdir, cfile, preprocessing_flags, env_vars, preprocessed_cache):
+    """
+    Yields a task for preprocessing the given C file into the preprocessed cache, unless it already has a task.
+    C files whose content key is known share a task with other C files with the same content.
+    :return: the path of the compressed preprocessed file
+    """
+    path_key, content_key = preprocessed_cache.get_keys(workdir, cfile, preprocessing_flags)
+    task_key = content_key if content_key is not None else path_key
+    owner = preprocessed_cache.keys_with_tasks.get(task_key)
+    if owner is not None:
+        preprocessed_cache.num_users[owner] += 1
+        preprocessed_cache.num_reused += 1
+        return preprocessed_cache.get_path(owner)
+
+    preprocessed_cache.keys_with_tasks[task_key] = path_key
+    preprocessed_cache.num_users[path_key] = 1
+    if content_key is not None:
+        preprocessed_cache.content_keys[path_key] = content_key
+
+    preprocessed_out = preprocessed_cache.get_path(path_key)
+    preprocessed_deps_file = preprocessed_cache.get_deps_path(path_key)
+
+    def preprocess_action(task):
+        # Copy, instead of link, so the file gets its own modification time, which IR generation depends on
+        if content_key is not None and os.path.exists(preprocessed_cache.get_object_path(content_key)):
+            copied_tmp = f"{preprocessed_out}.tmp"
+            shutil.copyfile(preprocessed_cache.get_object_path(content_key), copied_tmp)
+            preprocessed_cache.add_object(copied_tmp, path_key, content_key)
+            os.replace(copied_tmp, preprocessed_out)
+            preprocessed_cache.copied_path_keys.append(path_key)
+            return
+
+        start_time = time.perf_counter_ns()
+        with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
+            preprocessed_tmp = os.path.join(tmpdir, "preprocessed.i")
+            make_deps_file = os.path.join(tmpdir, "preprocessed.d")
+            preprocess_command = [options.clang, "-E", cfile,
+                                  "-o", preprocessed_tmp,
+                                  "-MD", "-MF", make_deps_file,
+                                  *preprocessing_flags]
+            run_command(preprocess_command, cwd=workdir, env_vars=env_vars, timeout=options.timeout)
+            dependencies = read_make_deps_file(make_deps_file, workdir)
+
+            # Compress into a temporary file in the cache first, to never leave a partial file in the cache
+            compressed_tmp = f"{preprocessed_out}.tmp"
+            with open(preprocessed_tmp, 'rb') as in_fd, gzip.open(compressed_tmp, 'wb') as out_fd:
+                shutil.copyfileobj(in_fd, out_fd)
+
+        new_content_key = preprocessed_cache.get_content_key(cfile, preprocessing_flags, dependencies)
+        if new_content_key is not None:
+            preprocessed_cache.add_object(compressed_tmp, path_key, new_content_key,
+                                          time.perf_counter_ns() - start_time)
+            preprocessed_cache.content_keys[path_key] = new_content_key
+        os.replace(compressed_tmp, preprocessed_out)
+
+        # The files that were read are used for laziness, and to find the content key in later runs
+        write_deps_file(preprocessed_deps_file, dependencies)
+
+    yield Task(name=f"Preprocess {full_name}",
+               input_files=[os.path.abspath(os.path.join(workdir, cfile))],
+               output_files=[preprocessed_out],
+               action=preprocess_action,
+               deps_file=preprocessed_deps_file,
+               stage="preprocess")
+
+    return preprocessed_out
+
+# The hardware events counted by perf stat, and the names they are given in the PerfCounters statistic
+PERF_EVENTS = {
+    "cycles": "#Cycles",
+    "instructions": "#Instructions",
+    "branch-misses": "#BranchMisses",
+    "LLC-load-misses": "#LLCLoadMisses",
+    "dTLB-load-misses": "#dTLBLoadMisses",
+}
+
+def read_perf_stat_output(perf_output):
+    """
+    Reads the CSV output of perf stat -x,
+    Events that could not be counted, such as in containers or VMs without a PMU, are left out.
+    :return: a dict from the names in PERF_EVENTS to counts
+    """
+    counters = {}
+    with open(perf_output, 'r', encoding='utf-8') as fd:
+        for line in fd:
+            if line.startswith("#") or line.strip() == "":
+                continue
+            value, _, event, *_ = line.strip().split(",")
+            # Hybrid CPUs report events per core type, such as cpu_core/cycles/
+            event = event.strip("/").split("/")[-1].split(":")[0]
+            if event not in PERF_EVENTS:
+                continue
+            try:
+                value = int(float(value))
+            except ValueError:
+                continue # <not counted> or <not supported>
+            counters[PERF_EVENTS[event]] = counters.get(PERF_EVENTS[event], 0) + value
+    return counters
+
+def check_perf_counters_available():
+    """
+    Checks that perf stat can count at least one hardware event in this environment.
+    :return: True if perf counters can be used, otherwise a warning is printed and False is returned
+    """
+    with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
+        perf_output = os.path.join(tmpdir, "perf-stat.csv")
+        try:
+            subprocess.run([options.perf, "stat", "-x,", "-o", perf_output, "-e", ",".join(PERF_EVENTS), "--", "true"],
+                           capture_output=True, text=True, check=True)
+            counters = read_perf_stat_output(perf_output)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"WARNING: perf stat can not be used, performance counters are disabled: {e}")
+            return False
+
+    if len(counters) == 0:
+        print("WARNING: perf stat can not count any hardware events here, performance counters are disabled")
+        return False
+    missing = [name for name in PERF_EVENTS.values() if name not in counters]
+    if len(missing) != 0:
+        print(f"WARNING: perf stat can not count {', '.join(missing)}, they are left out")
+    return True
+
+def get_perf_stat_command(command, perf_output):
+    """
+    If performance counters are enabled, wraps the command in perf stat, which writes its counts to perf_output.
+    Otherwise the command is returned unchanged.
+    """
+    if not options.perf_counters:
+        return command
+    return [options.perf, "stat", "-x,", "-o", perf_output, "-e", ",".join(PERF_EVENTS), "--", *command]
+
+def append_perf_counters(perf_output, stats_output, filename):
+    """
+    If performance counters are enabled, adds a PerfCounters line with the counts in perf_output to stats_output.
+    """
+    if not options.perf_counters:
+        return
+    counters = read_perf_stat_output(perf_output)
+    with open(stats_output, 'a', encoding='utf-8') as fd:
+        print("PerfCounters", filename, *(f"{name}:{value}" for name, value in counters.items()), file=fd)
+
+def append_jlm_opt_task_statistics(stats_output, filename, wall_time, input_bytes):
+    """
+    Adds a JlmOptTask line to stats_output, with the wall time of the whole task in nanoseconds,
+    and the size of the LLVM IR it was given. Used to decide which runs to profile, see JlmOptTimeModel.
+    """
+    with open(stats_output, 'a', encoding='utf-8') as fd:
+        print("JlmOptTask", filename, f"WallTime[ns]:{wall_time}", f"#InputBytes:{input_bytes}", file=fd)
+
+def append_profiled_statistics(stats_output, filename, profiler):
+    """
+    Adds a Profiled line to stats_output, marking its timers as slowed down by the given profiler.
+    The aggregation scripts leave out the timers of profiled runs.
+    """
+    with open(stats_output, 'a', encoding='utf-8') as fd:
+        print("Profiled", filename, f"Profiler:{profiler}", file=fd)
+
+class JlmOptTimeModel:
+    """
+    Knows how long jlm-opt took on files in previous runs, and predicts how long it takes on any file.
+    Observed times are read from the JlmOptTask lines in the statistics folder once, before any task runs.
+    Predictions assume the median throughput, in bytes of LLVM IR per second, of all observed runs.
+    """
+    def __init__(self, stats_dir):
+        # Maps from the path of a statistics file to the wall time of its jlm-opt task, in nanoseconds
+        self.observed = {}
+        throughputs = []
+
+        if os.path.isdir(stats_dir):
+            for fil in os.listdir(stats_dir):
+                if not fil.endswith(".log"):
+                    continue
+                path = os.path.join(stats_dir, fil)
+                with open(path, 'r', encoding='utf-8') as fd:
+                    for line in fd:
+                        if not line.startswith("JlmOptTask "):
+                            continue
+                        values = {name: value for name, _, value in (part.partition(":") for part in line.split()[2:])}
+                        try:
+                            wall_time = int(values["WallTime[ns]"])
+                            input_bytes = int(values["#InputBytes"])
+                        except (KeyError, ValueError):
+                            continue # A line from an older version, or truncated by an interrupted run
+                        self.observed[path] = wall_time
+                        if wall_time > 0:
+                            throughputs.append(input_bytes / wall_time * 1e9)
+
+        self.throughput = statistics.median(throughputs) if len(throughputs) > 0 else None
+
+    def get_expected_time(self, stats_output, input_bytes):
+        """
+        :return: the largest of the observed and predicted time of the run, in nanoseconds, or None if neither is known
+        """
+        times = []
+        if stats_output in self.observed:
+            times.append(self.observed[stats_output])
+        if self.throughput is not None:
+            times.append(input_bytes / self.throughput * 1e9)
+        return max(times) if len(times) > 0 else None
+
+# The sampling frequency of perf record, in Hz, and the time between stack samples taken with eu-stack, in seconds
+PROFILE_FREQUENCY = 999
+STACK_SAMPLING_INTERVAL = 0.01
+
+PERF_SYMBOL_OFFSET = re.compile(r'\+0x[0-9a-f]+$')
+
+def check_profiler_available():
+    """
+    Finds a way of sampling the call stacks of jlm-opt. perf record is preferred.
+    If perf can not be used, the stacks of the running process are sampled periodically using eu-stack from elfutils.
+    :return: "perf" or "eu-stack", or None after printing a warning
+    """
+    with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
+        try:
+            subprocess.run([options.perf, "record", "-g", "-o", os.path.join(tmpdir, "perf.data"), "--", "true"],
+                           capture_output=True, check=True)
+            return "perf"
+        except (OSError, subprocess.CalledProcessError):
+            pass
+
+    if shutil.which("eu-stack") is not None:
+        print("WARNING: perf record can not be used, profiles are made by sampling stacks with eu-stack")
+        return "eu-stack"
+
+    print("WARNING: neither perf nor eu-stack can be used, no profiles will be made")
+    return None
+
+def get_profiler(stats_output, input_bytes):
+    """
+    Decides whether a jlm-opt run should be profiled, based on its previously observed or predicted time.
+    :return: the profiler to use, or None if the run should not be profiled
+    """
+    if options.profiler is None:
+        return None
+    expected_time = options.jlm_opt_time_model.get_expected_time(stats_output, input_bytes)
+    if expected_time is None or expected_time < options.profile_slower_than * 1e9:
+        return None
+    return options.profiler
+
+def add_folded_stack(folded, frames):
+    """Counts one sample of the given stack, where frames are ordered from the outermost function"""
+    stack = ";".join(frames)
+    folded[stack] = folded.get(stack, 0) + 1
+
+def fold_perf_script_output(text):
+    """
+    Collapses the samples printed by perf script into folded stacks.
+    Each sample is a header line, followed by one indented line per frame, from the innermost function.
+    Frames are printed as <address> <symbol>+<offset> (<dso>)
+    :return: a dict from folded stack to number of samples
+    """
+    folded = {}
+    comm = None
+    frames = []
+    for line in [*text.splitlines(), ""]:
+        if line.strip() == "":
+            if comm is not None:
+                add_folded_stack(folded, [comm, *reversed(frames)])
+            comm = None
+            frames = []
+        elif line[0].isspace():
+            parts = line.split(None, 1)
+            symbol = parts[1].rsplit(" (", 1)[0] if len(parts) > 1 else "[unknown]"
+            frames.append(PERF_SYMBOL_OFFSET.sub("", symbol))
+        elif comm is None:
+            comm = line.split()[0]
+    return folded
+
+class StackSampler:
+    """
+    Samples the call stacks of all threads of a running process with eu-stack, until the process exits.
+    Used as the monitor given to run_command, when perf is not available.
+    """
+    def __init__(self, comm):
+        self.comm = comm
+        # Maps from folded stack to number of samples
+        self.folded = {}
+        self.thread = None
+
+    def __call__(self, process):
+        self.thread = threading.Thread(target=self.sample, args=(process,), daemon=True)
+        self.thread.start()
+
+    def sample(self, process):
+        while process.poll() is None:
+            result = subprocess.run(["eu-stack", "-p", str(process.pid)], capture_output=True, text=True)
+            self.add_eu_stack_output(result.stdout)
+            time.sleep(STACK_SAMPLING_INTERVAL)
+
+    def add_eu_stack_output(self, text):
+        """
+        eu-stack prints a TID line for each thread, followed by one line per frame, from the innermost function.
+        Frames are printed as #<depth> <address> <function>
+        """
+        frames = None
+        for line in [*text.splitlines(), "TID"]:
+            if line.startswith("TID"):
+                if frames:
+                    add_folded_stack(self.folded, [self.comm, *reversed(frames)])
+                frames = []
+            elif line.startswith("#") and frames is not None:
+                parts = line.split(None, 2)
+                frames.append(parts[2].strip() if len(parts) == 3 else "[unknown]")
+
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
+
+class MemorySampler:
+    """
+    Samples the RSS and PSS of a running process and all its descendants, until the process exits.
+    perf processes are not counted, since they may be wrapping the process being measured.
+    Used as the monitor given to run_command, when --rssSampleInterval is set.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        # Tuples of (time since start in ms, RSS in kB, PSS in kB or None if it can not be read)
+        self.samples = []
+        self.thread = None
+
+    def __call__(self, process):
+        self.thread = threading.Thread(target=self.sample, args=(process,), daemon=True)
+        self.thread.start()
+
+    def sample(self, process):
+        start_time = time.perf_counter()
+        try:
+            root = psutil.Process(process.pid)
+        except psutil.NoSuchProcess:
+            return
+
+        while process.poll() is None:
+            rss = 0
+            pss = 0
+            try:
+                processes = [root, *root.children(recursive=True)]
+            except psutil.NoSuchProcess:
+                break
+            for proc in processes:
+                try:
+                    if proc.name() == "perf":
+                        continue
+                    try:
+                        # PSS divides shared pages between the processes sharing them
+                        memory_info = proc.memory_full_info()
+                        pss = pss + memory_info.pss if pss is not None else None
+                    except psutil.AccessDenied:
+                        memory_info = proc.memory_info()
+                        pss = None
+                    rss += memory_info.rss
+                except psutil.NoSuchProcess:
+                    pass
+
+            elapsed = int((time.perf_counter() - start_time) * 1000)
+            self.samples.append((elapsed, rss // 1024, pss // 1024 if pss is not None else None))
+            time.sleep(self.interval)
+
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
+
+    def write_timeline(self, timeline_output):
+        """Writes the samples as a CSV file with the columns Time[ms], Rss[kB] and Pss[kB]"""
+        with open(timeline_output, 'w', encoding='utf-8') as fd:
+            print("Time[ms],Rss[kB],Pss[kB]", file=fd)
+            for elapsed, rss, pss in self.samples:
+                print(f"{elapsed},{rss},{pss if pss is not None else ''}", file=fd)
+
+    def append_statistics(self, stats_output, filename):
+        """Adds a MemoryTimeline line to stats_output, with the number of samples and the peak memory use"""
+        parts = [f"#Samples:{len(self.samples)}"]
+        if len(self.samples) > 0:
+            peak_time, peak_rss, _ = max(self.samples, key=lambda sample: sample[1])
+            parts.extend([f"PeakRss[kB]:{peak_rss}", f"PeakRssTime[ms]:{peak_time}"])
+            if all(pss is not None for _, _, pss in self.samples):
+                parts.append(f"PeakPss[kB]:{max(pss for _, _, pss in self.samples)}")
+        with open(stats_output, 'a', encoding='utf-8') as fd:
+            print("MemoryTimeline", filename, *parts, file=fd)
+
+def write_folded_stacks(folded, profile_output):
+    """Writes stacks in the folded format used by flamegraph.pl: <frame>;<frame>;... <samples>"""
+    with open(profile_output, 'w', encoding='utf-8') as fd:
+        for stack, samples in sorted(folded.items()):
+            print(stack, samples, file=fd)
+
+def run_jlm_opt(task, input_file, output_file, stats_output, other_outputs, jlm_opt_flags, env_vars, jlm_opt=None):
+    """
+    Runs jlm-opt on the given file, placing its statistics in stats_output.
+    The jlm-opt binary from the options is used, unless another binary is given.
+    Other files produced by jlm-opt are given names starting with other_outputs.
+    If the run is expected to be slow, a profile is placed in <other_outputs>-profile.folded
+    If memory sampling is enabled, the memory use over time is placed in <other_outputs>-memory-timeline.csv
+    """
+    input_bytes = os.path.getsize(input_file)
+    profiler = get_profiler(stats_output, input_bytes)
+
+    with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir, \
+            tempfile.TemporaryDirectory(suffix="jlm-bench-perf") as perf_dir:
+        perf_output = os.path.join(perf_dir, "perf-stat.csv")
+        perf_data = os.path.join(perf_dir, "perf.data")
+        if jlm_opt is None:
+            jlm_opt = options.jlm_opt
+        jlm_opt_command = [jlm_opt, input_file, "-o", output_file, "-s", tmpdir, *jlm_opt_flags]
+        jlm_opt_command = get_memory_limited_command(jlm_opt_command, options.memory_limit)
+        command = get_perf_stat_command(jlm_opt_command, perf_output)
+
+        monitors = []
+        if profiler == "perf":
+            command = [options.perf, "record", "-g", "-F", str(PROFILE_FREQUENCY), "-o", perf_data, "--", *command]
+        elif profiler == "eu-stack":
+            stack_sampler = StackSampler(os.path.basename(jlm_opt))
+            monitors.append(stack_sampler)
+        if options.rss_sample_interval is not None:
+            memory_sampler = MemorySampler(options.rss_sample_interval)
+            monitors.append(memory_sampler)
+
+        def monitor(process):
+            for process_monitor in monitors:
+                process_monitor(process)
+
+        start_time = time.perf_counter_ns()
+        run_command(command, env_vars=env_vars,
+                    verbose=options.jlm_opt_verbosity, print_prefix=f"({task.index})",
+                    timeout=options.timeout, monitor=monitor)
+        wall_time = time.perf_counter_ns() - start_time
+
+        move_output_files(tmpdir, stats_output, other_outputs)
+        clean_temp_dir(tmpdir)
+        append_perf_counters(perf_output, stats_output, input_file)
+        append_jlm_opt_task_statistics(stats_output, input_file, wall_time, input_bytes)
+        if profiler is not None:
+            append_profiled_statistics(stats_output, input_file, profiler)
+
+        if options.rss_sample_interval is not None:
+            memory_sampler.join()
+            memory_sampler.write_timeline(f"{other_outputs}-memory-timeline.csv")
+            memory_sampler.append_statistics(stats_output, input_file)
+
+        if profiler == "perf":
+            perf_script, _ = run_command_and_capture([options.perf, "script", "-i", perf_data], env_vars=env_vars)
+            write_folded_stacks(fold_perf_script_output(perf_script), f"{other_outputs}-profile.folded")
+        elif profiler == "eu-stack":
+            stack_sampler.join()
+            write_folded_stacks(stack_sampler.folded, f"{other_outputs}-profile.folded")
+
+# Counts that are not summed when combining the statistics of chunks, as they are not totals
+NON_ADDITIVE_COUNT_PREFIXES = ["#Max", "#Min", "#Avg", "#Average", "#Median"]
+
+def get_split_statistic_combiner(name):
+    """
+    :return: how values with the given name are combined across chunks: "sum", "max", or None if they must be equal
+    """
+    if name.startswith("#Max"):
+        return "max"
+    if name.endswith("[ns]"):
+        return "sum"
+    if name.startswith("#") and not any(name.startswith(prefix) for prefix in NON_ADDITIVE_COUNT_PREFIXES):
+        return "sum"
+    return None
+
+def combine_split_statistics(chunk_stats_files, stats_output, filename):
+    """
+    Combines the statistics files from running jlm-opt on each chunk of a split module.
+    Lines are matched by statistic and by how many times the statistic has occurred before in the file.
+    Timers ([ns]) and counts (#) are summed, except #Max values, where the maximum is used, and other non-totals.
+    Any other value is only kept if it is the same in every chunk. Lines without values are skipped.
+    A SplitModule line with the number of chunks is added, to mark the statistics as coming from a split module.
+    :param filename: the file to name in the combined statistics
+    """
+    combined = {}
+    differing = set()
+    for chunk_stats_file in chunk_stats_files:
+        occurrences = {}
+        with open(chunk_stats_file, 'r', encoding='utf-8') as fd:
+            for line in fd:
+                fields = line.split()
+                if len(fields) < 2:
+                    # Blank or truncated lines have no statistic to combine
+                    continue
+                statistic, _, *parts = fields
+                key = (statistic, occurrences.get(statistic, 0))
+                occurrences[statistic] = key[1] + 1
+
+                values = combined.setdefault(key, {})
+                for part in parts:
+                    name, _, value = part.partition(":")
+                    try:
+                        value = int(value)
+                    except ValueError:
+                        pass
+
+                    combiner = None
+                    if isinstance(value, int) and isinstance(values.get(name), int):
+                        combiner = get_split_statistic_combiner(name)
+
+                    if name not in values:
+                        values[name] = value
+                    elif combiner == "max":
+                        values[name] = max(values[name], value)
+                    elif combiner == "sum":
+                        values[name] += value
+                    elif values[name] != value:
+                        differing.add((key, name))
+
+    for key, name in differing:
+        del combined[key][name]
+
+    with open(stats_output, 'w', encoding='utf-8') as fd:
+        for (statistic, _), values in combined.items():
+            print(statistic, filename, *(f"{name}:{value}" for name, value in values.items()), file=fd)
+        print("SplitModule", filename, f"#SplitChunks:{len(chunk_stats_files)}", file=fd)
+
+# The most jlm-opt processes run in parallel on the chunks of one split file.
+# The memory limit applies to each process, so the bound keeps the total from growing with the size of the file.
+MAX_PARALLEL_CHUNKS = 4
+
+def run_jlm_opt_split(task, input_file, output_file, stats_output, other_outputs, jlm_opt_flags, env_vars, num_chunks):
+    """
+    Splits the given LLVM IR file into chunks of functions using llvm-split, runs jlm-opt on the chunks,
+    at most MAX_PARALLEL_CHUNKS at a time, and links the results into output_file. Declarations are kept in every chunk, and local symbols are kept
+    in the same chunk as their users. The statistics of all chunks are combined into stats_output.
+    Other files produced by jlm-opt with identical names are concatenated.
+    Split runs are never profiled or sampled, as the chunks running in parallel would not be comparable.
+    """
+    start_time = time.perf_counter_ns()
+    with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
+        chunk_prefix = os.path.join(tmpdir, "chunk")
+        split_command = [options.llvm_split, f"-j={num_chunks}", "--preserve-locals", "-o", chunk_prefix, input_file]
+        run_command(split_command, env_vars=env_vars, timeout=options.timeout)
+
+        def run_chunk(i):
+            chunk_dir = os.path.join(tmpdir, f"out{i}")
+            os.mkdir(chunk_dir)
+            with tempfile.TemporaryDirectory(suffix="jlm-bench") as chunk_tmpdir:
+                chunk_out = os.path.join(chunk_dir, "jlm-opt-out.ll")
+                perf_output = os.path.join(chunk_dir, "perf-stat.csv")
+                jlm_opt_command = [options.jlm_opt, f"{chunk_prefix}{i}", "-o", chunk_out, "-s", chunk_tmpdir, *jlm_opt_flags]
+                jlm_opt_command = get_memory_limited_command(jlm_opt_command, options.memory_limit)
+                run_command(get_perf_stat_command(jlm_opt_command, perf_output), env_vars=env_vars,
+                            verbose=options.jlm_opt_verbosity, print_prefix=f"({task.index}.{i})",
+                            timeout=options.timeout)
+                move_output_files(chunk_tmpdir, os.path.join(chunk_dir, "statistics.log"), os.path.join(chunk_dir, "other"))
+                # The counters of all chunks are summed when their statistics are combined
+                append_perf_counters(perf_output, os.path.join(chunk_dir, "statistics.log"), input_file)
+            return chunk_dir
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(num_chunks, MAX_PARALLEL_CHUNKS)) as executor:
+            chunk_dirs = list(executor.map(run_chunk, range(num_chunks)))
+
+        link_command = [options.llvm_link, "-S", *(os.path.join(chunk_dir, "jlm-opt-out.ll") for chunk_dir in chunk_dirs),
+                        "-o", output_file]
+        run_command(link_command, env_vars=env_vars, timeout=options.timeout)
+
+        combine_split_statistics([os.path.join(chunk_dir, "statistics.log") for chunk_dir in chunk_dirs],
+                                 stats_output, input_file)
+        append_jlm_opt_task_statistics(stats_output, input_file, time.perf_counter_ns() - start_time,
+                                       os.path.getsize(input_file))
+
+        suffixes = sorted({fil[len("other"):] for chunk_dir in chunk_dirs
+                           for fil in os.listdir(chunk_dir) if fil.startswith("other")})
+        for suffix in suffixes:
+            with open(other_outputs + suffix, 'wb') as dst:
+                for chunk_dir in chunk_dirs:
+                    chunk_file = os.path.join(chunk_dir, "other" + suffix)
+                    if os.path.exists(chunk_file):
+                        with open(chunk_file, 'rb') as src:
+                            shutil.copyfileobj(src, dst)
+
+LLVM_FUNCTION_DEFINITION = re.compile(r'^define [^@]*@("(?:[^"\\]|\\.)*"|[-a-zA-Z$._0-9]+)\(')
+LLVM_GLOBAL_REFERENCE = re.compile(r'@("(?:[^"\\]|\\.)*"|[-a-zA-Z$._0-9]+)')
+
+def unquote_llvm_name(name):
+    """Removes the quotes around LLVM names that contain special characters"""
+    return name[1:-1] if name.startswith('"') else name
+
+def read_llvm_call_graph(ll_file):
+    """
+    Reads the functions defined in the given textual LLVM IR file, in order of definition,
+    and which defined functions each of them references. Any reference counts, not only direct calls,
+    which makes the graph conservative when functions are called through pointers.
+    :return: a dict from function name to the set of defined functions it references
+    """
+    references = {}
+    current = None
+    with open(ll_file, 'r', encoding='utf-8', errors='replace') as fd:
+        for line in fd:
+            if current is None:
+                match = LLVM_FUNCTION_DEFINITION.match(line)
+                if match is not None:
+                    current = match.group(1)
+                    references[current] = set()
+                    line = line[match.end():]
+            if current is not None:
+                references[current].update(LLVM_GLOBAL_REFERENCE.findall(line))
+                if line.startswith("}"):
+                    current = None
+
+    for function, referenced in references.items():
+        referenced.intersection_update(references.keys())
+        referenced.discard(function)
+    return references
+
+def get_function_subset(call_graph, function_order, fraction):
+    """
+    Takes the first fraction of the functions in the given order, and adds every function they reference, recursively.
+    For a fixed order, the subsets are nested: a larger fraction always gives a superset.
+    """
+    subset = set()
+    worklist = list(function_order[:math.ceil(len(function_order) * fraction)])
+    while len(worklist) > 0:
+        function = worklist.pop()
+        if function in subset:
+            continue
+        subset.add(function)
+        worklist.extend(call_graph[function])
+    return subset
+
+def add_scaling_series_tasks(full_name, input_file, stats_dir, env_vars, jlm_opt_flags, steps):
+    """
+    Yields tasks that run jlm-opt on growing subsets of the functions in the given LLVM IR file.
+    Subsets are taken in steps of 1/steps of the functions, and are closed under callees.
+    The statistics of each subset are placed in stats_dir/<full_name>-scaling/<percent>.log,
+    with an extra ScalingSubset line describing the subset.
+    """
+    scaling_dir = os.path.join(stats_dir, f"{full_name}-scaling")
+
+    for step in range(1, steps + 1):
+        percent = step * 100 // steps
+        jlm_opt_out = options.get_build_dir(f"{full_name}-scaling-{percent}-jlm-opt-out.ll")
+        stats_output = os.path.join(scaling_dir, f"{percent}.log")
+        other_outputs = os.path.join(scaling_dir, str(percent))
+
+        def scaling_action(task, percent=percent, jlm_opt_out=jlm_opt_out, stats_output=stats_output,
+                           other_outputs=other_outputs):
+            call_graph = read_llvm_call_graph(input_file)
+            # The order is shuffled with a fixed seed, to avoid always growing from the start of the file
+            function_order = sorted(call_graph.keys())
+            random.Random(full_name).shuffle(function_order)
+            subset = get_function_subset(call_graph, function_order, percent / 100)
+
+            ensure_folder_exists(scaling_dir)
+            with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
+                subset_file = os.path.join(tmpdir, "subset.ll")
+                extract_command = [options.llvm_extract, "-S", input_file, "-o", subset_file,
+                                   *(f"--func={unquote_llvm_name(function)}" for function in sorted(subset))]
+                run_command(extract_command, env_vars=env_vars, timeout=options.timeout)
+                run_jlm_opt(task, subset_file, jlm_opt_out, stats_output, other_outputs, jlm_opt_flags, env_vars)
+
+            with open(stats_output, 'a', encoding='utf-8') as fd:
+                print("ScalingSubset", input_file, f"Percent:{percent}", f"#Functions:{len(subset)}",
+                      f"#TotalFunctions:{len(call_graph)}", file=fd)
+
+        yield Task(name=f"jlm-opt {full_name} ({percent}% of functions)",
+                   input_files=[input_file],
+                   output_files=[jlm_opt_out, stats_output],
+                   action=scaling_action,
+                   stage="jlm-opt (scaling)")
+
+def add_ab_tasks(full_name, input_file, jlm_opt_out, stats_dir, env_vars, jlm_opt_flags, runs):
+    """
+    Yields a task that runs two jlm-opt binaries, A and B, on the same LLVM IR file, runs times each.
+    The runs of A and B are interleaved, and the one going first alternates,
+    so changes in machine load during the task affect both binaries alike.
+    The statistics of each run are placed in stats_dir/<full_name>-ab/<binary>-<run>.log,
+    with an extra ABRun line. The output of the first run of A is kept as jlm_opt_out.
+    Compare the binaries with analysis/compare-ab.py
+    """
+    ab_dir = os.path.join(stats_dir, f"{full_name}-ab")
+    binaries = {"A": options.jlm_opt, "B": options.jlm_opt_b}
+    stats_outputs = [os.path.join(ab_dir, f"{binary}-{run}.log") for run in range(runs) for binary in binaries]
+
+    def ab_action(task):
+        ensure_folder_exists(ab_dir)
+        with tempfile.TemporaryDirectory(suffix="jlm-bench-ab") as tmpdir:
+            for run in range(runs):
+                order = ["A", "B"] if run % 2 == 0 else ["B", "A"]
+                for position, binary in enumerate(order):
+                    stats_output = os.path.join(ab_dir, f"{binary}-{run}.log")
+                    other_outputs = os.path.join(ab_dir, f"{binary}-{run}")
+                    output_file = jlm_opt_out if binary == "A" and run == 0 else os.path.join(tmpdir, "jlm-opt-out.ll")
+                    run_jlm_opt(task, input_file, output_file, stats_output, other_outputs, jlm_opt_flags, env_vars,
+                                jlm_opt=binaries[binary])
+
+                    with open(stats_output, 'a', encoding='utf-8') as fd:
+                        print("ABRun", input_file, f"Binary:{binary}", f"Run:{run}", f"Position:{position}", file=fd)
+
+    yield Task(name=f"jlm-opt A/B {full_name} ({runs} runs)",
+               input_files=[input_file],
+               output_files=[jlm_opt_out, *stats_outputs],
+               action=ab_action,
+               stage="jlm-opt (A/B)")
+
+# A pipeline of LLVM passes roughly matching what the jlm-opt pipeline does. LICM requires MemorySSA in opt
+LLVM_BASELINE_PASSES = "function(mem2reg,gvn,dse,loop-mssa(licm),simple-loop-unswitch,adce)"
+
+TIME_PASSES_COLUMN = re.compile(r'([0-9.]+) \(\s*[0-9.]+%\)')
+# With -time-passes-per-run, each run of a pass is suffixed by its run number
+PASS_RUN_SUFFIX = re.compile(r' #[0-9]+$')
+# The titles of the reports printed by opt -time-passes that are read
+TIME_PASSES_REPORTS = ["Pass execution timing report", "LLVM IR Parsing"]
+
+def iter_time_passes_reports(lines):
+    """
+    Parses the reports printed by opt -time-passes, with or without -time-passes-per-run.
+    Also used by analysis/aggregate-frontend.py, to read the reports kept by --frontendTrace.
+    :param lines: the lines of the output
+    :return: an iterator of (report title, name, wall time in nanoseconds) for every timed line.
+             Run numbers are removed from the names, and each report ends with a line named Total
+    """
+    report = None
+    for line in lines:
+        columns = list(TIME_PASSES_COLUMN.finditer(line))
+        if len(columns) == 0:
+            report = next((title for title in TIME_PASSES_REPORTS if title in line), report)
+            continue
+        if report is None:
+            continue
+
+        # The last column is the wall time, followed by the name
+        name = PASS_RUN_SUFFIX.sub("", line[columns[-1].end():].strip())
+        yield report, name, int(float(columns[-1].group(1)) * 1e9)
+        if name == "Total":
+            report = None
+
+def parse_time_passes_report(text):
     """
-    Compiles the given file with the given arguments to clang.
-    :param tasks: the list of tasks to append commands to
+    Parses the pass execution timing report printed by opt -time-passes.
+    :return: a dict from pass name to wall time in nanoseconds, including the Total
+    """
+    timers = {}
+    for report, name, wall_time in iter_time_passes_reports(text.splitlines()):
+        if report == "Pass execution timing report":
+            timers[name] = timers.get(name, 0) + wall_time
+    return timers
+
+def parse_stats_json(text):
+    """
+    Finds and parses the JSON object printed by opt -stats-json.
+    It is only printed by builds of LLVM with statistics enabled, and then also includes more precise timers.
+    :return: a dict from statistic name to value
+    """
+    start = text.find("{")
+    if start == -1:
+        return {}
+    stats, _ = json.JSONDecoder().raw_decode(text[start:])
+    return stats
+
+# Characters allowed in the names of statistics, as names end at the first ':' or whitespace
+LLVM_NAME_DISALLOWED = re.compile(r'[^A-Za-z0-9_.-]')
+
+def get_statistic_name(llvm_name):
+    """Replaces every character of an LLVM pass or statistic name that is not allowed in statistics with '_'"""
+    return LLVM_NAME_DISALLOWED.sub("_", llvm_name)
+
+def write_llvm_baseline_statistics(info_file, stats_output, input_file):
+    """
+    Converts the output of opt -time-passes -stats -stats-json into a statistics file.
+    Everything is placed on a single LLVMOptBaseline line, with one <Pass>Timer[ns] per pass,
+    the total pass time as Time[ns], and a #<statistic> for every LLVM statistic.
+    """
+    with open(info_file, 'r', encoding='utf-8') as fd:
+        text = fd.read()
+
+    timers = parse_time_passes_report(text)
+    stats = {}
+    for name, value in parse_stats_json(text).items():
+        if name.startswith("time.pass.") and name.endswith(".wall"):
+            timers[name[len("time.pass."):-len(".wall")]] = int(value * 1e9)
+        elif not name.startswith("time."):
+            stats[name] = value
+
+    parts = [f"{get_statistic_name(name)}Timer[ns]:{value}" for name, value in timers.items() if name != "Total"]
+    parts.append(f"Time[ns]:{timers.get('Total', 0)}")
+    parts.extend(f"#{get_statistic_name(name)}:{value}" for name, value in stats.items())
+    with open(stats_output, 'w', encoding='utf-8') as fd:
+        print("LLVMOptBaseline", input_file, *parts, file=fd)
+
+def get_frontend_trace_files(full_name, stats_dir):
+    """
+    Gets the paths of the clang time trace and opt pass timing report made for the given C file.
+    They are placed next to the statistics files, but do not end in .log, to keep them apart from jlm-opt statistics.
+    :return: a tuple with paths to (clang's JSON time trace, opt's -time-passes report)
+    """
+    return (os.path.join(stats_dir, f"{full_name}-clang-time-trace.json"),
+            os.path.join(stats_dir, f"{full_name}-opt-time-passes.txt"))
+
+def compile_file(full_name, workdir, cfile, extra_clang_flags, stats_dir,
+                 env_vars=None, opt_flags=None, jlm_opt_flags=None, jlm_opt_suffix=None, preprocessed_cache=None,
+                 llvm_baseline_passes=None):
+    """
+    Yields tasks that compile the given file with the given arguments to clang.
     :param full_name: should be a valid filename, unique to the program and source file
     :param workdir: the dir from which clang is invoked
     :param cfile: the name of the c file, relative to workdir
     :param extra_clang_flags: the flags to pass to clang when making the .ll file
     :param stats_dir: the directory to place statistics files in
-    :param env_vars: environment variables passed to the executed commands
+    :param env_vars: the complete environment of the executed commands, shared between tasks
     :param opt_flags: if not None, opt is run with the given flags
     :param jlm_opt_flags: if not None, jlm-opt is run with the given flags
     :param jlm_opt_suffix: an extra suffix added to output filenames
+    :param preprocessed_cache: if not None, the PreprocessedSourceCache to preprocess the file into,
+                               before generating LLVM IR from the cached preprocessed file
+    :param llvm_baseline_passes: if not None, opt is run with the given passes on the input jlm-opt would get,
+                                 and its pass timers are placed in the statistics file instead
     :return: a tuple with paths to (clang's output, opt's output, jlm-opt's output)
     """
     assert "/" not in full_name
+    # Both jlm-opt and the LLVM baseline write to the same statistics file
+    assert jlm_opt_flags is None or llvm_baseline_passes is None
 
     if jlm_opt_suffix is None:
         jlm_opt_suffix = ""
@@ -347,64 +1507,169 @@ def compile_file(tasks, full_name, workdir, cfile, extra_clang_flags, stats_dir,
     stats_output = os.path.join(stats_dir, f"{full_name}{jlm_opt_suffix}.log")
     other_outputs = os.path.join(stats_dir, f"{full_name}{jlm_opt_suffix}")
 
-    combined_env_vars = os.environ.copy()
-    if env_vars is not None:
-        combined_env_vars.update(env_vars)
+    clang_trace_flags = []
+    clang_trace_outputs = []
+    opt_trace_flags = []
+    opt_trace_outputs = []
+    if options.frontend_trace:
+        clang_trace_out, opt_trace_out = get_frontend_trace_files(full_name, stats_dir)
+        clang_trace_flags = [f"-ftime-trace={clang_trace_out}"]
+        clang_trace_outputs = [clang_trace_out]
+        opt_trace_flags = ["-time-passes", "-time-passes-per-run", f"-info-output-file={opt_trace_out}"]
+        opt_trace_outputs = [opt_trace_out]
+
+    if preprocessed_cache is not None:
+        preprocessing_flags, ir_generation_flags = get_preprocessing_flags(extra_clang_flags)
+        preprocessed_out = yield from add_preprocess_task(full_name, workdir, cfile, preprocessing_flags,
+                                                          env_vars, preprocessed_cache)
+
+        def clang_action(task):
+            with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
+                # Give the decompressed file the name of the C file, to keep the module's source_filename
+                preprocessed_tmp = os.path.join(tmpdir, os.path.basename(cfile)[:-2] + ".i")
+                with gzip.open(preprocessed_out, 'rb') as in_fd, open(preprocessed_tmp, 'wb') as out_fd:
+                    shutil.copyfileobj(in_fd, out_fd)
+
+                clang_command = [options.clang,
+                                 "-c", preprocessed_tmp,
+                                 "-S", "-emit-llvm",
+                                 "-o", clang_out,
+                                 *ir_generation_flags,
+                                 *clang_trace_flags]
+                run_command(clang_command, cwd=workdir, env_vars=env_vars, timeout=options.timeout)
+
+        yield Task(name=f"Compile {full_name} to LLVM IR from preprocessed source",
+                   input_files=[preprocessed_out],
+                   output_files=[clang_out, *clang_trace_outputs],
+                   action=clang_action,
+                   stage="clang (from preprocessed)")
+    else:
+        # Every file included by the C file is recorded, to let header changes invalidate the output
+        clang_deps_file = options.get_build_dir(f"{full_name}-clang-out.deps")
 
-    clang_command = [options.clang,
-                     "-c", cfile,
-                     "-S", "-emit-llvm",
-                     "-o", clang_out,
-                     *extra_clang_flags]
-    tasks.append(Task(name=f"Compile {full_name} to LLVM IR",
-                      input_files=[cfile],
-                      output_files=[clang_out],
-                      action=lambda task: run_command(clang_command, cwd=workdir, env_vars=combined_env_vars, timeout=options.timeout)))
+        def clang_action(task):
+            with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
+                make_deps_file = os.path.join(tmpdir, "clang-out.d")
+                clang_command = [options.clang,
+                                 "-c", cfile,
+                                 "-S", "-emit-llvm",
+                                 "-o", clang_out,
+                                 "-MD", "-MF", make_deps_file,
+                                 *extra_clang_flags,
+                                 *clang_trace_flags]
+                run_command(clang_command, cwd=workdir, env_vars=env_vars, timeout=options.timeout)
+                write_deps_file(clang_deps_file, read_make_deps_file(make_deps_file, workdir))
+
+        yield Task(name=f"Compile {full_name} to LLVM IR",
+                   input_files=[os.path.abspath(os.path.join(workdir, cfile))],
+                   output_files=[clang_out, *clang_trace_outputs],
+                   action=clang_action,
+                   deps_file=clang_deps_file,
+                   stage="clang")
 
     if opt_flags is not None:
         # use --debug-pass-manager to print more pass info
-        opt_command = [options.opt, clang_out, "-S", "-o", opt_out, *opt_flags]
-        tasks.append(Task(name=f"opt {full_name}",
-                          input_files=[clang_out],
-                          output_files=[opt_out],
-                          action=lambda task: run_command(opt_command, env_vars=combined_env_vars, timeout=options.timeout)))
+        opt_command = [options.opt, clang_out, "-S", "-o", opt_out, *opt_flags, *opt_trace_flags]
+        yield Task(name=f"opt {full_name}",
+                   input_files=[clang_out],
+                   output_files=[opt_out, *opt_trace_outputs],
+                   action=lambda task: run_command(opt_command, env_vars=env_vars, timeout=options.timeout),
+                   stage="opt")
     else:
         opt_out = clang_out
 
-    if jlm_opt_flags is not None:
+    if jlm_opt_flags is not None and options.jlm_opt_b is not None:
+        yield from add_ab_tasks(f"{full_name}{jlm_opt_suffix}", opt_out, jlm_opt_out, stats_dir, env_vars, jlm_opt_flags,
+                                options.ab_runs)
+    elif jlm_opt_flags is not None:
         def jlm_opt_action(task):
-            with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
-                jlm_opt_command = [options.jlm_opt, opt_out, "-o", jlm_opt_out, "-s", tmpdir, *jlm_opt_flags]
-                run_command(jlm_opt_command, env_vars=combined_env_vars, verbose=options.jlm_opt_verbosity,
-                            print_prefix=f"({task.index})", timeout=options.timeout)
-                move_output_files(tmpdir, stats_output, other_outputs)
-                clean_temp_dir(tmpdir)
-
-        tasks.append(Task(name=f"jlm-opt {full_name}{jlm_opt_suffix}",
-                          input_files=[opt_out],
-                          output_files=[jlm_opt_out, stats_output],
-                          action=jlm_opt_action))
+            input_size = os.path.getsize(opt_out)
+            if options.split_larger_than is not None and input_size > options.split_larger_than:
+                num_chunks = math.ceil(input_size / options.split_larger_than)
+                run_jlm_opt_split(task, opt_out, jlm_opt_out, stats_output, other_outputs, jlm_opt_flags,
+                                  env_vars, num_chunks)
+            else:
+                run_jlm_opt(task, opt_out, jlm_opt_out, stats_output, other_outputs, jlm_opt_flags, env_vars)
+
+        yield Task(name=f"jlm-opt {full_name}{jlm_opt_suffix}",
+                   input_files=[opt_out],
+                   output_files=[jlm_opt_out, stats_output],
+                   action=jlm_opt_action,
+                   stage="jlm-opt")
     else:
         jlm_opt_out = opt_out
 
+    if llvm_baseline_passes is not None:
+        baseline_out = options.get_build_dir(f"{full_name}{jlm_opt_suffix}-llvm-baseline-out.ll")
+
+        def baseline_action(task):
+            with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
+                info_file = os.path.join(tmpdir, "info-output.txt")
+                baseline_command = [options.opt, opt_out, "-S", "-o", baseline_out, f"-passes={llvm_baseline_passes}",
+                                    "-time-passes", "-stats", "-stats-json", f"-info-output-file={info_file}"]
+                run_command(baseline_command, env_vars=env_vars, timeout=options.timeout)
+                write_llvm_baseline_statistics(info_file, stats_output, opt_out)
+
+        yield Task(name=f"opt baseline {full_name}{jlm_opt_suffix}",
+                   input_files=[opt_out],
+                   output_files=[baseline_out, stats_output],
+                   action=baseline_action,
+                   stage="opt (baseline)")
+
     return (clang_out, opt_out, jlm_opt_out)
 
-def link_and_optimize(tasks, full_name, compiled_cfiles, compiled_non_cfiles, stats_dir,
+def add_llvm_link_tasks(full_name, input_files, output_file, env_vars, llvm_link_flags):
+    """
+    Yields tasks that merge the given LLVM IR files into output_file.
+    Instead of one invocation with every file, files are merged in a tree of llvm-link tasks,
+    where each task merges at most options.link_fan_in files. Tasks on the same level are independent.
+    Intermediate merges are written as bitcode, to avoid printing and parsing textual IR.
+    """
+    fan_in = max(options.link_fan_in, 2)
+    level = 0
+    while len(input_files) > fan_in:
+        merged_files = []
+        for i in range(0, len(input_files), fan_in):
+            chunk = input_files[i:i+fan_in]
+            if len(chunk) == 1:
+                # A leftover file is merged on the next level instead
+                merged_files.append(chunk[0])
+                continue
+            merged_out = options.get_build_dir(f"{full_name}-llvm-link-{level}-{i // fan_in}.bc")
+            llvm_link_command = [options.llvm_link, *chunk, "-o", merged_out, *llvm_link_flags]
+            yield Task(name=f"llvm-link {full_name} (level {level}, part {i // fan_in})",
+                       input_files=chunk,
+                       output_files=[merged_out],
+                       action=lambda task, command=llvm_link_command: run_command(command, env_vars=env_vars,
+                                                                                 timeout=options.timeout),
+                       stage="llvm-link")
+            merged_files.append(merged_out)
+        input_files = merged_files
+        level += 1
+
+    llvm_link_command = [options.llvm_link, "-S", *input_files, "-o", output_file, *llvm_link_flags]
+    yield Task(name=f"llvm-link {full_name}",
+               input_files=input_files,
+               output_files=[output_file],
+               action=lambda task: run_command(llvm_link_command, env_vars=env_vars, timeout=options.timeout),
+               stage="llvm-link")
+
+def link_and_optimize(full_name, compiled_cfiles, compiled_non_cfiles, stats_dir,
                       env_vars=None, llvm_link_flags=None, opt_flags=None, jlm_opt_flags=None, clang_link_flags=None):
     """
-    Links together the given files. The files can be LLVM IR files or object files.
+    Yields tasks that link together the given files. The files can be LLVM IR files or object files.
     opt and jlm-opt can only be used if llvm-link is enabled.
     If llvm-link is not enabled, the final clang command will be given all the input files.
 
-    :param tasks: the list of tasks to append commands to
     :param full_name: should be a valid filename, unique to the program
     :param compiled_cfiles: a list of LLVM IR/bitcode files, relative to CWD
     :param compiled_non_cfiles: a list of object files, relative to CWD
     :param stats_dir: the directory to place statistics files in
-    :param env_vars: environment variables passed to the executed commands
+    :param env_vars: the complete environment of the executed commands, shared between tasks
     :param llvm_link_flags: if not None, llvm-link is run with the given flags
     :param opt_flags: if not None, opt is run with the given flags
-    :param jlm_opt_flags: if not None, jlm-opt is run with the given flags
+    :param jlm_opt_flags: if not None, jlm-opt is run with the given flags.
+                          Its statistics are placed in stats_dir, named after full_name
     :param clang_link_flags: if not None, clang is used to create a binary
     :return: a tuple with paths to (llvm-link's output, opt's output, jlm-opt's output, clang's final output)
     """
@@ -414,43 +1679,32 @@ def link_and_optimize(tasks, full_name, compiled_cfiles, compiled_non_cfiles, st
     opt_out = options.get_build_dir(f"{full_name}-opt-out.ll")
     jlm_opt_out = options.get_build_dir(f"{full_name}-jlm-opt-out.ll")
     clang_link_out = options.get_build_dir(f"{full_name}-clang-link-out")
-
-    combined_env_vars = os.environ.copy()
-    if env_vars is not None:
-        combined_env_vars.update(env_vars)
+    stats_output = os.path.join(stats_dir, f"{full_name}.log")
+    other_outputs = os.path.join(stats_dir, full_name)
 
     if llvm_link_flags is not None:
-        llvm_link_command = [options.llvm_link, "-S",
-                             *compiled_cfiles, "-o", llvm_link_out, *llvm_link_flags]
-        tasks.append(Task(name=f"llvm-link {full_name}",
-                          input_files=compiled_cfiles,
-                          output_files=[llvm_link_out],
-                          action=lambda task: run_command(llvm_link_command, env_vars=combined_env_vars, timeout=options.timeout)))
+        yield from add_llvm_link_tasks(full_name, compiled_cfiles, llvm_link_out, env_vars, llvm_link_flags)
 
         if opt_flags is not None:
             # use --debug-pass-manager to print more pass info
             opt_command = [options.opt, llvm_link_out, "-S", "-o", opt_out, *opt_flags]
-            tasks.append(Task(name=f"opt {full_name}",
-                              input_files=[llvm_link_out],
-                              output_files=[opt_out],
-                              action=lambda task: run_command(opt_command, env_vars=combined_env_vars, timeout=options.timeout)))
+            yield Task(name=f"opt {full_name}",
+                       input_files=[llvm_link_out],
+                       output_files=[opt_out],
+                       action=lambda task: run_command(opt_command, env_vars=env_vars, timeout=options.timeout),
+                       stage="opt (linked)")
         else:
             opt_out = llvm_link_out
 
         if jlm_opt_flags is not None:
-            assert llvm_link_flags is not None
-
             def jlm_opt_action(task):
-                with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
-                    jlm_opt_command = [options.jlm_opt, opt_out, "-o", jlm_opt_out, "-s", tmpdir, *jlm_opt_flags]
-                    run_command(jlm_opt_command, env_vars=combined_env_vars, verbose=options.jlm_opt_verbosity,
-                                print_prefix=f"({task.index})", timeout=options.timeout)
-                    move_stats_file(tmpdir, stats_output)
+                run_jlm_opt(task, opt_out, jlm_opt_out, stats_output, other_outputs, jlm_opt_flags, env_vars)
 
-            tasks.append(Task(name=f"jlm_opt {full_name}",
-                              input_files=[opt_out],
-                              output_files=[jlm_opt_out],
-                              action=jlm_opt_action))
+            yield Task(name=f"jlm-opt {full_name}",
+                       input_files=[opt_out],
+                       output_files=[jlm_opt_out, stats_output],
+                       action=jlm_opt_action,
+                       stage="jlm-opt (linked)")
 
         else:
             jlm_opt_out = opt_out
@@ -462,21 +1716,155 @@ def link_and_optimize(tasks, full_name, compiled_cfiles, compiled_non_cfiles, st
 
     if clang_link_flags is not None:
         clang_command = [options.clang_link, *compiled_cfiles, *compiled_non_cfiles, "-o", clang_link_out, *clang_link_flags]
-        tasks.append(Task(name=f"clang (link) {full_name}",
-                          input_files=compiled_cfiles,
-                          output_files=[clang_link_out],
-                          action=lambda task: run_command(clang_command, env_vars=combined_env_vars, timeout=options.timeout)))
+        yield Task(name=f"clang (link) {full_name}",
+                   input_files=compiled_cfiles,
+                   output_files=[clang_link_out],
+                   action=lambda task: run_command(clang_command, env_vars=env_vars, timeout=options.timeout),
+                   stage="clang (link)")
 
     return (llvm_link_out, opt_out, jlm_opt_out, clang_link_out)
 
+# Dataset sizes of polybench, selected by defining <SIZE>_DATASET
+POLYBENCH_DATASETS = ["MINI", "SMALL", "MEDIUM", "LARGE", "EXTRALARGE"]
+
+# The variants of each program that are executed. The first one is the reference for checking output
+EXECUTION_VARIANTS = ["clang-O0", "clang-O2", "mem2reg", "jlm-opt"]
+
+def get_execution_variant_commands(variant, workdir, cfile, ir_flags, native_flags, obj_out, tmpdir, opt_flags, jlm_opt_flags):
+    """
+    Creates the list of commands that compile the given C file to an object file, for the given execution variant.
+    Variants that optimize LLVM IR use ir_flags when generating the IR, and do not optimize during code generation,
+    to make the difference between variants come from the IR optimizations.
+    :param native_flags: flags for variants where clang compiles directly to an object file
+    :param tmpdir: a folder for intermediate files
+    :param opt_flags: if not None, opt is run with the given flags before jlm-opt
+    :return: a list of (command, cwd) tuples
+    """
+    if variant == "clang-O0":
+        return [([options.clang, "-c", cfile, "-O0", *native_flags, "-o", obj_out], workdir)]
+    if variant == "clang-O2":
+        return [([options.clang, "-c", cfile, "-O2", *native_flags, "-o", obj_out], workdir)]
+
+    clang_out = os.path.join(tmpdir, "clang-out.ll")
+    opt_out = os.path.join(tmpdir, "opt-out.ll")
+    commands = [([options.clang, "-c", cfile, "-S", "-emit-llvm", *ir_flags, "-o", clang_out], workdir)]
+    if variant == "mem2reg":
+        commands.append(([options.opt, clang_out, "-S", "-passes=mem2reg", "-o", opt_out], None))
+    elif variant == "jlm-opt":
+        if opt_flags is not None:
+            mem2reg_out = os.path.join(tmpdir, "pre-jlm-opt-out.ll")
+            commands.append(([options.opt, clang_out, "-S", "-o", mem2reg_out, *opt_flags], None))
+            clang_out = mem2reg_out
+        commands.append(([options.jlm_opt, clang_out, "-o", opt_out, "-s", tmpdir, *jlm_opt_flags], None))
+    else:
+        raise ValueError(f"Unknown execution variant {variant}")
+    commands.append(([options.clang, "-c", "-O0", opt_out, "-o", obj_out], None))
+    return commands
+
+# Held while executing binaries, so only one execution task runs at a time on the execution CPU
+execution_lock = threading.Lock()
+
+def run_pinned(binary, cpu, timeout):
+    """
+    Runs the given binary on the given CPU, and returns its (stdout, stderr).
+    The binary is launched through taskset, so it is pinned before it starts running.
+    """
+    command = [binary] if cpu is None else ["taskset", "-c", str(cpu), binary]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        raise TaskTimeoutError()
+
+    if process.returncode != 0:
+        print(f"Command failed: {binary} with returncode: {process.returncode}")
+        raise TaskSubprocessError()
+    return stdout, stderr
+
+def add_execution_tasks(program_name, cfiles, stats_dir, env_vars, extra_clang_flags, opt_flags, jlm_opt_flags,
+                        datasets, runs):
+    """
+    Yields tasks that build the program once per dataset and execution variant, and run the binaries.
+    Made for polybench, which prints the kernel time to stdout, and the arrays to stderr.
+    For each dataset, every variant is run the given number of times, interleaved to spread out noise,
+    and the arrays are compared to those of the reference variant.
+    Results are placed in stats_dir/<program_name>-execution-<dataset>.log
+    :param cfiles: a list of tuples (full_name, workdir, cfile, arguments) for all C files in the program
+    """
+    variants = [variant for variant in EXECUTION_VARIANTS if variant != "jlm-opt" or jlm_opt_flags is not None]
+    for dataset in datasets:
+        binaries = {}
+        for variant in variants:
+            objects = []
+            for full_name, workdir, cfile, arguments in cfiles:
+                obj_out = options.get_build_dir(f"{full_name}-{dataset}-{variant}.o")
+                ir_flags = [*extra_clang_flags, *arguments, f"-D{dataset}_DATASET"]
+                native_flags = [*arguments, f"-D{dataset}_DATASET"]
+
+                def build_action(task, workdir=workdir, cfile=cfile, ir_flags=ir_flags, native_flags=native_flags,
+                                 obj_out=obj_out, variant=variant):
+                    with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
+                        for command, cwd in get_execution_variant_commands(variant, workdir, cfile, ir_flags, native_flags,
+                                                                           obj_out, tmpdir, opt_flags, jlm_opt_flags):
+                            run_command(command, cwd=cwd, env_vars=env_vars, timeout=options.timeout)
+
+                yield Task(name=f"Build {full_name} ({variant}, {dataset})",
+                           input_files=[os.path.abspath(os.path.join(workdir, cfile))],
+                           output_files=[obj_out],
+                           action=build_action,
+                           stage="execution build")
+                objects.append(obj_out)
+
+            binary = options.get_build_dir(f"{program_name}-{dataset}-{variant}")
+            link_command = [options.clang, *objects, "-lm", "-o", binary]
+            yield Task(name=f"Link {program_name} ({variant}, {dataset})",
+                       input_files=objects,
+                       output_files=[binary],
+                       action=lambda task, command=link_command: run_command(command, env_vars=env_vars,
+                                                                            timeout=options.timeout),
+                       stage="execution build")
+            binaries[variant] = binary
+
+        stats_output = os.path.join(stats_dir, f"{program_name}-execution-{dataset}.log")
+
+        def execution_action(task, binaries=binaries, stats_output=stats_output, dataset=dataset):
+            reference_variant = EXECUTION_VARIANTS[0]
+            output_hashes = {}
+            lines = []
+            with execution_lock:
+                for run in range(runs):
+                    for variant, binary in binaries.items():
+                        stdout, stderr = run_pinned(binary, options.execution_cpu, options.timeout)
+                        output_hash = hashlib.sha256(stderr.encode()).hexdigest()
+                        output_hashes.setdefault(variant, output_hash)
+                        matches = output_hash == output_hashes[reference_variant]
+                        kernel_time = int(float(stdout.strip().split()[-1]) * 1e9)
+                        lines.append(f"PolybenchExecution {binary} Variant:{variant} Dataset:{dataset} Run:{run} "
+                                     f"KernelTime[ns]:{kernel_time} OutputMatchesReference:{int(matches)}")
+
+            with open(stats_output, 'w', encoding='utf-8') as fd:
+                for line in lines:
+                    print(line, file=fd)
+
+            mismatches = [variant for variant, output_hash in output_hashes.items()
+                          if output_hash != output_hashes[reference_variant]]
+            if len(mismatches) != 0:
+                print(f"({task.index}) WARNING: array dumps of {', '.join(mismatches)} differ from {reference_variant}")
+
+        yield Task(name=f"Execute {program_name} ({dataset})",
+                   input_files=list(binaries.values()),
+                   output_files=[stats_output],
+                   action=execution_action,
+                   stage="execution")
+
 def find_common_prefix(strings):
-    prefix, *rest = strings
-    for string in rest:
-        while not string.startswith(prefix):
-            prefix = prefix[:-1]
-    return prefix
+    # commonprefix only compares the lexicographically smallest and largest strings
+    return os.path.commonprefix(list(strings))
 
 class CFile:
+    __slots__ = ("working_dir", "cfile", "ofile", "arguments", "abspath")
+
     def __init__(self, working_dir, cfile, ofile, arguments):
         """
         :param working_dir: the folder from which to compile, relative to CWD
@@ -488,9 +1876,150 @@ class CFile:
         self.cfile = cfile
         self.ofile = ofile
         self.arguments = arguments
+        self.abspath = os.path.abspath(os.path.join(working_dir, cfile))
 
     def get_abspath(self):
-        return os.path.abspath(os.path.join(self.working_dir, self.cfile))
+        return self.abspath
+
+# Flags that only affect the preprocessor. The ones in the first list take their value as a separate argument
+PREPROCESSOR_FLAGS_WITH_VALUE = ["-I", "-D", "-U", "-include", "-imacros", "-isystem", "-iquote", "-idirafter"]
+PREPROCESSOR_FLAG_PREFIXES = ["-I", "-D", "-U", "-isystem", "-iquote", "-idirafter"]
+
+def split_preprocessor_flags(flags):
+    """
+    Splits the given list of compiler flags in two.
+    :return: a tuple (preprocessor_flags, other_flags)
+    """
+    preprocessor_flags = []
+    other_flags = []
+
+    flags = iter(flags)
+    for flag in flags:
+        if flag in PREPROCESSOR_FLAGS_WITH_VALUE:
+            preprocessor_flags.extend([flag, next(flags)])
+        elif any(flag.startswith(prefix) for prefix in PREPROCESSOR_FLAG_PREFIXES):
+            preprocessor_flags.append(flag)
+        else:
+            other_flags.append(flag)
+
+    return preprocessor_flags, other_flags
+
+# Flags that give the folders searched for headers. They take their value as a separate argument, or appended
+INCLUDE_PATH_FLAGS = ["-I", "-isystem", "-iquote", "-idirafter"]
+
+def split_include_path_flags(flags):
+    """
+    Splits the given list of compiler flags in two.
+    :return: a tuple (include_path_flags, other_flags)
+    """
+    include_path_flags = []
+    other_flags = []
+
+    flags = iter(flags)
+    for flag in flags:
+        if flag in INCLUDE_PATH_FLAGS:
+            include_path_flags.extend([flag, next(flags)])
+        elif any(flag.startswith(prefix) for prefix in INCLUDE_PATH_FLAGS):
+            include_path_flags.append(flag)
+        else:
+            other_flags.append(flag)
+
+    return include_path_flags, other_flags
+
+def get_compilation_unit_key(source_hash, clang_flags, extra_key_parts):
+    """
+    Creates a key identifying the result of compiling a C file.
+    Two compilations get the same key if the preprocessed sources are identical,
+    and they use the same flags, ignoring flags that only affect the preprocessor.
+    :param source_hash: the hash of the preprocessed source, see CompilationUnitRegistry.get_source_hash
+    :param extra_key_parts: additional strings that must also match, e.g. flags given to later stages
+    """
+    _, other_flags = split_preprocessor_flags(clang_flags)
+
+    key = hashlib.sha256(source_hash.encode("utf-8"))
+    for part in [*other_flags, *extra_key_parts]:
+        key.update(b"\0")
+        key.update(part.encode("utf-8"))
+    return key.hexdigest()
+
+class CompilationUnitRegistry:
+    """
+    Keeps track of compilation units that have already been given tasks, across all benchmarks.
+    Used to avoid compiling and optimizing identical compilation units multiple times.
+    """
+    def __init__(self, cache_dir, workers=1):
+        """
+        :param cache_dir: folder where the hashes of preprocessed sources are cached between invocations.
+                          Hashes are only written if the folder exists, which it does not in dry runs
+        :param workers: the number of C files preprocessed in parallel when hashing
+        """
+        self.cache_dir = cache_dir
+        self.workers = workers
+        # Maps from compilation unit key to the full name and outputs of the first unit with the key
+        self.units = {}
+        # Number of compilation units that were replaced by a previously registered unit
+        self.num_aliased = 0
+        # Number of compilation units that could not be preprocessed, and are compiled without deduplication
+        self.num_failed = 0
+
+    def get_source_hash(self, workdir, cfile, clang_flags, env_vars):
+        """
+        Hashes the preprocessed source of the given C file.
+        The hash is cached along with the headers the file included, and reused while none of them have changed.
+        :return: the hash, or None if the file could not be preprocessed
+        """
+        cache_name = hashlib.sha256("\0".join([os.path.abspath(os.path.join(workdir, cfile)), *clang_flags])
+                                    .encode("utf-8")).hexdigest()
+        hash_file = os.path.join(self.cache_dir, f"{cache_name}.hash")
+        deps_file = os.path.join(self.cache_dir, f"{cache_name}.deps")
+        # The cached hash is treated like the output of a task, to reuse the checks of lazy reruns
+        cached = Task(name=f"Hash {cfile}", input_files=[os.path.abspath(os.path.join(workdir, cfile))],
+                      output_files=[hash_file], action=None, deps_file=deps_file)
+        if os.path.isfile(hash_file) and os.path.isfile(deps_file) and is_task_up_to_date(cached):
+            with open(hash_file, 'r', encoding='utf-8') as fd:
+                return fd.read().strip()
+
+        with tempfile.TemporaryDirectory(suffix="jlm-bench") as tmpdir:
+            make_deps_file = os.path.join(tmpdir, "preprocessed.d")
+            # -P omits line markers, making the output independent of where headers are located
+            preprocess_command = [options.clang, "-E", "-P", cfile, "-MD", "-MF", make_deps_file, *clang_flags]
+            try:
+                stdout, _ = run_command_and_capture(preprocess_command, env_vars=env_vars, cwd=workdir)
+            except subprocess.CalledProcessError as e:
+                print(f"WARNING: Failed to preprocess {cfile} in {workdir}, compiling it without deduplication")
+                print(f"Stderr:", e.stderr)
+                return None
+
+            source_hash = hashlib.sha256(stdout.encode("utf-8")).hexdigest()
+            if os.path.isdir(self.cache_dir):
+                write_deps_file(deps_file, read_make_deps_file(make_deps_file, workdir))
+                with open(hash_file, 'w', encoding='utf-8') as fd:
+                    print(source_hash, file=fd)
+        return source_hash
+
+    def get_source_hashes(self, units, env_vars):
+        """
+        Hashes the preprocessed sources of the given (workdir, cfile, clang_flags) in parallel
+        :return: a list with the hash of each unit, or None for units that could not be preprocessed
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            hashes = list(executor.map(lambda unit: self.get_source_hash(*unit, env_vars), units))
+        self.num_failed += hashes.count(None)
+        return hashes
+
+    def lookup(self, key):
+        """
+        If a unit with the given key has been registered before, returns its (full_name, output).
+        Otherwise returns None.
+        """
+        if key in self.units:
+            self.num_aliased += 1
+            return self.units[key]
+        return None
+
+    def register(self, key, full_name, output):
+        assert key not in self.units
+        self.units[key] = (full_name, output)
 
 class Benchmark:
     def __init__(self, name, cfiles, ofiles, linker_arguments):
@@ -528,8 +2057,19 @@ class Benchmark:
         # Add an optional suffix to outputs of jlm-opt
         self.jlm_opt_suffix = None
 
+        # If set, an LLVM opt pipeline is used instead of jlm-opt, to compare compile times
+        self.llvm_baseline_passes = None
+
         self.jlm_opt_allowlist = None
 
+        # If set, the program is built and executed once per dataset, see add_execution_tasks
+        self.execution_datasets = None
+        self.execution_runs = 5
+
+        # If set, C files with full names matching the regex are also analyzed in growing subsets of their functions
+        self.scaling_series_filter = None
+        self.scaling_series_steps = 10
+
     def get_full_cfile_name(self, cfile):
         """Get a cfile name, including the program name, and enough of the path to make it unique"""
         abspath = cfile.get_abspath()
@@ -537,17 +2077,28 @@ class Benchmark:
         path = abspath[len(self.common_abspath):]
         return f"{self.name}+{path}".replace("/", "_")
 
-    def get_tasks(self, stats_dir, env_vars):
-        tasks = []
-
+    def get_tasks(self, stats_dir, env_vars, unit_registry=None, preprocessed_cache=None):
+        """
+        Yields all tasks needed to compile, optimize and link the program, in dependency order.
+        :param env_vars: the complete environment of the executed commands, shared between tasks
+        :param unit_registry: if not None, a CompilationUnitRegistry used to skip compiling units
+                              that are identical to units that have already been given tasks
+        :param preprocessed_cache: if not None, a PreprocessedSourceCache used to share preprocessing
+        """
         # Maps from the ofile name used in sources, to the output file produced by jlm-opt
         ofile_mapping = {}
 
+        if unit_registry is not None:
+            # Preprocess all C files of the program at once, in parallel, instead of one at a time below
+            source_hashes = unit_registry.get_source_hashes(
+                [(cfile.working_dir, cfile.cfile, [*self.extra_clang_flags, *cfile.arguments]) for cfile in self.cfiles],
+                env_vars)
+
         for i, cfile in enumerate(self.cfiles):
             full_name = self.get_full_cfile_name(cfile)
 
-            # TODO: RAM skip
-            if "makesrna_intern_rna_nodetree_gen.c" in full_name:
+            # This file uses too much RAM, unless it is split into chunks
+            if options.split_larger_than is None and "makesrna_intern_rna_nodetree_gen.c" in full_name:
                 continue
 
             # Skipping running jlm-opt if there is an allowlist and we are not on it
@@ -555,14 +2106,52 @@ class Benchmark:
             if self.jlm_opt_allowlist is not None and i not in self.jlm_opt_allowlist:
                 jlm_opt_flags = None
 
-            _, _, outfile = compile_file(tasks, full_name=full_name, workdir=cfile.working_dir, cfile=cfile.cfile,
-                                         stats_dir=stats_dir, env_vars=env_vars,
-                                         extra_clang_flags=[*self.extra_clang_flags, *cfile.arguments],
-                                         opt_flags=self.opt_flags,
-                                         jlm_opt_flags=jlm_opt_flags,
-                                         jlm_opt_suffix=self.jlm_opt_suffix)
+            extra_clang_flags = [*self.extra_clang_flags, *cfile.arguments]
+
+            unit_key = None
+            # Units that could not be preprocessed are compiled without deduplication, and fail in their own task
+            if unit_registry is not None and source_hashes[i] is not None:
+                # Any difference in the later stages must also give a different compilation unit
+                extra_key_parts = [str(self.opt_flags), str(jlm_opt_flags), str(self.jlm_opt_suffix),
+                                   str(self.llvm_baseline_passes)]
+                unit_key = get_compilation_unit_key(source_hashes[i], extra_clang_flags, extra_key_parts)
+
+                existing = unit_registry.lookup(unit_key)
+                if existing is not None:
+                    # Use the output of the identical compilation unit instead of making new tasks
+                    _, ofile_mapping[cfile.ofile] = existing
+                    continue
+
+            _, opt_out, jlm_opt_out = yield from compile_file(full_name=full_name, workdir=cfile.working_dir, cfile=cfile.cfile,
+                                                              stats_dir=stats_dir, env_vars=env_vars,
+                                                              extra_clang_flags=extra_clang_flags,
+                                                              opt_flags=self.opt_flags,
+                                                              jlm_opt_flags=jlm_opt_flags,
+                                                              jlm_opt_suffix=self.jlm_opt_suffix,
+                                                              preprocessed_cache=preprocessed_cache,
+                                                              llvm_baseline_passes=self.llvm_baseline_passes)
+
+            if jlm_opt_flags is not None and self.scaling_series_filter is not None \
+                    and self.scaling_series_filter.search(full_name):
+                yield from add_scaling_series_tasks(full_name, opt_out, stats_dir, env_vars, jlm_opt_flags,
+                                                    self.scaling_series_steps)
+            # Whole-program jlm-opt should analyze the same IR as the per-file jlm-opt, not its output
+            outfile = opt_out if self.linked_jlm_opt_flags is not None else jlm_opt_out
             ofile_mapping[cfile.ofile] = outfile
 
+            if unit_key is not None:
+                unit_registry.register(unit_key, full_name, outfile)
+
+        if self.execution_datasets is not None:
+            cfiles = [(self.get_full_cfile_name(cfile), cfile.working_dir, cfile.cfile, cfile.arguments)
+                      for cfile in self.cfiles]
+            yield from add_execution_tasks(self.name, cfiles, stats_dir, env_vars,
+                                           extra_clang_flags=self.extra_clang_flags,
+                                           opt_flags=self.opt_flags,
+                                           jlm_opt_flags=self.jlm_opt_flags,
+                                           datasets=self.execution_datasets,
+                                           runs=self.execution_runs)
+
         # Try as much as possible to use the LLVM IR files produced above when linking
         compiled_cfiles = []
         compiled_non_cfiles = []
@@ -572,26 +2161,132 @@ class Benchmark:
             else:
                 compiled_non_cfiles.append(ofile)
 
-        link_and_optimize(tasks, full_name=self.name, compiled_cfiles=compiled_cfiles, compiled_non_cfiles=compiled_non_cfiles,
-                          stats_dir=stats_dir, env_vars=env_vars,
-                          llvm_link_flags=self.llvm_link_flags,
-                          opt_flags=self.linked_opt_flags,
-                          jlm_opt_flags=self.linked_jlm_opt_flags,
-                          clang_link_flags=self.clang_link_flags)
+        if len(compiled_cfiles) == 0 and self.llvm_link_flags is not None:
+            # None of the linked files were compiled here, so there is no LLVM IR to link
+            print(f"WARNING: Skipping linking {self.name}, as none of its {len(self.ofiles)} linked files were compiled from C files")
+            return
 
-        return tasks
+        yield from link_and_optimize(full_name=self.name, compiled_cfiles=compiled_cfiles,
+                                     compiled_non_cfiles=compiled_non_cfiles,
+                                     stats_dir=stats_dir, env_vars=env_vars,
+                                     llvm_link_flags=self.llvm_link_flags,
+                                     opt_flags=self.linked_opt_flags,
+                                     jlm_opt_flags=self.linked_jlm_opt_flags,
+                                     clang_link_flags=self.clang_link_flags)
 
 
-def get_benchmarks(sources_json):
-    """ Returns benchmarks to be compiled """
+class SourcesIndex:
+    """
+    Provides access to the programs in a sources.json file, without parsing all of it every time.
+    The first time a sources.json file is used, an indexed sidecar file is created next to it.
+    The sidecar contains one pickled entry per program, and an index of where each program's entry is located,
+    making it possible to only load the programs that are actually used.
+    The sidecar is re-created whenever the modification time or size of the sources.json file changes.
+    """
+    VERSION = 1
+
+    def __init__(self, sources_json):
+        self.sources_json = sources_json
+        self.sidecar = sources_json + ".index.pickle"
+
+        stat = os.stat(sources_json)
+        self.source_id = (SourcesIndex.VERSION, stat.st_mtime_ns, stat.st_size)
+
+        # Maps from program name to (offset, length, number of C files), in sources.json order
+        self.index = None
+        # Offset in the sidecar file of the first program entry
+        self.data_start = None
+        # If the sidecar had to be created, all programs have already been parsed and are kept here
+        self.parsed_programs = None
+
+        if not self.try_read_index():
+            self.create_sidecar()
+
+    def try_read_index(self):
+        try:
+            with open(self.sidecar, 'rb') as fd:
+                source_id, index = pickle.load(fd)
+                if source_id != self.source_id:
+                    return False
+                self.index = index
+                self.data_start = fd.tell()
+                return True
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return False
+
+    def create_sidecar(self):
+        with open(self.sources_json, 'r') as sources_fd:
+            programs = json.load(sources_fd)
+
+        index = {}
+        blobs = []
+        offset = 0
+        for name, data in programs.items():
+            blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            index[name] = (offset, len(blob), len(data["cfiles"]))
+            blobs.append(blob)
+            offset += len(blob)
+
+        header = pickle.dumps((self.source_id, index), protocol=pickle.HIGHEST_PROTOCOL)
+
+        # Write to a temporary file first, as multiple instances of this script may start at the same time
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.sidecar) or ".", suffix=".tmp")
+            with os.fdopen(fd, 'wb') as out_fd:
+                out_fd.write(header)
+                for blob in blobs:
+                    out_fd.write(blob)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.sidecar)
+        except OSError as e:
+            print(f"warning: unable to write {self.sidecar}: {e}")
+
+        self.index = index
+        self.data_start = len(header)
+        self.parsed_programs = programs
+
+    def get_program_names(self):
+        return list(self.index.keys())
+
+    def get_num_cfiles(self, name):
+        return self.index[name][2]
+
+    def load_programs(self, names):
+        """Returns a dict mapping from each of the given program names to its data"""
+        if self.parsed_programs is not None:
+            return {name: self.parsed_programs[name] for name in names}
+
+        result = {}
+        with open(self.sidecar, 'rb') as fd:
+            for name in names:
+                offset, length, _ = self.index[name]
+                fd.seek(self.data_start + offset)
+                result[name] = pickle.loads(fd.read(length))
+        return result
+
+def get_benchmarks(sources_json, benchmark_filter=None):
+    """
+    Returns benchmarks to be compiled
+    :param benchmark_filter: if not None, only benchmarks with names that include a match of this regex are returned
+    """
 
     # Everything in the sources file is relative to the sources file, so add its path
     sources_folder = os.path.dirname(sources_json)
 
     benchmarks = []
 
-    with open(sources_json, 'r') as sources_fd:
-        programs = json.load(sources_fd)
+    sources_index = SourcesIndex(sources_json)
+    names = sources_index.get_program_names()
+
+    # Filter before loading the programs, to only materialize the programs that are used
+    if benchmark_filter is not None:
+        regex = re.compile(benchmark_filter)
+        names = [name for name in names if regex.search(name)]
+
+    # Sort benchmarks in order of ascending number of C files
+    names.sort(key=sources_index.get_num_cfiles)
+
+    programs = sources_index.load_programs(names)
 
     for name, data in programs.items():
         cfiles = []
@@ -616,12 +2311,26 @@ def get_benchmarks(sources_json):
                                     ofiles=ofiles,
                                     linker_arguments=linker_arguments))
 
-    # Sort benchmarks in order of ascending number of C files
-    benchmarks.sort(key=lambda bench: len(bench.cfiles))
-
     return benchmarks
 
 
+def print_time_per_stage(tasks):
+    """Prints the total time spent in each stage, among the given finished tasks"""
+    time_per_stage = {}
+    tasks_per_stage = {}
+    for task in tasks:
+        if task.duration is None or task.stage is None:
+            continue
+        time_per_stage[task.stage] = time_per_stage.get(task.stage, datetime.timedelta()) + task.duration
+        tasks_per_stage[task.stage] = tasks_per_stage.get(task.stage, 0) + 1
+
+    if len(time_per_stage) == 0:
+        return
+
+    print("Time spent per stage:")
+    for stage, duration in time_per_stage.items():
+        print(f"  {stage:<30} {tasks_per_stage[stage]:6d} tasks {duration} (mean {duration / tasks_per_stage[stage]})")
+
 def run_benchmarks(benchmarks,
                    env_vars,
                    offset=0,
@@ -637,31 +2346,80 @@ def run_benchmarks(benchmarks,
     """
     start_time = datetime.datetime.now()
 
-    tasks = [task for bench in benchmarks for task in bench.get_tasks(options.get_stats_dir(), env_vars)]
-    for i, task in enumerate(tasks):
-        task.index = i
+    unit_registry = None
+    if options.deduplicate:
+        unit_registry = CompilationUnitRegistry(options.get_build_dir("unit-hashes"), workers)
+        if not dryrun:
+            ensure_folder_exists(unit_registry.cache_dir)
+    preprocessed_cache = None
+    if options.preprocess_cache:
+        preprocessed_cache = PreprocessedSourceCache(options.get_build_dir("preprocessed"))
+        if not dryrun:
+            ensure_folder_exists(preprocessed_cache.cache_dir)
+            ensure_folder_exists(preprocessed_cache.objects_dir)
+
+    # All tasks share a single read-only copy of the environment
+    combined_env_vars = get_combined_env_vars(env_vars)
+    stats_dir = options.get_stats_dir()
+
+    # Tasks are created lazily, and only the ones selected by offset, stride and limit are kept
+    def enumerate_tasks():
+        all_tasks = itertools.chain.from_iterable(
+            bench.get_tasks(stats_dir, combined_env_vars, unit_registry, preprocessed_cache)
+            for bench in benchmarks)
+        for i, task in enumerate(all_tasks):
+            task.index = i
+            yield task
+
+    stop = None if limit == float('inf') else offset + limit * stride
+    tasks = itertools.islice(enumerate_tasks(), offset, stop, stride)
+
+    num_selected = 0
+    num_lazily_skipped = 0
+    if eager:
+        selected_tasks = list(tasks)
+        num_selected = len(selected_tasks)
+    else:
+        # Tasks are listed in dependency order, so any task that uses the output of a task
+        # that will run, must also run, even if its own outputs seem up to date
+        outputs_to_be_remade = set()
+        selected_tasks = []
+        for task in tasks:
+            num_selected += 1
+            if not any(input_file in outputs_to_be_remade for input_file in task.input_files) and can_skip_task(task):
+                num_lazily_skipped += 1
+                continue
+            selected_tasks.append(task)
+            outputs_to_be_remade.update(task.output_files)
+    tasks = selected_tasks
+
+    if unit_registry is not None:
+        print(f"Deduplicated {unit_registry.num_aliased} compilation units that were identical to another unit")
+        if unit_registry.num_failed != 0:
+            print(f"WARNING: {unit_registry.num_failed} compilation units failed to preprocess, and were not deduplicated")
 
     if offset != 0:
-        tasks = tasks[offset:]
-        print(f"Skipping first {offset} tasks, leaving {len(tasks)}")
+        print(f"Skipped first {offset} tasks")
     if stride != 1:
-        tasks = tasks[::stride]
-        print(f"Skipping {stride-1} tasks between each task, leaving {len(tasks)}")
-    if limit < len(tasks):
-        print(f"Limited to {limit} tasks, skipping last {len(tasks)-limit}")
-        tasks = tasks[:limit]
-
-    if not eager:
-        pre_skip_len = len(tasks)
-        tasks = [task for task in tasks if not can_skip_task(task)]
-        if len(tasks) != pre_skip_len:
-            print(f"Skipping {pre_skip_len - len(tasks)} tasks due to laziness, leaving {len(tasks)}")
+        print(f"Skipped {stride-1} tasks between each task")
+    if limit != float('inf'):
+        print(f"Limited to {limit} tasks")
+    if offset != 0 or stride != 1 or limit != float('inf'):
+        print(f"Selected {num_selected} tasks")
+    if num_lazily_skipped != 0:
+        print(f"Skipping {num_lazily_skipped} tasks due to laziness, leaving {len(tasks)}")
 
     tasks_finished, tasks_failed, tasks_timed_out, tasks_skipped = run_all_tasks(tasks, workers, dryrun)
 
     end_time = datetime.datetime.now()
     print(f"Done in {end_time - start_time}")
 
+    print_time_per_stage(tasks_finished)
+    if preprocessed_cache is not None:
+        preprocessed_cache.print_time_saved()
+        if not dryrun:
+            preprocessed_cache.remove_unused_objects()
+
     # If we timed out on or skipped some tasks, list them at the end and return status code 1
     if len(tasks_failed) != 0:
         print(f"WARNING: {len(tasks_failed)} tasks failed:")
@@ -685,6 +2443,9 @@ def run_benchmarks(benchmarks,
 def intOrNone(value):
     return int(value) if value is not None else None
 
+def megabytesOrNone(value):
+    return int(value * 1024 * 1024) if value is not None else None
+
 
 def main():
     parser = argparse.ArgumentParser(description='Compile benchmarks using jlm-opt')
@@ -698,6 +2459,12 @@ def main():
                         help=f'Specify the folder to put jlm-opt statistics in. [{Options.DEFAULT_STATS_DIR}]')
     parser.add_argument('--jlm-opt', dest='jlm_opt', action='store', default=Options.DEFAULT_JLM_OPT,
                         help=f'Override the jlm-opt binary used. [{Options.DEFAULT_JLM_OPT}]')
+    parser.add_argument('--jlm-opt-b', dest='jlm_opt_b', action='store', default=None,
+                        help='A second jlm-opt binary to compare against --jlm-opt. Each C file is optimized by both, '
+                             'interleaved and repeated --abRuns times. Compare them with analysis/compare-ab.py. '
+                             'Use -j1 for stable timings')
+    parser.add_argument('--abRuns', metavar='N', dest='ab_runs', action='store', default=5, type=int,
+                        help='The number of times each binary is run on each C file with --jlm-opt-b. [5]')
     parser.add_argument('--jlmV', dest='jlm_opt_verbosity', action='store', default=Options.DEFAULT_JLM_OPT_VERBOSITY,
                         help=f'Set verbosity level for jlm-opt. [{Options.DEFAULT_JLM_OPT_VERBOSITY}]')
 
@@ -719,6 +2486,62 @@ def main():
     parser.add_argument('--timeout', dest='timeout', action='store', default=None,
                         help='Sets a maximum allowed runtime for subprocesses. In seconds. The process may run for at most a minute longer.')
 
+    parser.add_argument('--deduplicate', dest='deduplicate', action='store_true',
+                        help='Only compile and optimize identical compilation units once. Uses the preprocessed source and flags')
+    parser.add_argument('--preprocessCache', dest='preprocess_cache', action='store_true',
+                        help='Preprocess each C file once into a compressed cache in the build folder, and generate LLVM IR from it')
+
+    parser.add_argument('--link', dest='link', action='store_true',
+                        help='Also link the LLVM IR of each program, and run jlm-opt on the whole program')
+    parser.add_argument('--linkFanIn', metavar='N', dest='link_fan_in', action='store', default=8, type=int,
+                        help='The maximum number of files merged by each llvm-link task when linking. [8]')
+
+    parser.add_argument('--splitLargerThan', metavar='MB', dest='split_larger_than', action='store', default=None, type=float,
+                        help='Split LLVM IR files larger than MB megabytes into chunks of that size, '
+                             f'and run jlm-opt on up to {MAX_PARALLEL_CHUNKS} of the chunks in parallel')
+    parser.add_argument('--memoryLimit', metavar='MB', dest='memory_limit', action='store', default=None, type=float,
+                        help='Limit the address space of each jlm-opt process to MB megabytes')
+
+    parser.add_argument('--scalingSeries', metavar='REGEX', dest='scaling_series', action='store', default=None,
+                        help='For C files with full names matching REGEX, also run jlm-opt on growing subsets of their functions')
+    parser.add_argument('--scalingSteps', metavar='N', dest='scaling_steps', action='store', default=10, type=int,
+                        help='The number of subsets used by --scalingSeries, each adding 1/N of the functions, at most 100. [10]')
+
+    parser.add_argument('--llvmBaseline', dest='llvm_baseline', action='store_true',
+                        help='Instead of jlm-opt, run a comparable LLVM opt pipeline and record its pass timers. '
+                             'Use a separate --statsdir, as it replaces the jlm-opt statistics')
+
+    parser.add_argument('--frontendTrace', dest='frontend_trace', action='store_true',
+                        help='Record clang -ftime-trace and opt -time-passes reports next to the statistics files. '
+                             'Summarize them with analysis/aggregate-frontend.py')
+
+    parser.add_argument('--perfCounters', dest='perf_counters', action='store_true',
+                        help='Run jlm-opt inside perf stat, and add cycles, instructions, branch, LLC and dTLB misses '
+                             'to its statistics. Combine with --exactConfiguration to get counters per solver configuration')
+
+    parser.add_argument('--profile-slower-than', metavar='T', dest='profile_slower_than', action='store', default=None,
+                        type=float,
+                        help='Profile jlm-opt runs whose previously observed or predicted time exceeds T seconds, '
+                             'placing folded stacks next to their statistics. Predictions use the median throughput '
+                             'of runs already in the statistics folder')
+
+    parser.add_argument('--rssSampleInterval', metavar='S', dest='rss_sample_interval', action='store', default=None,
+                        type=float,
+                        help='Sample the RSS and PSS of jlm-opt every S seconds, placing the timeline next to its statistics. '
+                             'Plot it with analysis/plot-memory-timeline.py')
+
+    parser.add_argument('--executePolybench', dest='execute_polybench', action='store_true',
+                        help='Build polybench programs with clang -O0, clang -O2, mem2reg and jlm-opt, and time their kernels. '
+                             'Use -j1, or pin to an otherwise idle CPU, for stable timings')
+    parser.add_argument('--executionDatasets', metavar='D', dest='execution_datasets', action='store',
+                        default="MINI,SMALL,MEDIUM,LARGE",
+                        help=f'Comma separated polybench dataset sizes to execute, out of {",".join(POLYBENCH_DATASETS)}. '
+                             '[MINI,SMALL,MEDIUM,LARGE]')
+    parser.add_argument('--executionRuns', metavar='N', dest='execution_runs', action='store', default=5, type=int,
+                        help='The number of times each binary is executed. [5]')
+    parser.add_argument('--executionCpu', metavar='CPU', dest='execution_cpu', action='store', default=None, type=int,
+                        help='The CPU executed binaries are pinned to. No other task runs on it. [the last CPU available]')
+
     parser.add_argument('-j', metavar='N', dest='workers', action='store', default='1',
                         help='Run up to N tasks in parallel when possible')
     parser.add_argument('--clean', dest='clean', action='store_true',
@@ -738,6 +2561,33 @@ def main():
 
 
     args = parser.parse_args()
+    if args.split_larger_than is not None and args.split_larger_than <= 0:
+        parser.error("--splitLargerThan must be positive")
+    if args.rss_sample_interval is not None:
+        if args.rss_sample_interval <= 0:
+            parser.error("--rssSampleInterval must be positive")
+        if psutil is None:
+            parser.error("--rssSampleInterval requires the psutil module")
+    if not 1 <= args.scaling_steps <= 100:
+        # Each subset is named after its whole percentage of functions, which must be unique
+        parser.error("--scalingSteps must be between 1 and 100")
+    if args.jlm_opt_b is not None:
+        if args.ab_runs < 1:
+            parser.error("--abRuns must be at least 1")
+        if args.split_larger_than is not None:
+            parser.error("--jlm-opt-b can not be combined with --splitLargerThan")
+        if args.profile_slower_than is not None:
+            # Profiled runs are slowed down, and would skew the timers that are compared
+            parser.error("--jlm-opt-b can not be combined with --profile-slower-than")
+    execution_datasets = args.execution_datasets.split(",")
+    if any(dataset not in POLYBENCH_DATASETS for dataset in execution_datasets):
+        parser.error(f"--executionDatasets must be a subset of {','.join(POLYBENCH_DATASETS)}")
+    execution_cpu = args.execution_cpu
+    if execution_cpu is None:
+        execution_cpu = max(os.sched_getaffinity(0))
+    if args.execute_polybench and len(os.sched_getaffinity(0) - {execution_cpu}) > 0:
+        # Reserve the execution CPU, by keeping every other task, and the processes they start, off it
+        os.sched_setaffinity(0, os.sched_getaffinity(0) - {execution_cpu})
 
     global options
     options = Options(llvm_bindir=args.llvm_bindir,
@@ -745,7 +2595,24 @@ def main():
                       stats_dir=args.stats_dir,
                       jlm_opt=args.jlm_opt,
                       jlm_opt_verbosity=int(args.jlm_opt_verbosity),
-                      timeout=intOrNone(args.timeout))
+                      timeout=intOrNone(args.timeout),
+                      deduplicate=args.deduplicate,
+                      preprocess_cache=args.preprocess_cache,
+                      link_fan_in=args.link_fan_in,
+                      split_larger_than=megabytesOrNone(args.split_larger_than),
+                      memory_limit=megabytesOrNone(args.memory_limit),
+                      execution_cpu=execution_cpu,
+                      frontend_trace=args.frontend_trace,
+                      perf_counters=args.perf_counters,
+                      profile_slower_than=args.profile_slower_than,
+                      rss_sample_interval=args.rss_sample_interval,
+                      jlm_opt_b=args.jlm_opt_b,
+                      ab_runs=args.ab_runs)
+    if options.perf_counters and not args.dryrun:
+        options.perf_counters = check_perf_counters_available()
+    if options.profile_slower_than is not None and not args.dryrun:
+        options.profiler = check_profiler_available()
+        options.jlm_opt_time_model = JlmOptTimeModel(options.get_stats_dir())
 
     dryrun = args.dryrun
     if not dryrun:
@@ -756,12 +2623,8 @@ def main():
         ensure_folder_exists(options.get_build_dir())
         ensure_folder_exists(options.get_stats_dir())
 
-    benchmarks = get_benchmarks(args.sources_file)
+    benchmarks = get_benchmarks(args.sources_file, args.benchmark_filter)
 
-    if args.benchmark_filter is not None:
-        regex = re.compile(args.benchmark_filter)
-        benchmarks = [bench for bench in benchmarks if regex.search(bench.name)]
-    
     if args.list_benchmarks:
         print(f"{len(benchmarks)} benchmarks:")
         for bench in benchmarks:
@@ -829,6 +2692,23 @@ def main():
         # Disable linking
         bench.clang_link_flags = None
 
+        if args.llvm_baseline:
+            bench.llvm_baseline_passes = LLVM_BASELINE_PASSES
+            bench.jlm_opt_flags = None
+
+        if args.execute_polybench and bench.name.startswith("polybench-"):
+            bench.execution_datasets = execution_datasets
+            bench.execution_runs = args.execution_runs
+
+        if args.scaling_series is not None:
+            bench.scaling_series_filter = re.compile(args.scaling_series)
+            bench.scaling_series_steps = args.scaling_steps
+
+        if args.link:
+            # Link the IR given to jlm-opt for each file, and analyze the whole program with the same flags
+            bench.llvm_link_flags = []
+            bench.linked_jlm_opt_flags = bench.jlm_opt_flags
+
     # If any tasks time out or fail, the script will have a non-zero return code
     return run_benchmarks(benchmarks,
                           env_vars=env_vars,
@@ -4,7 +4,7 @@
 #SBATCH --job-name=jlm-stats-aggregate
 #SBATCH --nodes=1
 #SBATCH --tasks-per-node=1
-#SBATCH --cpus-per-task=1
+#SBATCH --cpus-per-task=16
 #SBATCH --constraint=56c
 #SBATCH --mem=20G
 #SBATCH --time=48:00:00
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import os
+import random
+
+# The folder where synthetic programs are placed, relative to the sources folder
+SYNTHETIC_FOLDER = "programs/synthetic"
+
+# All synthetic programs are registered in sources.json with names starting with this prefix
+PROGRAM_PREFIX = "synthetic-"
+
+# Parameters that can be given as comma separated lists.
+# One program is generated for each combination of values.
+# The entries are (name, type, default, help)
+PARAMETERS = [
+    ("functions", int, "1000", "Number of functions in the program"),
+    ("depth", int, "8", "Number of layers in the call graph. Functions only call functions in the next layer"),
+    ("calls", int, "2", "Number of direct or indirect calls made by each function"),
+    ("scc_size", int, "1", "Number of functions in each recursive call graph SCC. 1 gives no recursion"),
+    ("allocas", int, "2", "Number of address-taken local variables in each function"),
+    ("mallocs", int, "1", "Number of heap allocations in each function"),
+    ("indirection", int, "2", "Depth of the pointer-to-pointer chains created in each function"),
+    ("function_pointers", float, "0.1", "Fraction of calls made through a global table of function pointers"),
+    ("globals", int, "16", "Number of global variables, and of global pointers that heap memory escapes to"),
+]
+
+def get_program_name(values, varying):
+    """Names a program after the values of the parameters that vary between the generated programs"""
+    parts = [f"{name.replace('_', '')}{values[name]}" for name in varying]
+    return PROGRAM_PREFIX + ("-".join(parts) if len(parts) > 0 else "default")
+
+def generate_function(index, values, rng):
+    """
+    Creates the C code for a single function.
+    Every function has the same signature, to allow calling any function through the function pointer table.
+    """
+    num_functions = values["functions"]
+    layer_size = max(num_functions // values["depth"], 1)
+    scc_size = values["scc_size"]
+
+    lines = [f"int f{index}(int depth, int *arg) {{",
+             "  int result = depth;"]
+
+    # Address-taken local variables become allocas that can be pointed to
+    allocas = []
+    for i in range(values["allocas"]):
+        if i % 2 == 0:
+            lines.append(f"  int local{i} = {index + i};")
+            allocas.append(f"&local{i}")
+        else:
+            lines.append(f"  int local{i}[4] = {{ {i}, *arg, 0, 0 }};")
+            allocas.append(f"local{i}")
+
+    # Make every local variable address-taken and used, so none of them are removed as unused or promoted to registers
+    if len(allocas) > 0:
+        lines.append(f"  int *locals[{len(allocas)}] = {{ {', '.join(allocas)} }};")
+        lines.append(f"  result += *locals[depth % {len(allocas)}];")
+
+    heap = []
+    for i in range(values["mallocs"]):
+        lines.append(f"  int *heap{i} = malloc(sizeof(int) * 4);")
+        lines.append(f"  heap{i}[0] = *arg;")
+        heap.append(f"heap{i}")
+
+    # Chains of pointers to pointers, ending in memory the function can point to
+    targets = allocas + heap + ["arg"]
+    if values["indirection"] > 0:
+        lines.append(f"  int *ind1 = {rng.choice(targets)};")
+        for level in range(2, values["indirection"] + 1):
+            lines.append(f"  int {'*' * level}ind{level} = &ind{level - 1};")
+        lines.append(f"  result += {'*' * values['indirection']}ind{values['indirection']};")
+
+    if values["globals"] > 0:
+        lines.append(f"  g{rng.randrange(values['globals'])} += result;")
+
+    # Calls go to the next layer of the call graph, so the depth of the call graph is bounded
+    first_callee = (index // layer_size + 1) * layer_size
+    if first_callee < num_functions:
+        for _ in range(values["calls"]):
+            callee = rng.randrange(first_callee, min(first_callee + layer_size, num_functions))
+            argument = rng.choice(targets)
+            if rng.random() < values["function_pointers"]:
+                lines.append(f"  result += fn_table[{callee}](depth, {argument});")
+            else:
+                lines.append(f"  result += f{callee}(depth, {argument});")
+
+    # The last function in each SCC calls the first one, making a cycle through the functions in between
+    if scc_size > 1:
+        scc_start = index - index % scc_size
+        if index == scc_start + scc_size - 1 or index == num_functions - 1:
+            if scc_start != index:
+                lines.append(f"  if (depth > 0)")
+                lines.append(f"    result += f{scc_start}(depth - 1, {rng.choice(targets)});")
+        elif index + 1 < num_functions:
+            lines.append(f"  result += f{index + 1}(depth, {rng.choice(targets)});")
+
+    # Some heap memory escapes through global pointers, the rest is freed
+    for name in heap:
+        if values["globals"] > 0 and rng.random() < 0.5:
+            lines.append(f"  gp{rng.randrange(values['globals'])} = {name};")
+        else:
+            lines.append(f"  free({name});")
+
+    lines.append("  return result;")
+    lines.append("}")
+    return "\n".join(lines)
+
+def generate_program(values, seed):
+    """Creates the C source code of a complete program with the given parameter values"""
+    rng = random.Random(seed)
+    num_functions = values["functions"]
+
+    parts = ["// Generated by generate_synthetic.py. Meant for analysis, not for execution.",
+             "#include <stdlib.h>",
+             ""]
+
+    for i in range(values["globals"]):
+        parts.append(f"int g{i};")
+        parts.append(f"int *gp{i};")
+    parts.append("")
+
+    for i in range(num_functions):
+        parts.append(f"int f{i}(int depth, int *arg);")
+    parts.append("")
+
+    parts.append("int (*fn_table[])(int, int *) = {")
+    parts.extend(f"  f{i}," for i in range(num_functions))
+    parts.append("};")
+    parts.append("")
+
+    for i in range(num_functions):
+        parts.append(generate_function(i, values, rng))
+        parts.append("")
+
+    parts.append("int main(void) {")
+    parts.append("  int x = 0;")
+    parts.append("  return f0(2, &x) & 0xff;")
+    parts.append("}")
+    return "\n".join(parts) + "\n"
+
+def make_program_entry(name):
+    """Creates the sources.json entry for a program consisting of a single C file named after the program"""
+    builddir = os.path.join(SYNTHETIC_FOLDER, "build")
+    ofile = os.path.join(builddir, f"{name}.o")
+    return {
+        "cfiles": [{
+            "cfile": f"{name}.c",
+            "ofile": ofile,
+            "working_dir": SYNTHETIC_FOLDER,
+            "arguments": ["-std=c17"]
+        }],
+        "linker_workdir": builddir,
+        "ofiles": [ofile],
+        "elffile": os.path.join(builddir, name),
+        "linker_arguments": []
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic C programs of controlled size and shape, '
+                                                 'and register them in sources.json')
+    for name, kind, default, help_text in PARAMETERS:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, action='store', default=default,
+                            help=f"{help_text}. Comma separated values give one program per value [{default}]")
+    parser.add_argument('--seed', dest='seed', action='store', default=0, type=int,
+                        help="Seed used for all random choices [0]")
+    parser.add_argument('--sources', dest='sources', action='store', default='sources.json',
+                        help="The sources json file to register the programs in [sources.json]")
+    parser.add_argument('--clean', dest='clean', action='store_true',
+                        help="Remove all previously registered synthetic programs")
+    args = parser.parse_args()
+
+    # The script should be run from the sources folder, to make paths in sources.json correct
+    assert "/" not in args.sources
+
+    parameter_values = {name: [kind(value) for value in getattr(args, name).split(",")]
+                        for name, kind, _, _ in PARAMETERS}
+    varying = [name for name, values in parameter_values.items() if len(values) > 1]
+
+    if os.path.exists(args.sources):
+        with open(args.sources, 'r', encoding='utf-8') as sources_fd:
+            programs = json.load(sources_fd)
+    else:
+        programs = {}
+
+    if args.clean:
+        programs = {name: data for name, data in programs.items() if not name.startswith(PROGRAM_PREFIX)}
+
+    os.makedirs(SYNTHETIC_FOLDER, exist_ok=True)
+
+    for combination in itertools.product(*parameter_values.values()):
+        values = dict(zip(parameter_values.keys(), combination))
+        name = get_program_name(values, varying)
+
+        print(f"Generating {name} with {values['functions']} functions")
+        with open(os.path.join(SYNTHETIC_FOLDER, f"{name}.c"), 'w', encoding='utf-8') as cfile_fd:
+            cfile_fd.write(generate_program(values, args.seed))
+
+        programs[name] = make_program_entry(name)
+
+    with open(args.sources, 'w', encoding='utf-8') as sources_fd:
+        json.dump(programs, sources_fd, indent=2)
+
+if __name__ == "__main__":
+    main()